@@ -0,0 +1,227 @@
+"""
+都道府県ごとの記事を画面なしで一括生成するバッチ。
+
+    cd app && python batch_generate.py                      # 全47都道府県
+    cd app && python batch_generate.py 東京都 大阪府 --workers 2
+    cd app && python batch_generate.py --run-id nightly      # 中断した実行を再開
+
+都道府県・ステップごとの進捗を BATCH_CHECKPOINT_DIR/{run_id}.json に保存し、
+同じ run_id で再実行すると完了済みの都道府県を飛ばし、生成済みのタイトルを再利用する
+(記事生成もワークフローの途中保存により、完了済みのステップから再開される)。
+完成した記事は記事ストアに保存される。
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from config.constants import BATCH_CHECKPOINT_DIR, JAPAN_PREFECTURES
+from utils.agent_generate_article import generate_article_workflow
+from utils.generate_titles import generate_titles_for_prefecture
+
+
+class BatchCheckpoint:
+    """実行ごとの進捗をJSONファイルに保存する (更新のたびに書き出す)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._entries = json.load(f)
+
+    def get(self, prefecture: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._entries.get(prefecture, {}))
+
+    def update(self, prefecture: str, **fields: Any) -> None:
+        with self._lock:
+            entry = self._entries.setdefault(prefecture, {"completed_steps": []})
+            entry.update(fields, updated_at=time.time())
+            self._write()
+
+    def record_step(self, prefecture: str, step: str) -> None:
+        with self._lock:
+            entry = self._entries.setdefault(prefecture, {"completed_steps": []})
+            if step not in entry["completed_steps"]:
+                entry["completed_steps"].append(step)
+            entry["updated_at"] = time.time()
+            self._write()
+
+    def _write(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(self.path) or ".", suffix=".tmp"
+        )
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+
+
+@dataclass(frozen=True, slots=True)
+class PrefectureResult:
+    prefecture: str
+    status: str  # "done" / "skipped" / "failed"
+    elapsed_sec: float
+    article_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+def run_prefecture(prefecture: str, checkpoint: BatchCheckpoint) -> PrefectureResult:
+    """1都道府県分のタイトル生成と記事生成を行い、進捗をチェックポイントに記録する"""
+    entry = checkpoint.get(prefecture)
+    if entry.get("status") == "done":
+        return PrefectureResult(
+            prefecture, "skipped", 0.0, article_id=entry.get("article_id")
+        )
+
+    started = time.monotonic()
+    checkpoint.update(
+        prefecture, status="running", attempts=entry.get("attempts", 0) + 1
+    )
+
+    def failed(error: str) -> PrefectureResult:
+        elapsed = time.monotonic() - started
+        checkpoint.update(prefecture, status="failed", error=error, elapsed_sec=elapsed)
+        return PrefectureResult(prefecture, "failed", elapsed, error=error)
+
+    try:
+        # タイトルは生成済みであれば再利用する
+        titles = entry.get("titles")
+        corpus = None
+        if not titles:
+            result = generate_titles_for_prefecture(prefecture)
+            titles = result.get("titles_output")
+            # タイトル生成で取得したページを記事生成の参考情報に再利用する
+            corpus = result.get("corpus")
+            if result.get("error") or not titles:
+                return failed(f"タイトル生成エラー: {result.get('error', '出力なし')}")
+            checkpoint.update(prefecture, titles=titles)
+            checkpoint.record_step(prefecture, "titles")
+
+        final_state = None
+        for event in generate_article_workflow(
+            titles["main_title"], titles["sub_titles"], prefecture, corpus=corpus
+        ):
+            if "error" in event:
+                return failed(event["error"])
+            if "article_preview" in event:
+                continue
+            checkpoint.record_step(prefecture, event["step"])
+            final_state = event.get("state")
+
+        if final_state is None or final_state.get("error"):
+            return failed((final_state or {}).get("error") or "結果なし")
+        if not final_state.get("article_id"):
+            return failed("記事を保存できませんでした")
+
+        elapsed = time.monotonic() - started
+        checkpoint.update(
+            prefecture,
+            status="done",
+            article_id=final_state["article_id"],
+            error=None,
+            elapsed_sec=elapsed,
+        )
+        return PrefectureResult(
+            prefecture, "done", elapsed, article_id=final_state["article_id"]
+        )
+    except Exception as e:
+        return failed(f"{type(e).__name__}: {e}")
+
+
+def print_report(results: List[PrefectureResult], wall_sec: float) -> None:
+    done = [r for r in results if r.status == "done"]
+    skipped = [r for r in results if r.status == "skipped"]
+    failures = [r for r in results if r.status == "failed"]
+
+    print("\n===== 一括生成レポート =====")
+    print(f"対象: {len(results)}件 / 成功: {len(done)}件")
+    print(f"スキップ (完了済み): {len(skipped)}件 / 失敗: {len(failures)}件")
+    print(f"経過時間: {wall_sec:.0f}秒")
+    if done:
+        per_hour = len(done) / wall_sec * 3600 if wall_sec > 0 else 0.0
+        average = sum(r.elapsed_sec for r in done) / len(done)
+        slowest = max(done, key=lambda r: r.elapsed_sec)
+        print(f"スループット: {per_hour:.1f}件/時 (1件あたり平均 {average:.0f}秒)")
+        print(f"最長: {slowest.prefecture} ({slowest.elapsed_sec:.0f}秒)")
+    for result in failures:
+        print(f"  ❌ {result.prefecture}: {result.error}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="都道府県ごとの記事を一括生成します。")
+    parser.add_argument(
+        "prefectures",
+        nargs="*",
+        help="対象の都道府県 (省略時は全47都道府県)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=2, help="同時に処理する都道府県の数"
+    )
+    parser.add_argument(
+        "--run-id",
+        default=time.strftime("%Y%m%d"),
+        help="チェックポイント名。同じ値で再実行すると続きから再開する",
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="失敗した都道府県のみを再実行する",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    prefectures = args.prefectures or list(JAPAN_PREFECTURES)
+    unknown = [name for name in prefectures if name not in JAPAN_PREFECTURES]
+    if unknown:
+        print(f"不明な都道府県です: {', '.join(unknown)}")
+        return 2
+
+    checkpoint = BatchCheckpoint(
+        os.path.join(BATCH_CHECKPOINT_DIR, f"{args.run_id}.json")
+    )
+    if args.retry_failed:
+        prefectures = [
+            name
+            for name in prefectures
+            if checkpoint.get(name).get("status") == "failed"
+        ]
+
+    print(
+        f"🚀 {len(prefectures)}件の一括生成を開始します "
+        f"(run_id={args.run_id}, 同時実行数={args.workers})"
+    )
+    started = time.monotonic()
+    results: List[PrefectureResult] = []
+    with ThreadPoolExecutor(
+        max_workers=max(1, args.workers), thread_name_prefix="batch"
+    ) as executor:
+        futures = {
+            executor.submit(run_prefecture, name, checkpoint): name
+            for name in prefectures
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(
+                f"[{len(results)}/{len(prefectures)}] {result.prefecture}: "
+                f"{result.status} ({result.elapsed_sec:.0f}秒)"
+            )
+
+    print_report(results, time.monotonic() - started)
+    return 1 if any(r.status == "failed" for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,607 @@
+"""
+タイトル生成と記事生成ワークフローのエンドツーエンドのベンチマーク。
+Google検索・Webページ・LLM・画像生成は模擬バックエンドに置き換え、外部には接続しない。
+
+    cd app && python benchmark_pipeline.py                              # 既定のプロファイルで3都道府県
+    cd app && python benchmark_pipeline.py --iterations 3 --concurrency 2
+    cd app && python benchmark_pipeline.py --latency-scale 0.1 --compare old.json
+    cd app && python benchmark_pipeline.py --profile profile.json --trace-memory
+
+模擬バックエンドの応答時間と失敗率は --profile のJSONで種類ごとに上書きできる
+(例: {"imagen": {"latency_sec": [2, 4], "throttle_rate": 0.2}})。
+結果はステップごと・全体の p50/p95/p99、実時間とステップ時間の合計、メモリのピークを
+JSONに保存し、--compare で以前の結果と比較する。
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# アプリのモジュールは設定 (環境変数) を読み込み時に確定するため、configure の後に読み込む
+# (このモジュールを読み込むだけでは環境変数を変更しない)
+
+RESULT_FORMAT_VERSION = 1
+
+# 模擬バックエンドの既定のプロファイル
+# latency_sec: 応答時間の範囲 [最小, 最大] (一様分布)
+# failure_rate: 再試行されない失敗の割合 / throttle_rate: 429 として再試行される割合
+DEFAULT_PROFILE: Dict[str, Dict[str, Any]] = {
+    "google_search": {"latency_sec": [0.3, 0.8], "failure_rate": 0.0},
+    "web_page": {"latency_sec": [0.2, 1.5], "failure_rate": 0.1, "html_kb": 40},
+    "vertex_chat": {"latency_sec": [1.5, 4.0], "throttle_rate": 0.0},
+    # ストリーミングは最初のチャンクまでの時間と、以降のチャンクの間隔
+    "vertex_chat_stream": {
+        "latency_sec": [1.0, 2.0],
+        "chunk_interval_sec": 0.02,
+        "throttle_rate": 0.0,
+    },
+    "imagen": {"latency_sec": [4.0, 8.0], "throttle_rate": 0.05},
+}
+
+# 模擬呼び出しを通すリミッター (本番と同じ同時実行数の制御を受ける)
+_BACKEND_LIMITERS = {
+    "vertex_chat": "vertex_chat",
+    "vertex_chat_stream": "vertex_chat",
+    "imagen": "imagen",
+}
+
+
+class SimulatedBackendError(Exception):
+    """模擬バックエンドが返す失敗"""
+
+
+class SimulatedThrottle(Exception):
+    """模擬バックエンドが返す 429 (リミッターで再試行される)"""
+
+    code = 429
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """線形補間によるパーセンタイル (q は 0〜100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+def configure(work_dir: str) -> Dict[str, Optional[str]]:
+    """
+    ベンチマーク用の環境変数を設定し、変更前の値を返す。アプリのモジュールを読み込む前に呼ぶ。
+    記事・途中状態・Webページと検索結果のキャッシュは work_dir に保存し、本番のデータに書き込まない。
+    """
+    if "config.constants" in sys.modules:
+        raise RuntimeError("configure はアプリのモジュールを読み込む前に呼んでください")
+    overrides = {
+        "ARTICLE_STORE_DIR": os.path.join(work_dir, "articles"),
+        "WORKFLOW_CHECKPOINT_PATH": os.path.join(work_dir, "workflow_runs.sqlite3"),
+        "WEB_CACHE_PATH": os.path.join(work_dir, "web_cache.sqlite3"),
+        # トレースの出力は計測に含めない (TRACE_EXPORTER を指定した場合のみ出力する)
+        "TRACE_EXPORTER": "off",
+        "GOOGLE_API_KEY": "simulated",
+        "GOOGLE_CSE_ID": "simulated",
+    }
+    previous = {name: os.environ.get(name) for name in overrides}
+    for name, value in overrides.items():
+        os.environ.setdefault(name, value)
+    return previous
+
+
+def restore_environment(previous: Dict[str, Optional[str]]) -> None:
+    """configure で変更した環境変数を元に戻す"""
+    for name, value in previous.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
+
+def _placeholder_png() -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (256, 256), (120, 150, 180)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class SimulatedBackend:
+    """
+    カセットの再生と同じ形で外部呼び出しに応答する模擬バックエンド。
+    LLMの応答は、タイトル・記事本文・画像プロンプト・4コマのシーン記述の
+    いずれのパーサーでも読めるJSONを返す。
+    """
+
+    replaying = True
+
+    def __init__(
+        self,
+        profile: Dict[str, Dict[str, Any]],
+        latency_scale: float = 1.0,
+        seed: Optional[int] = None,
+    ):
+        self.profile = profile
+        self.latency_scale = latency_scale
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._sequence = itertools.count(1)
+        from utils.cassette import encode_bytes
+
+        self._image = encode_bytes(_placeholder_png())
+        self._calls: Dict[str, List[float]] = {}
+        self._failures: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    # --- 計測 ---
+
+    def _record(self, kind: str, elapsed_sec: float, failed: bool) -> None:
+        with self._lock:
+            self._calls.setdefault(kind, []).append(elapsed_sec)
+            if failed:
+                self._failures[kind] = self._failures.get(kind, 0) + 1
+
+    def call_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                kind: {**summarize(values), "failures": self._failures.get(kind, 0)}
+                for kind, values in sorted(self._calls.items())
+            }
+
+    # --- 模擬応答 ---
+
+    def _uniform(self, low: float, high: float) -> float:
+        with self._random_lock:
+            return self._random.uniform(low, high)
+
+    def _chance(self, rate: float) -> bool:
+        with self._random_lock:
+            return rate > 0 and self._random.random() < rate
+
+    def _wait(self, kind: str) -> None:
+        low, high = self.profile[kind]["latency_sec"]
+        time.sleep(self._uniform(low, high) * self.latency_scale)
+
+    def _search_response(self, request: Dict[str, Any]) -> List[Any]:
+        query = request["query"]
+        results = [
+            {
+                "title": f"{query} に関する記事 {i + 1}",
+                "link": f"https://simulated.example/{zlib.crc32(query.encode())}/{i + 1}",
+                "snippet": f"{query} の歴史と文化についての解説です。",
+            }
+            for i in range(request["num_results"])
+        ]
+        return [results, "api"]
+
+    def _page_response(self) -> List[Any]:
+        paragraph = (
+            "<h2>地域の歴史</h2><p>" + "この地域の風土と人々の営み。" * 20 + "</p>"
+        )
+        repeat = max(1, self.profile["web_page"].get("html_kb", 40) * 1024 // 600)
+        return [f"<html><body>{paragraph * repeat}</body></html>", "network"]
+
+    def _llm_text(self, request: Dict[str, Any]) -> str:
+        text = " ".join(
+            str(message.get("data", {}).get("content", ""))
+            for message in request.get("messages", [])
+        )
+        # プロンプト中の都道府県名を使う (4コマのシーン記述は都道府県名をキーにして読まれる)
+        from config.constants import JAPAN_PREFECTURES
+
+        prefectures = [name for name in JAPAN_PREFECTURES if name in text] or ["日本"]
+        prefecture = prefectures[0]
+        number = next(self._sequence)
+        block = (
+            f"{prefecture}の**風景と時間**について考える。" * 30
+            + "\n\n"
+            + "人々の暮らしと土地の記憶が重なり合う。" * 20
+        )
+        return json.dumps(
+            {
+                "main_title": f"{prefecture}の光と影をめぐる哲学的な旅路 第{number}章",
+                "sub_titles": [f"{prefecture}の思索 その{i}" for i in range(1, 6)],
+                "title": f"{prefecture}を歩き、考える",
+                "block": [block] * 5,
+                "prompts": [
+                    f"A serene landscape of {number} in Japan, scene {i}"
+                    for i in range(1, 6)
+                ],
+                **{
+                    name: {
+                        "prompts": [f"{name}の情景 {i}" for i in range(1, 5)],
+                        "theme": f"{name}の魅力",
+                    }
+                    for name in prefectures
+                },
+            },
+            ensure_ascii=False,
+        )
+
+    def _respond(self, kind: str, request: Dict[str, Any]) -> Any:
+        settings = self.profile[kind]
+        if self._chance(settings.get("throttle_rate", 0.0)):
+            self._wait(kind)
+            raise SimulatedThrottle(f"429 simulated throttle ({kind})")
+        self._wait(kind)
+        if kind == "web_page" and self._chance(settings.get("failure_rate", 0.0)):
+            return {"failure": "Timeout", "cached": False}
+        if self._chance(settings.get("failure_rate", 0.0)):
+            raise SimulatedBackendError(f"simulated failure ({kind})")
+        if kind == "google_search":
+            return self._search_response(request)
+        if kind == "web_page":
+            return self._page_response()
+        if kind == "imagen":
+            return [self._image]
+        message = {"type": "ai", "data": {"content": self._llm_text(request)}}
+        return {
+            "generations": [{"message": message, "generation_info": None}],
+            "llm_output": None,
+        }
+
+    # --- カセットと同じインターフェース ---
+
+    def call(
+        self,
+        kind: str,
+        request: Any,
+        func: Callable[[], Any],
+        encode: Callable[[Any], Any] = lambda value: value,
+        decode: Callable[[Any], Any] = lambda value: value,
+    ) -> Any:
+        from utils.rate_limiter import get_limiter
+
+        started = time.monotonic()
+        try:
+            limiter = _BACKEND_LIMITERS.get(kind)
+            if limiter:
+                payload = get_limiter(limiter).call(
+                    self._respond, kind, request, latency_kind=kind
+                )
+            else:
+                payload = self._respond(kind, request)
+        except Exception:
+            self._record(kind, time.monotonic() - started, True)
+            raise
+        self._record(kind, time.monotonic() - started, False)
+        return decode(payload)
+
+    def _stream_chunks(self, kind: str, request: Dict[str, Any]) -> Iterator[Any]:
+        settings = self.profile[kind]
+        if self._chance(settings.get("throttle_rate", 0.0)):
+            self._wait(kind)
+            raise SimulatedThrottle(f"429 simulated throttle ({kind})")
+        self._wait(kind)
+        text = self._llm_text(request)
+        for start in range(0, len(text), 40):
+            yield {
+                "message": {
+                    "type": "AIMessageChunk",
+                    "data": {"content": text[start : start + 40]},
+                },
+                "generation_info": None,
+            }
+            time.sleep(settings.get("chunk_interval_sec", 0.0) * self.latency_scale)
+
+    def stream(
+        self,
+        kind: str,
+        request: Any,
+        func: Callable[[], Iterator[Any]],
+        encode: Callable[[Any], Any] = lambda value: value,
+        decode: Callable[[Any], Any] = lambda value: value,
+    ) -> Iterator[Any]:
+        from utils.rate_limiter import get_limiter
+
+        started = time.monotonic()
+        failed = True
+        try:
+            chunks = get_limiter(_BACKEND_LIMITERS[kind]).stream(
+                self._stream_chunks, kind, request, latency_kind=kind
+            )
+            for chunk in chunks:
+                yield decode(chunk)
+            failed = False
+        finally:
+            self._record(kind, time.monotonic() - started, failed)
+
+
+def run_once(prefecture: str) -> Dict[str, Any]:
+    """1都道府県分のタイトル生成と記事生成を行い、所要時間を返す"""
+    from utils.agent_generate_article import generate_article_workflow
+    from utils.generate_titles import generate_titles_for_prefecture
+
+    started = time.monotonic()
+    result: Dict[str, Any] = {"prefecture": prefecture, "ok": False, "error": None}
+
+    titles = generate_titles_for_prefecture(prefecture)
+    result["titles_sec"] = time.monotonic() - started
+    titles_output = titles.get("titles_output")
+    if titles.get("error") or not titles_output:
+        result["error"] = f"タイトル生成エラー: {titles.get('error', '出力なし')}"
+        result["total_sec"] = time.monotonic() - started
+        return result
+
+    workflow_started = time.monotonic()
+    final_state: Dict[str, Any] = {}
+    for event in generate_article_workflow(
+        titles_output["main_title"],
+        titles_output["sub_titles"],
+        prefecture,
+        corpus=titles.get("corpus"),
+    ):
+        if "error" in event:
+            result["error"] = event["error"]
+        if event.get("state") is not None:
+            final_state = event["state"]
+    now = time.monotonic()
+    steps = dict(final_state.get("step_durations") or {})
+
+    result.update(
+        workflow_sec=now - workflow_started,
+        total_sec=now - started,
+        steps=steps,
+        summed_step_sec=sum(steps.values()),
+    )
+    result["error"] = result["error"] or final_state.get("error")
+    result["ok"] = result["error"] is None and bool(final_state.get("html_output"))
+    return result
+
+
+def build_report(
+    runs: List[Dict[str, Any]],
+    backend: SimulatedBackend,
+    wall_sec: float,
+    args: argparse.Namespace,
+    profile: Dict[str, Dict[str, Any]],
+    tracemalloc_peak: Optional[int],
+) -> Dict[str, Any]:
+    step_names = sorted({name for run in runs for name in run.get("steps", {})})
+    workflow_runs = [run for run in runs if "workflow_sec" in run]
+    summed = sum(run["summed_step_sec"] for run in workflow_runs)
+    workflow_wall = sum(run["workflow_sec"] for run in workflow_runs)
+    succeeded = sum(1 for run in runs if run["ok"])
+    return {
+        "format_version": RESULT_FORMAT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "prefectures": args.prefectures,
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "latency_scale": args.latency_scale,
+            "seed": args.seed,
+            "profile": profile,
+        },
+        "runs": {"total": len(runs), "succeeded": succeeded},
+        "wall_sec": wall_sec,
+        "throughput_per_hour": succeeded / wall_sec * 3600 if wall_sec > 0 else 0.0,
+        "end_to_end": summarize([run["total_sec"] for run in runs]),
+        "titles": summarize([run["titles_sec"] for run in runs]),
+        "workflow": summarize([run["workflow_sec"] for run in workflow_runs]),
+        "steps": {
+            name: summarize(
+                [run["steps"][name] for run in runs if name in run.get("steps", {})]
+            )
+            for name in step_names
+        },
+        # 記事生成ワークフローの実時間に対するステップ時間の合計 (並行実行の度合い)
+        "workflow_wall_sec": workflow_wall,
+        "summed_step_sec": summed,
+        "parallelism": summed / workflow_wall if workflow_wall > 0 else None,
+        "backend_calls": backend.call_stats(),
+        "memory": {
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "tracemalloc_peak_mb": (
+                tracemalloc_peak / (1024 * 1024)
+                if tracemalloc_peak is not None
+                else None
+            ),
+        },
+        "errors": [
+            {"prefecture": run["prefecture"], "error": run["error"]}
+            for run in runs
+            if not run["ok"]
+        ],
+    }
+
+
+def _format_sec(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.2f}s"
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print("\n===== ベンチマーク結果 =====")
+    print(
+        f"成功: {report['runs']['succeeded']}/{report['runs']['total']}件 / "
+        f"実時間: {report['wall_sec']:.1f}秒 / "
+        f"スループット: {report['throughput_per_hour']:.1f}件/時"
+    )
+    print(f"{'':<28}{'p50':>10}{'p95':>10}{'p99':>10}")
+    rows = [("全体", report["end_to_end"]), ("タイトル生成", report["titles"])]
+    rows += [("記事生成", report["workflow"])]
+    rows += [(f"  {name}", stats) for name, stats in report["steps"].items()]
+    for label, stats in rows:
+        print(
+            f"{label:<28}{_format_sec(stats['p50']):>10}"
+            f"{_format_sec(stats['p95']):>10}{_format_sec(stats['p99']):>10}"
+        )
+    if report["parallelism"] is not None:
+        print(
+            f"記事生成の実時間 {report['workflow_wall_sec']:.1f}秒 / "
+            f"ステップ時間の合計 {report['summed_step_sec']:.1f}秒 "
+            f"(並行度 {report['parallelism']:.2f})"
+        )
+    for kind, stats in report["backend_calls"].items():
+        print(
+            f"模擬 {kind}: {stats['count']}回 (失敗 {stats['failures']}回), "
+            f"p50 {_format_sec(stats['p50'])}, p95 {_format_sec(stats['p95'])}"
+        )
+    memory = report["memory"]
+    peak = memory["tracemalloc_peak_mb"]
+    print(
+        f"メモリ: 最大RSS {memory['max_rss_mb']:.0f}MB"
+        + (f", Pythonヒープのピーク {peak:.1f}MB" if peak is not None else "")
+    )
+    for error in report["errors"]:
+        print(f"  ❌ {error['prefecture']}: {error['error']}")
+
+
+def print_comparison(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """以前の結果との p50 / p95 の差を表示する"""
+    print(f"\n===== 比較 (基準: {baseline.get('created_at', '?')}) =====")
+    pairs = [("全体", report["end_to_end"], baseline.get("end_to_end", {}))]
+    pairs += [
+        (f"  {name}", stats, baseline.get("steps", {}).get(name, {}))
+        for name, stats in report["steps"].items()
+    ]
+    for label, current, previous in pairs:
+        cells = []
+        for key in ("p50", "p95"):
+            if current.get(key) is None or not previous.get(key):
+                cells.append(f"{key} -")
+                continue
+            change = (current[key] - previous[key]) / previous[key] * 100
+            cells.append(
+                f"{key} {previous[key]:.2f}s→{current[key]:.2f}s ({change:+.0f}%)"
+            )
+        print(f"{label:<28}" + "  ".join(cells))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="模擬バックエンドでタイトル生成・記事生成の性能を計測します。"
+    )
+    parser.add_argument(
+        "prefectures",
+        nargs="*",
+        default=["東京都", "大阪府", "北海道"],
+        help="対象の都道府県",
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=1, help="都道府県ごとの実行回数"
+    )
+    parser.add_argument("--concurrency", type=int, default=1, help="同時に処理する件数")
+    parser.add_argument(
+        "--profile", help="模擬バックエンドの応答時間・失敗率を上書きするJSONファイル"
+    )
+    parser.add_argument(
+        "--latency-scale",
+        type=float,
+        default=1.0,
+        help="模擬応答時間の倍率 (0.1 で10倍速)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+    parser.add_argument(
+        "--output",
+        help="結果を保存するJSONファイル (省略時は data/benchmarks/<日時>.json)",
+    )
+    parser.add_argument("--compare", help="比較する以前の結果のJSONファイル")
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="tracemalloc でPythonヒープのピークも計測する (計測の負荷がかかる)",
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="パイプラインのログを表示する"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    # 記事・途中状態・キャッシュは実行ごとの一時ディレクトリに保存し、終了時に削除する
+    work_dir = tempfile.mkdtemp(prefix="benchmark_")
+    previous_environment = configure(work_dir)
+    try:
+        return _run_benchmark(args)
+    finally:
+        restore_environment(previous_environment)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _run_benchmark(args: argparse.Namespace) -> int:
+    from config.constants import DATA_DIR, JAPAN_PREFECTURES
+    from utils.cassette import set_cassette
+
+    unknown = [name for name in args.prefectures if name not in JAPAN_PREFECTURES]
+    if unknown:
+        print(f"不明な都道府県です: {', '.join(unknown)}")
+        return 2
+    output = args.output or os.path.join(
+        DATA_DIR, "benchmarks", f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    profile = json.loads(json.dumps(DEFAULT_PROFILE))
+    if args.profile:
+        with open(args.profile, encoding="utf-8") as f:
+            for kind, overrides in json.load(f).items():
+                profile.setdefault(kind, {}).update(overrides)
+
+    backend = SimulatedBackend(profile, args.latency_scale, args.seed)
+    set_cassette(backend)
+    targets = [name for _ in range(args.iterations) for name in args.prefectures]
+    print(
+        f"⏱️ {len(targets)}件のベンチマークを開始します "
+        f"(同時実行数={args.concurrency}, 応答時間の倍率={args.latency_scale})"
+    )
+
+    if args.trace_memory:
+        tracemalloc.start()
+    # パイプラインのログは計測結果を読みにくくするため、既定では表示しない
+    log_target = sys.stdout if args.verbose else io.StringIO()
+    started = time.monotonic()
+    try:
+        with contextlib.redirect_stdout(log_target):
+            with ThreadPoolExecutor(
+                max_workers=max(1, args.concurrency), thread_name_prefix="benchmark"
+            ) as executor:
+                runs = list(executor.map(run_once, targets))
+    finally:
+        set_cassette(None)
+    wall_sec = time.monotonic() - started
+    tracemalloc_peak = None
+    if args.trace_memory:
+        tracemalloc_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    report = build_report(runs, backend, wall_sec, args, profile, tracemalloc_peak)
+    print_report(report)
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 結果を保存しました: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(report, json.load(f))
+    return 0 if report["runs"]["succeeded"] == report["runs"]["total"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,14 @@
 import streamlit as st
 import traceback
 
-from utils.agent_generate_article import generate_article_workflow
+from utils.agent_generate_article import (
+    article_generation_params,
+    generate_article_workflow,
+)
+from utils.article_store import generation_params_key, get_article_store
 from utils.generate_titles import generate_titles_for_prefecture
+from utils.model_clients import get_warmup_status
+from utils.workflow_checkpoint import get_workflow_checkpoint_store
 
 
 def initialize_session_state():
@@ -199,13 +205,92 @@ def improve_html_styling(html_content):
     return improved_html
 
 
+def render_article_preview(placeholder, partial_article, sub_titles):
+    """
+    生成途中の記事本文 (タイトルと完成済み・生成中のブロック) をプレースホルダーに表示します。
+    """
+    lines = []
+    if partial_article.get("title"):
+        lines.append(f"#### {partial_article['title']}")
+    for index, block in enumerate(partial_article.get("block", [])):
+        if index < len(sub_titles):
+            lines.append(f"##### {sub_titles[index]}")
+        lines.append(block)
+    if lines:
+        placeholder.markdown("\n\n".join(lines))
+
+
+def render_saved_articles(selected_prefecture_name):
+    """
+    同じ地域・同じ生成条件の保存済み記事があれば一覧を表示し、生成せずにすぐ表示できるようにします。
+    """
+    try:
+        store = get_article_store()
+        params_key = generation_params_key(article_generation_params())
+        recent_articles = store.list_recent(selected_prefecture_name, params_key)
+    except Exception as e:
+        print(f"保存済み記事の取得エラー: {e}")
+        return
+
+    if not recent_articles:
+        return
+
+    with st.expander(
+        f"📚 保存済みの「{selected_prefecture_name}」の記事 ({len(recent_articles)}件)"
+    ):
+        selected_article = st.selectbox(
+            "記事を選択",
+            options=recent_articles,
+            format_func=lambda article: article.label(),
+            key="saved_article_selection",
+        )
+        show_saved = st.button("📖 この記事を表示", key="show_saved_article_button")
+
+    if show_saved and selected_article:
+        article = store.load(selected_article.article_id)
+        if article:
+            st.html(improve_html_styling(article.html))
+        else:
+            st.warning("保存済みの記事を読み込めませんでした。")
+
+
+def render_resume_option(selected_prefecture_name):
+    """
+    途中で失敗・中断した記事生成があれば、続きから再開するボタンを表示します。
+    ボタンが押された場合はその実行のチェックポイントを返します。
+    """
+    try:
+        unfinished = get_workflow_checkpoint_store().latest_unfinished(
+            selected_prefecture_name
+        )
+    except Exception as e:
+        print(f"途中状態の取得エラー: {e}")
+        return None
+
+    if unfinished is None:
+        return None
+
+    reason = f" (エラー: {unfinished.error})" if unfinished.error else ""
+    st.info(
+        f"⏸️ 前回の「{unfinished.main_title}」の記事生成が完了していません{reason}。"
+        f"完了済みのステップ ({len(unfinished.completed_steps)}件) を再利用して再開できます。"
+    )
+    if st.button("⏯️ 前回の続きから再開する", key="resume_article_button"):
+        return unfinished
+    return None
+
+
 def render_title_generation_section(selected_prefecture_name):
     """
     タイトル生成と記事生成の全プロセスを管理し、画像生成も含めたプログレスバーで進捗を表示します。
     """
-    if st.button(
-        f"{selected_prefecture_name}のタイトルと記事を生成する",
-        key="generate_titles_and_article_button",
+    resume_run = render_resume_option(selected_prefecture_name)
+    if (
+        st.button(
+            f"{selected_prefecture_name}のタイトルと記事を生成する",
+            key="generate_titles_and_article_button",
+        )
+        or resume_run is not None
     ):
         # --- UIと変数の初期化 ---
         st.session_state.titles_generated_successfully = False
@@ -239,6 +324,9 @@ def render_title_generation_section(selected_prefecture_name):
             # 現在の処理内容を表示するプレースホルダー
             current_process_placeholder = st.empty()
 
+            # 生成途中の記事本文を表示するプレースホルダー
+            article_preview_placeholder = st.empty()
+
             # 初期値を設定
             progress_text_placeholder.text(f"0 / {total_steps} (0%)")
 
@@ -253,7 +341,18 @@ def render_title_generation_section(selected_prefecture_name):
                 current_process_placeholder.info("📝 タイトルを考案中...")
                 progress_bar.progress(progress_value)
 
-                result_titles = generate_titles_for_prefecture(selected_prefecture_name)
+                if resume_run is not None:
+                    # 再開時は前回のタイトルを使う (同じタイトルの実行として途中から再開される)
+                    result_titles = {
+                        "titles_output": {
+                            "main_title": resume_run.main_title,
+                            "sub_titles": resume_run.subtitles,
+                        }
+                    }
+                else:
+                    result_titles = generate_titles_for_prefecture(
+                        selected_prefecture_name
+                    )
 
                 if result_titles.get("error"):
                     # タイトル生成でエラーが発生した場合
@@ -290,9 +389,20 @@ def render_title_generation_section(selected_prefecture_name):
                         generated_main_title,
                         generated_sub_titles,
                         selected_prefecture_name,
+                        # タイトル生成で取得したページを記事生成の参考情報に使う
+                        corpus=result_titles.get("corpus"),
                     )
 
                     for event in stream:
+                        # 記事本文の途中経過はステップとして数えず、表示のみ更新する
+                        if "article_preview" in event:
+                            render_article_preview(
+                                article_preview_placeholder,
+                                event["article_preview"],
+                                generated_sub_titles,
+                            )
+                            continue
+
                         # 画像生成のステップを特別に処理
                         step_name = event.get("step")
                         step_message = event.get("message", "処理中…")
@@ -369,6 +479,8 @@ def render_title_generation_section(selected_prefecture_name):
                         progress_bar.progress(progress_value)
 
                         if step_name == "__end__":
+                            # 完成した記事は下に表示するため、途中経過の表示は消す
+                            article_preview_placeholder.empty()
                             status.update(
                                 label="完了しました！", state="complete", expanded=False
                             )
@@ -424,4 +536,12 @@ def article_generator_app(selected_prefecture_name):
     記事生成アプリのメイン関数
     """
     initialize_session_state()
+    warmup_status, warmup_error = get_warmup_status()
+    if warmup_status == "loading":
+        st.caption(
+            "⏳ 画像生成モデルを準備しています (初回の生成は少し時間がかかります)"
+        )
+    elif warmup_status == "failed":
+        st.caption(f"⚠️ モデルの事前読み込みに失敗しました: {warmup_error}")
+    render_saved_articles(selected_prefecture_name)
     render_title_generation_section(selected_prefecture_name)
@@ -2,9 +2,12 @@ import streamlit as st
 from utils.state_manager import (
     initialize_session_state,
     process_selected_feature,
+    process_selected_municipality,
     process_geolocation_data,
+    get_selected_municipality,
 )
 from utils.data_loader import load_geojson
+from utils.municipality_loader import load_municipalities
 from components.sidebar_controls import render_sidebar
 from components.map_viewer import create_pydeck_map
 
@@ -25,7 +28,19 @@ def map_section():
     map_render_selection = st.session_state.selected_region_on_map
     map_render_view_state = st.session_state.map_view_state
 
-    deck_obj = create_pydeck_map(gdf, map_render_selection, map_render_view_state)
+    # 市区町村は全国表示では読み込まず、選択中の都道府県に掘り下げたときだけ読み込む
+    municipality_gdf = None
+    selected_prefecture_name = st.session_state.get("selected_prefecture_info")
+    if st.session_state.get("show_municipalities") and selected_prefecture_name:
+        municipality_gdf = load_municipalities(selected_prefecture_name)
+
+    deck_obj = create_pydeck_map(
+        gdf,
+        map_render_selection,
+        map_render_view_state,
+        municipality_gdf=municipality_gdf,
+        selected_municipality_name=get_selected_municipality(),
+    )
 
     event_info = None
     if deck_obj:
@@ -38,6 +53,7 @@ def map_section():
         )
 
     clicked_feature_props = None
+    clicked_municipality_props = None
 
     if event_info and hasattr(event_info, "selection") and event_info.selection:
         payload = event_info.selection
@@ -46,6 +62,9 @@ def map_section():
             and "objects" in payload
             and isinstance(payload["objects"], dict)
         ):
+            municipality_list = payload["objects"].get("japan-municipalities")
+            if isinstance(municipality_list, list) and len(municipality_list) > 0:
+                clicked_municipality_props = municipality_list[0]
             features_list = payload["objects"].get("japan-prefectures")
             if isinstance(features_list, list) and len(features_list) > 0:
                 raw_feature = features_list[0]
@@ -63,7 +82,13 @@ def map_section():
 
                 clicked_feature_props = clicked_object_or_props
 
-    if clicked_feature_props:
+    if clicked_municipality_props and municipality_gdf is not None:
+        success, _ = process_selected_municipality(
+            clicked_municipality_props, municipality_gdf
+        )
+        if success:
+            st.rerun()
+    elif clicked_feature_props:
         success, _ = process_selected_feature(clicked_feature_props, gdf)
         if success:
             st.rerun()
@@ -1,59 +1,185 @@
+import os
+import math
+import tempfile
 import pydeck as pdk
 import geopandas as gpd
-import pandas as pd
 import json
-from utils.map_utils import limit_view_state
+import streamlit as st
+from config.constants import (
+    GEOMETRY_LOD_TIERS,
+    MAP_COORDINATE_PRECISION,
+    MAP_GEOMETRY_DELIVERY,
+    MUNICIPALITY_SIMPLIFY_TOLERANCE,
+    STATIC_GEO_DIR,
+    STATIC_GEO_URL_PREFIX,
+)
+from utils.map_utils import limit_view_state, select_lod_tier
+from utils.data_loader import get_dataset_key, lod_geometry_column
+from utils.prefecture_registry import get_prefecture_registry
+from utils.geometry_encoding import precision_for_tolerance, quantize_frame
 
 
-def create_pydeck_map(gdf, selected_region_name_on_map, current_view_state):
-    """PyDeck 地図生成 (マーカーをScatterplotLayerに変更)"""
-    if gdf.empty:
-        return None
+@st.cache_resource(show_spinner=False)
+def _build_feature_collection(_gdf, dataset_key: str, lod_tier: int) -> dict:
+    """
+    都道府県ポリゴンのFeatureCollectionをデータセットの世代・LOD段階ごとに一度だけ構築する。
+    cache_resource で全セッション共有するため、戻り値は変更しないこと。
+    """
+    frame = gpd.GeoDataFrame(
+        _gdf[["nam_ja", "nam"]],
+        geometry=_gdf[lod_geometry_column(lod_tier)].values,
+        crs=_gdf.crs,
+    )
+    frame = frame[frame.geometry.is_valid].copy()
+    frame["index"] = frame.index.astype(int)
+
+    # 座標を量子化して転送量を削減 (桁数はLOD段階の許容誤差に合わせる)
+    precision = MAP_COORDINATE_PRECISION
+    if precision is None:
+        precision = precision_for_tolerance(GEOMETRY_LOD_TIERS[lod_tier][1])
+    collection, payload_report = quantize_frame(frame, precision)
+    print(f"🗺️ 地図ジオメトリ (LOD {lod_tier}) {payload_report.summary()}")
+
+    features_by_name = {
+        feature["properties"]["nam_ja"]: feature for feature in collection["features"]
+    }
+    return {
+        "collection": collection,
+        "features_by_name": features_by_name,
+        "payload_report": payload_report,
+    }
+
 
-    geojson_features = []
-    for idx, row in gdf.iterrows():
+@st.cache_resource(show_spinner=False)
+def _publish_static_geometry(_gdf, dataset_key: str, lod_tier: int) -> str | None:
+    """
+    FeatureCollectionを静的配信ディレクトリに書き出し、ブラウザから参照するURLを返す。
+    ファイル名にデータセットキーを含めるため、内容が変わればURLも変わる。
+    書き出せない場合は None (インライン配信にフォールバック)。
+    """
+    file_name = f"prefectures_{dataset_key}_lod{lod_tier}.geojson"
+    file_path = os.path.join(STATIC_GEO_DIR, file_name)
+    if not os.path.exists(file_path):
+        collection = _build_feature_collection(_gdf, dataset_key, lod_tier)[
+            "collection"
+        ]
         try:
+            os.makedirs(STATIC_GEO_DIR, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=STATIC_GEO_DIR, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(collection, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, file_path)
+        except Exception as e:
+            print(f"⚠️ 地図ジオメトリの静的ファイル書き出しに失敗しました: {e}")
+            return None
+    return f"{STATIC_GEO_URL_PREFIX}/{file_name}"
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _build_municipality_collection(_municipality_gdf, dataset_key: str) -> dict:
+    """選択中の都道府県の市区町村FeatureCollectionを一度だけ構築する"""
+    frame = _municipality_gdf[["code", "nam_ja", "pref_ja", "geometry"]].copy()
+    frame["nam"] = frame["pref_ja"]
+    precision = MAP_COORDINATE_PRECISION
+    if precision is None:
+        precision = precision_for_tolerance(MUNICIPALITY_SIMPLIFY_TOLERANCE)
+    collection, payload_report = quantize_frame(frame, precision)
+    print(f"🏘️ 市区町村ジオメトリ {payload_report.summary()}")
+    features_by_name = {
+        feature["properties"]["nam_ja"]: feature for feature in collection["features"]
+    }
+    return {"collection": collection, "features_by_name": features_by_name}
 
-            if not row["geometry"].is_valid:
-                continue
-
-            feature = {
-                "type": "Feature",
-                "properties": {
-                    "nam_ja": str(row.get("nam_ja", "情報なし")),
-                    "nam": str(row.get("nam", "Unknown")),
-                    "index": int(idx),
-                    "selected": (
-                        1
-                        if str(row.get("nam_ja", "")) == selected_region_name_on_map
-                        else 0
-                    ),
-                },
-                "geometry": json.loads(gpd.GeoSeries([row["geometry"]]).to_json())[
-                    "features"
-                ][0]["geometry"],
-            }
-            geojson_features.append(feature)
-        except Exception:
 
-            continue
-    geojson_data = {"type": "FeatureCollection", "features": geojson_features}
+def create_pydeck_map(
+    gdf,
+    selected_region_name_on_map,
+    current_view_state,
+    municipality_gdf=None,
+    selected_municipality_name=None,
+):
+    """
+    PyDeck 地図生成 (マーカーをScatterplotLayerに変更)
+    municipality_gdf が渡された場合のみ、その都道府県の市区町村レイヤーを重ねる。
+    """
+    if gdf.empty:
+        return None
+
+    limited_view_state = limit_view_state(current_view_state)
+    lod_tier = select_lod_tier(limited_view_state.zoom)
+    dataset_key = get_dataset_key(gdf)
+    feature_cache = _build_feature_collection(gdf, dataset_key, lod_tier)
+
+    # static モードではジオメトリをURL参照にし、deck の仕様から本体を外す
+    geometry_data = feature_cache["collection"]
+    if MAP_GEOMETRY_DELIVERY == "static":
+        geometry_data = (
+            _publish_static_geometry(gdf, dataset_key, lod_tier) or geometry_data
+        )
 
     geojson_layer = pdk.Layer(
         "GeoJsonLayer",
-        data=geojson_data,
+        data=geometry_data,
         id="japan-prefectures",
         pickable=True,
         stroked=True,
         filled=True,
         extruded=False,
-        get_fill_color="[properties.selected ? 255 : 200, properties.selected ? 140 : 200, properties.selected ? 0 : 200, properties.selected ? 180 : 120]",
+        get_fill_color=[200, 200, 200, 120],
         get_line_color=[80, 80, 80, 200],
         line_width_min_pixels=1,
         auto_highlight=True,
         highlight_color=[255, 255, 0, 150],
     )
 
+    layers = [geojson_layer]
+
+    # 選択状態は全ポリゴンを再シリアライズせず、選択中の1地物だけを別レイヤーで描画する
+    selected_feature = feature_cache["features_by_name"].get(
+        selected_region_name_on_map
+    )
+
+    if municipality_gdf is not None and not municipality_gdf.empty:
+        municipality_cache = _build_municipality_collection(
+            municipality_gdf, get_dataset_key(municipality_gdf)
+        )
+        layers.append(
+            pdk.Layer(
+                "GeoJsonLayer",
+                data=municipality_cache["collection"],
+                id="japan-municipalities",
+                pickable=True,
+                stroked=True,
+                filled=True,
+                extruded=False,
+                get_fill_color=[255, 220, 170, 90],
+                get_line_color=[120, 120, 120, 200],
+                line_width_min_pixels=1,
+                auto_highlight=True,
+                highlight_color=[255, 255, 0, 150],
+            )
+        )
+        # 市区町村表示中は都道府県全体ではなく選択中の市区町村のみ強調する
+        selected_feature = municipality_cache["features_by_name"].get(
+            selected_municipality_name
+        )
+    selection_layer = pdk.Layer(
+        "GeoJsonLayer",
+        data={
+            "type": "FeatureCollection",
+            "features": [selected_feature] if selected_feature else [],
+        },
+        id="selected-prefecture",
+        pickable=False,
+        stroked=True,
+        filled=True,
+        extruded=False,
+        get_fill_color=[255, 140, 0, 180],
+        get_line_color=[80, 80, 80, 200],
+        line_width_min_pixels=1,
+    )
+    layers.append(selection_layer)
+
     tooltip_html = """
     <div style="background: linear-gradient(135deg, rgba(0,0,0,0.9), rgba(40,40,40,0.9)); color: white; padding: 15px; border-radius: 10px; font-family: 'Segoe UI', Arial, sans-serif; box-shadow: 0 4px 15px rgba(0,0,0,0.3); border: 1px solid rgba(255,255,255,0.1); min-width: 200px;">
         <div style="font-size: 18px; font-weight: bold; margin-bottom: 8px; color: #FFD700; text-shadow: 1px 1px 2px rgba(0,0,0,0.5);">🏛️ {nam_ja}</div>
@@ -69,18 +195,18 @@ def create_pydeck_map(gdf, selected_region_name_on_map, current_view_state):
     }
 
     scatter_data = []
-    if selected_region_name_on_map:
-        selected_gdf_rows = gdf[gdf["nam_ja"] == selected_region_name_on_map]
-        if not selected_gdf_rows.empty:
-            row = selected_gdf_rows.iloc[0]
-            if pd.notna(row["center_x"]) and pd.notna(row["center_y"]):
-                scatter_data = [
-                    {
-                        "position": [row["center_x"], row["center_y"]],
-                        "nam_ja": row["nam_ja"],
-                        "size": 5,
-                    }
-                ]
+    pref_record = get_prefecture_registry(gdf).get(selected_region_name_on_map)
+    if pref_record is not None:
+        if not math.isnan(pref_record.center_lon) and not math.isnan(
+            pref_record.center_lat
+        ):
+            scatter_data = [
+                {
+                    "position": [pref_record.center_lon, pref_record.center_lat],
+                    "nam_ja": pref_record.name,
+                    "size": 5,
+                }
+            ]
 
     scatter_layer = pdk.Layer(
         "ScatterplotLayer",
@@ -96,9 +222,8 @@ def create_pydeck_map(gdf, selected_region_name_on_map, current_view_state):
         line_width_min_pixels=1,
     )
 
-    limited_view_state = limit_view_state(current_view_state)
     deck = pdk.Deck(
-        layers=[geojson_layer, scatter_layer],
+        layers=layers + [scatter_layer],
         initial_view_state=limited_view_state,
         tooltip=tooltip,
         map_style="mapbox://styles/mapbox/light-v10",
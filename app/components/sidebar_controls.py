@@ -2,7 +2,6 @@ import streamlit as st
 from streamlit_geolocation import streamlit_geolocation
 import time
 import pydeck as pdk
-from shapely.geometry import Point
 
 from config.constants import (
     JAPAN_PREFECTURES,
@@ -12,6 +11,10 @@ from config.constants import (
     INITIAL_CENTER_LAT,
     INITIAL_ZOOM,
 )
+from utils.state_manager import get_selected_municipality
+from utils.prefecture_registry import get_prefecture_registry
+from utils.rate_limiter import get_limiter_stats
+from utils.search_cache import get_search_quota
 
 
 def render_sidebar(gdf):
@@ -33,7 +36,7 @@ def render_sidebar(gdf):
             and not gdf.empty
             and "nam_ja" in gdf.columns
         ):
-            actual_prefectures = sorted(gdf["nam_ja"].unique().tolist())
+            actual_prefectures = sorted(get_prefecture_registry(gdf).names())
 
         selectbox_options = [PLACEHOLDER_SELECTBOX] + (
             actual_prefectures if actual_prefectures else []
@@ -84,22 +87,17 @@ def render_sidebar(gdf):
                 st.session_state.last_map_interaction_type = "selectbox_selection"
 
                 if gdf is not None and not gdf.empty:
-                    matched_row = gdf[gdf["nam_ja"] == sel_via_selectbox]
-                    if not matched_row.empty:
-                        pref_data = matched_row.iloc[0]
-                        if "center" in pref_data and isinstance(
-                            pref_data["center"], Point
-                        ):
-                            pref_center_pt = pref_data["center"]
-                            st.session_state.map_view_state = pdk.ViewState(
-                                latitude=pref_center_pt.y,
-                                longitude=pref_center_pt.x,
-                                zoom=max(st.session_state.map_view_state.zoom, 6),
-                                pitch=st.session_state.map_view_state.pitch,
-                                bearing=st.session_state.map_view_state.bearing,
-                                transition_duration=500,
-                                transition_interruption="allowed",
-                            )
+                    pref_record = get_prefecture_registry(gdf).get(sel_via_selectbox)
+                    if pref_record is not None:
+                        st.session_state.map_view_state = pdk.ViewState(
+                            latitude=pref_record.center_lat,
+                            longitude=pref_record.center_lon,
+                            zoom=max(st.session_state.map_view_state.zoom, 6),
+                            pitch=st.session_state.map_view_state.pitch,
+                            bearing=st.session_state.map_view_state.bearing,
+                            transition_duration=500,
+                            transition_interruption="allowed",
+                        )
             else:
                 st.session_state.selected_region_on_map = DEFAULT_SELECTED_REGION_ON_MAP
                 st.session_state.selected_prefecture_info = None
@@ -117,8 +115,26 @@ def render_sidebar(gdf):
         if st.session_state.get("selected_prefecture_info"):
             st.markdown("#### 選択中の地域:")
             st.success(f"🎯 **{st.session_state.selected_prefecture_info}**")
+            st.toggle(
+                "🏘️ 市区町村を表示",
+                key="show_municipalities",
+                help="選択中の都道府県の市区町村境界を表示し、市区町村単位で選択できるようにします。",
+            )
+            selected_municipality = get_selected_municipality()
+            if st.session_state.get("show_municipalities") and selected_municipality:
+                st.success(f"🏘️ **{selected_municipality}**")
         else:
             st.info(
                 "🖱️ 地図上の都道府県をクリックするか、上のメニューから選択してください。"
             )
+
+        quota = get_search_quota()
+        st.caption(f"🔎 Google検索API: {quota.summary()}")
+        if quota.low:
+            st.caption(
+                "⚠️ 残りが少ないため、可能な限りキャッシュ済みの検索結果を使います。"
+            )
+        for limiter_stats in get_limiter_stats():
+            if limiter_stats.in_flight or limiter_stats.waiting:
+                st.caption(f"🧮 {limiter_stats.summary()}")
     return user_location
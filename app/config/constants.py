@@ -1,3 +1,5 @@
+import os
+
 JAPAN_PREFECTURES = [
     "北海道",
     "青森県",
@@ -64,3 +66,156 @@ JAPAN_BOUNDS = {
     "min_zoom": 4,
     "max_zoom": 12,
 }
+
+# --- 地図データ (GeoJSON) ---
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(APP_DIR, "data")
+# アプリに同梱する都道府県GeoJSON (存在しない場合のみ GEOJSON_SOURCE_URL から取得して保存)
+GEOJSON_LOCAL_PATH = os.path.join(DATA_DIR, "japan.geojson")
+GEOJSON_SOURCE_URL = (
+    "https://raw.githubusercontent.com/dataofjapan/land/master/japan.geojson"
+)
+# 前処理済みデータのキャッシュ先 (環境変数 GEO_CACHE_DIR で上書き可能)
+GEO_CACHE_DIR = os.getenv("GEO_CACHE_DIR", os.path.join(DATA_DIR, "cache"))
+# 前処理の内容を変更した場合はこの値を上げてキャッシュを無効化する
+GEO_CACHE_VERSION = 1
+# ズームレベル別の簡略化許容誤差 (度)。(このズーム以上で使用, 許容誤差) を粗い順に並べる。
+# 最も細かい段階が GeoDataFrame の geometry 列となり、位置判定や重心計算にも使われる。
+GEOMETRY_LOD_TIERS = (
+    (4, 0.02),
+    (6, 0.005),
+    (8, 0.001),
+    (10, 0.0002),
+)
+
+# 地図ジオメトリの配信方式
+# - "inline": deck の仕様にGeoJSONを埋め込み、再実行ごとにWebSocketで送る
+# - "static": Streamlitの静的配信 (app/static) にGeoJSONを書き出しURLで参照させる
+#   (ブラウザ側でキャッシュされ、再実行時はビュー状態と選択状態のみ送られる)
+MAP_GEOMETRY_DELIVERY = os.getenv("MAP_GEOMETRY_DELIVERY", "inline")
+STATIC_GEO_DIR = os.path.join(APP_DIR, "static", "geo")
+STATIC_GEO_URL_PREFIX = "app/static/geo"
+# ブラウザへ送る座標の小数桁数。None の場合はLOD段階の許容誤差から決める
+MAP_COORDINATE_PRECISION = (
+    int(os.environ["MAP_COORDINATE_PRECISION"])
+    if os.getenv("MAP_COORDINATE_PRECISION")
+    else None
+)
+
+# --- 市区町村 (第2階層) ---
+# 都道府県ごとに app/data/municipalities/{都道府県コード}.json を同梱する
+# (国土数値情報 行政区域データ N03 形式。無い場合のみ取得して保存)
+MUNICIPALITY_DATA_DIR = os.path.join(DATA_DIR, "municipalities")
+MUNICIPALITY_SOURCE_URL_TEMPLATE = "https://raw.githubusercontent.com/niiyz/JapanCityGeoJson/master/geojson/prefectures/{pref_code}.json"
+MUNICIPALITY_SIMPLIFY_TOLERANCE = 0.0005
+# メモリ上に保持する都道府県別市区町村データの上限
+MUNICIPALITY_CACHE_MAX_PREFECTURES = 4
+
+# --- 現在地 (ジオロケーション) のフィルタ ---
+# 前回採用した位置からこの距離 (m) 未満の移動は無視する
+GEOLOCATION_MIN_DISTANCE_M = 100
+# 前回採用してからこの秒数が経つまでは新しい位置を採用しない
+GEOLOCATION_MIN_INTERVAL_SEC = 3.0
+# 都道府県境からこの距離 (m) 以内の位置では都道府県を切り替えない (境界付近の揺らぎ対策)
+GEOLOCATION_HYSTERESIS_M = 300
+
+# --- Webページ取得キャッシュ ---
+# 検索結果ページのHTMLを圧縮してSQLiteに保存する (環境変数 WEB_CACHE_PATH で変更可能)
+WEB_CACHE_PATH = os.getenv(
+    "WEB_CACHE_PATH", os.path.join(DATA_DIR, "cache", "web_cache.sqlite3")
+)
+# この時間内に取得したページは再取得せずに使い、過ぎたら条件付きリクエストで再検証する
+PAGE_CACHE_TTL_SEC = 24 * 60 * 60
+# タイムアウト・403・HTML以外の応答などの失敗を記録し、この時間は再試行しない
+PAGE_FAILURE_TTL_SEC = 30 * 60
+
+# --- Google検索 (Custom Search JSON API) 結果のキャッシュ ---
+# 同じクエリ・件数の検索結果はこの時間内なら再利用する (WEB_CACHE_PATH に保存)
+SEARCH_CACHE_TTL_SEC = 7 * 24 * 60 * 60
+# 1日あたりのCSEクエリ上限 (無料枠は100件)。日付の区切りはAPIと同じ太平洋時間
+CSE_DAILY_QUOTA = int(os.getenv("CSE_DAILY_QUOTA", "100"))
+# 残りがこの件数以下になったら、期限切れでもキャッシュ済みの結果を優先して使う
+CSE_QUOTA_RESERVE = int(os.getenv("CSE_QUOTA_RESERVE", "10"))
+
+# --- サブタイトル画像の生成 ---
+# "batch": 全サブタイトルの画像プロンプトを1回のLLM呼び出しでまとめて作る
+# "per_image": 従来通り画像ごとにLLMでプロンプトを作る
+SUBTITLE_PROMPT_MODE = os.getenv("SUBTITLE_PROMPT_MODE", "batch")
+# Imagen の同時呼び出し数の上限 (プロセス全体で共有)
+IMAGE_MAX_CONCURRENCY = int(os.getenv("IMAGE_MAX_CONCURRENCY", "3"))
+
+# --- 記事本文の生成 ---
+# "stream": 生成中のJSONを逐次解析し、できた部分から画面に表示する
+# "invoke": 従来通り全文の生成を待ってから表示する
+ARTICLE_GENERATION_MODE = os.getenv("ARTICLE_GENERATION_MODE", "stream")
+
+# --- 記事本文の参考情報 ---
+# タイトル生成時の検索結果 (コーパス) から、タイトル・サブタイトルに関連する段落を選んで使い、
+# 記事生成での2回目の検索とページ取得を省く。
+# 関連する段落が見つかったサブタイトルの割合がこれ未満の場合は、従来通り改めて検索する
+CORPUS_MIN_COVERAGE = float(os.getenv("CORPUS_MIN_COVERAGE", "0.6"))
+# サブタイトルの語 (文字2-gram) のうちコーパスに現れる語を、IDFの重みでこの割合以上含む段落があれば
+# 「関連する段落がある」とみなす
+CORPUS_MIN_TERM_OVERLAP = 0.5
+# 選んだ段落の合計がこの文字数未満の場合も改めて検索する
+CORPUS_MIN_CONTEXT_CHARS = 1500
+# 記事生成に渡す段落の合計文字数の上限と、段落の目安の長さ
+CORPUS_CONTEXT_MAX_CHARS = 7500
+CORPUS_PASSAGE_CHARS = 400
+# コーパスに保持する1ページあたりの文字数の上限
+CORPUS_MAX_CHARS_PER_PAGE = 20000
+
+# --- Vertex AI 呼び出しの流量制御 ---
+# チャットモデルの同時呼び出し数の上限。429や応答時間の急増を検知すると自動で下げる
+VERTEX_CHAT_MAX_CONCURRENCY = int(os.getenv("VERTEX_CHAT_MAX_CONCURRENCY", "8"))
+# 429・503などの一時的なエラーの再試行回数と、指数バックオフの基準・上限 (秒)
+MODEL_CALL_MAX_RETRIES = int(os.getenv("MODEL_CALL_MAX_RETRIES", "4"))
+MODEL_CALL_BACKOFF_BASE_SEC = 1.0
+MODEL_CALL_BACKOFF_MAX_SEC = 30.0
+
+# --- 生成済み記事の保存 ---
+# 完成した記事 (タイトル・本文・名言・画像・HTML) を内容のハッシュで保存する
+ARTICLE_STORE_DIR = os.getenv("ARTICLE_STORE_DIR", os.path.join(DATA_DIR, "articles"))
+# 保存期間 (日) と、同じ対象地域・生成条件ごとに残す記事数の上限
+ARTICLE_RETENTION_DAYS = float(os.getenv("ARTICLE_RETENTION_DAYS", "30"))
+ARTICLE_MAX_PER_TARGET = int(os.getenv("ARTICLE_MAX_PER_TARGET", "10"))
+
+# --- 記事生成ワークフローの途中保存 ---
+# ステップが完了するごとに状態を保存し、失敗・中断した実行を途中から再開できるようにする
+WORKFLOW_CHECKPOINT_PATH = os.getenv(
+    "WORKFLOW_CHECKPOINT_PATH", os.path.join(DATA_DIR, "runs", "workflow_runs.sqlite3")
+)
+# 途中状態の保存期間 (秒)。一時ファイルの画像が消えている可能性が高くなるため長くしない
+WORKFLOW_CHECKPOINT_TTL_SEC = 24 * 60 * 60
+# "running" のまま更新がこの時間 (秒) 止まっている実行は、プロセスの終了などで中断したとみなす
+WORKFLOW_CHECKPOINT_STALE_SEC = 15 * 60
+
+# --- 外部呼び出しの記録・再生 (オフラインでの再現・計測用) ---
+# "off": 通常動作 / "record": 検索・Webページ・LLM・画像生成の要求と応答を記録する
+# "replay": 外部に接続せず、記録した応答を返す
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off")
+CASSETTE_PATH = os.getenv(
+    "CASSETTE_PATH", os.path.join(DATA_DIR, "cassettes", "default.sqlite3")
+)
+# 再生時に記録時の所要時間をどれだけ再現するか (0: 待たない, 1: 記録時と同じだけ待つ)
+CASSETTE_REPLAY_LATENCY = float(os.getenv("CASSETTE_REPLAY_LATENCY", "0"))
+
+# --- 生成処理のトレース ---
+# ワークフローの各ステップと外部呼び出しを区間として記録し、どこで時間がかかったかを残す
+# "off": 記録しない / "jsonl": TRACE_JSONL_PATH に1区間1行で追記する
+# "otlp": TRACE_OTLP_ENDPOINT (OTLP/HTTP のコレクター) に送信する
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "jsonl")
+TRACE_JSONL_PATH = os.getenv(
+    "TRACE_JSONL_PATH", os.path.join(DATA_DIR, "traces", "spans.jsonl")
+)
+TRACE_OTLP_ENDPOINT = os.getenv(
+    "TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"
+)
+# 全体の所要時間がこの秒数未満の実行はトレースを出力しない (0 で全て出力する)
+TRACE_MIN_DURATION_SEC = float(os.getenv("TRACE_MIN_DURATION_SEC", "30"))
+
+# --- 記事の一括事前生成 (batch_generate.py) ---
+# 実行ごとのチェックポイント (都道府県・ステップ単位の進捗) の保存先
+BATCH_CHECKPOINT_DIR = os.getenv(
+    "BATCH_CHECKPOINT_DIR", os.path.join(DATA_DIR, "batch")
+)
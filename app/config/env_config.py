@@ -1,9 +1,15 @@
+import threading
+
 import vertexai
 from dotenv import load_dotenv
 import os
 
+# 設定はプロセスごとに一度だけ読み込み、全セッション・全スレッドで共有する
+_config_data = None
+_config_lock = threading.Lock()
 
-def get_env_config():
+
+def _load_env_config():
     load_dotenv()
     gcp_project_id = os.getenv("GCP_PROJECT_ID")
     gcp_location = os.getenv("GCP_LOCATION")
@@ -20,5 +26,26 @@ def get_env_config():
         "image_model_name": os.getenv("IMAGE_MODEL_NAME"),
         # 検索結果として上位何件を取得するかを設定
         "search_num_results": 5,
+        # 検索結果ページの並行取得: 成功件数がこの数に達したら残りを打ち切る
+        "scrape_target_pages": int(os.getenv("SCRAPE_TARGET_PAGES", "3")),
+        # 検索結果ページ取得全体の制限時間 (秒) とホストごとの同時接続数
+        "scrape_deadline_sec": float(os.getenv("SCRAPE_DEADLINE_SEC", "12")),
+        "scrape_per_host_limit": 2,
+        # 記事生成ワークフローで同時に実行するステップ数の上限
+        # (サブ画像は IMAGE_MAX_CONCURRENCY 件ずつ並行して生成されるため、その分を含めた値)
+        "workflow_max_workers": int(os.getenv("WORKFLOW_MAX_WORKERS", "6")),
     }
     return config_data
+
+
+def get_env_config():
+    """
+    環境変数から設定を読み込んで返す。
+    .env の読み込みと vertexai.init は初回呼び出し時のみ行い、以降は同じ設定の複製を返す。
+    """
+    global _config_data
+    if _config_data is None:
+        with _config_lock:
+            if _config_data is None:
+                _config_data = _load_env_config()
+    return dict(_config_data)
@@ -1,6 +1,8 @@
 import streamlit as st
 from components.map_section import map_section
 from components.article_html_section import article_generator_app
+from utils.model_clients import warm_up_models
+from utils.state_manager import get_selected_municipality
 
 
 def main():
@@ -12,11 +14,23 @@ def main():
     st.title("地図の中の哲学者")
 
     map_section()
+    # 地図を描画した後で、記事生成に使うモデルの読み込みを裏で始めておく
+    warm_up_models()
 
     selected_prefecture_name = st.session_state.get("selected_prefecture_info")
+    selected_municipality_name = (
+        get_selected_municipality()
+        if st.session_state.get("show_municipalities")
+        else None
+    )
 
     if selected_prefecture_name:
-        article_generator_app(selected_prefecture_name)
+        # 市区町村が選択されている場合は「北海道札幌市中央区」のように記事対象を絞り込む
+        article_generator_app(
+            f"{selected_prefecture_name}{selected_municipality_name}"
+            if selected_municipality_name
+            else selected_prefecture_name
+        )
 
 
 if __name__ == "__main__":
@@ -1,17 +1,25 @@
 import os
+import queue
 import tempfile
-from typing import TypedDict, List, Dict, Any, Iterator
+from typing import TypedDict, List, Dict, Any, Iterator, Optional
 
+from config.constants import IMAGE_MAX_CONCURRENCY, SUBTITLE_PROMPT_MODE
 from config.env_config import get_env_config
 from .workflow_steps import (
     generate_search_query,
     perform_google_search,
     scrape_and_prepare_context,
+    has_context,
+    select_context_from_corpus,
     generate_article_content,
     generate_aphorism,
     generate_main_image,
     format_html,
 )
+from .article_store import save_article_from_state
+from .workflow_checkpoint import get_workflow_checkpoint_store, workflow_run_id
+from .workflow_graph import WorkflowTask, run_task_graph
+from .tracing import span
 
 
 # 状態管理用のクラス
@@ -21,6 +29,8 @@ class AgentState(TypedDict):
     search_query: str
     raw_search_results: List[Dict[str, Any]]
     scraped_context: str
+    # 参考情報の取得元 ("search" / "title_corpus" / "title_corpus+search")
+    context_source: str
     generated_article_json: Dict[str, Any]
     initial_article_title: str
     initial_article_content: str
@@ -29,6 +39,13 @@ class AgentState(TypedDict):
     aphorism: str
     html_output: str
     error: str | None
+    # 実行したステップの所要時間 (秒) と、詳細な内訳を記録したトレースのID
+    step_durations: Dict[str, float]
+    trace_id: str | None
+    # 途中保存・再開用
+    run_id: str
+    subtitle_image_plan: Dict[str, Any]
+    subtitle_image_slots: List[str | None]
 
 
 def generate_single_subtitle_image(
@@ -40,15 +57,21 @@ def generate_single_subtitle_image(
     regional_characteristics: str,
     temp_dir: str,
     index: int,
+    image_prompt: str | None = None,
 ) -> str | None:
-    """単一サブタイトル画像の生成"""
+    """単一サブタイトル画像の生成 (image_prompt が与えられた場合はLLM呼び出しを省く)"""
     try:
         from utils.generate_titles_images import _generate_image_prompt, _generate_image
 
         # 画像プロンプト生成
-        image_prompt = _generate_image_prompt(
-            llm, selected_prefecture_name, main_title, subtitle, regional_characteristics
-        )
+        if image_prompt is None:
+            image_prompt = _generate_image_prompt(
+                llm,
+                selected_prefecture_name,
+                main_title,
+                subtitle,
+                regional_characteristics,
+            )
 
         # 画像生成実行
         image_bytes = _generate_image(image_model, image_prompt, index, 1)
@@ -65,24 +88,44 @@ def generate_single_subtitle_image(
             with open(image_file_path, "wb") as f:
                 f.write(image_bytes)
 
-            (f"💾 画像 {index + 1} を保存: {image_file_path}")
+            print(f"💾 画像 {index + 1} を保存: {image_file_path}")
             return image_file_path
         return None
 
     except Exception as e:
-        (f"画像生成エラー: {e}")
+        print(f"画像生成エラー: {e}")
         return None
 
 
+def _file_exists(path: str | None) -> bool:
+    return bool(path) and os.path.exists(path)
+
+
+def article_generation_params(attempt_prefecture_image: bool = True) -> Dict[str, Any]:
+    """保存済み記事を再利用してよいかの判定に使う生成条件"""
+    settings = get_env_config()
+    return {
+        "model_name": settings.get("model_name"),
+        "image_model_name": settings.get("image_model_name"),
+        "subtitle_prompt_mode": SUBTITLE_PROMPT_MODE,
+        "with_images": attempt_prefecture_image,
+    }
+
+
 def generate_article_workflow(
     main_title_input: str,
     subtitles_input: List[str],
     selected_prefecture_name: str,
     attempt_prefecture_image: bool = True,
+    corpus: Optional[List[Dict[str, Any]]] = None,
 ) -> Iterator[Dict[str, Any]]:
-    """記事生成ワークフローのメイン関数"""
+    """
+    記事生成ワークフローのメイン関数
+    corpus にタイトル生成時に取得したページ (generate_titles_for_prefecture の "corpus") を渡すと、
+    そこから参考情報を選び、不足する場合のみ改めて検索する。
+    """
 
-    (f"\n--- 「{main_title_input}」に関する記事生成を開始します ---")
+    print(f"\n--- 「{main_title_input}」に関する記事生成を開始します ---")
 
     # 初期状態設定
     state = AgentState(
@@ -92,6 +135,7 @@ def generate_article_workflow(
         search_query="",
         raw_search_results=[],
         scraped_context="",
+        context_source="search",
         generated_article_json={},
         initial_article_title="",
         initial_article_content="",
@@ -102,60 +146,138 @@ def generate_article_workflow(
         error=None,
     )
 
+    # 同じ地域・タイトル・生成条件の実行が途中で終わっていれば、その状態から再開する
+    generation_params = article_generation_params(attempt_prefecture_image)
+    run_id = workflow_run_id(
+        selected_prefecture_name, main_title_input, subtitles_input, generation_params
+    )
+    checkpoints = get_workflow_checkpoint_store()
     try:
-        # ステップ1: 検索クエリ生成
-        yield {
-            "step": "search_query",
-            "message": "検索クエリを生成しています",
-            "state": state,
-        }
-        state = generate_search_query(state)
-        # ステップ2: Google検索実行
-        yield {
-            "step": "google_search",
-            "message": "Web検索を実行しています",
-            "state": state,
-        }
-        state = perform_google_search(state)
-
-        # ステップ3: コンテキスト情報収集
-        yield {
-            "step": "scrape_context",
-            "message": "関連情報を収集しています",
-            "state": state,
-        }
-        state = scrape_and_prepare_context(state)
-
-        # ステップ4: 記事本文生成
-        yield {
-            "step": "generate_article",
-            "message": "記事本文を生成しています",
-            "state": state,
-        }
-        state = generate_article_content(state)
-
-        # ステップ5: 地域の名言生成
-        yield {
-            "step": "generate_aphorism",
-            "message": "地域の名言を生成しています",
-            "state": state,
-        }
-        state = generate_aphorism(state)
-
-        # ステップ6: 4コマ画像生成
-        if attempt_prefecture_image:
-            yield {
-                "step": "main_image",
-                "message": "4コマ画像を生成しています",
-                "state": state,
-                "image_progress": {"type": "main_image"},
+        saved_run = checkpoints.load(run_id)
+    except Exception as e:
+        print(f"⚠️ 途中状態の読み込みに失敗しました: {e}")
+        saved_run = None
+    if saved_run is not None:
+        state.update(saved_run.state)
+        state["error"] = None
+        print(
+            f"♻️ 前回の実行 ({run_id}) の途中から再開します: "
+            f"{saved_run.completed_steps}"
+        )
+    state["run_id"] = run_id
+    state["step_durations"] = {}
+    state["trace_id"] = None
+
+    def save_checkpoint(status: str = "running"):
+        # 出力が揃っている (再開時に省略される) ステップを完了済みとして記録する
+        completed_steps = [
+            task.name for task in tasks if task.is_complete and task.is_complete()
+        ]
+        try:
+            checkpoints.save(
+                run_id, selected_prefecture_name, state, completed_steps, status
+            )
+        except Exception as e:
+            print(f"⚠️ 途中状態の保存に失敗しました: {e}")
+
+    # 生成途中の記事本文を画面に逐次表示するための途中経過
+    article_updates: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+
+    def report_article_progress(partial_article: Dict[str, Any]):
+        article_updates.put(
+            {
+                "step": "generate_article",
+                "message": "記事本文を生成しています",
+                "article_preview": partial_article,
             }
-            state = generate_main_image(state, attempt_prefecture_image)
+        )
 
-        # ステップ7以降: サブタイトル画像の個別生成
-        if attempt_prefecture_image and state["subtitles"]:
-            total_count = len(state["subtitles"])
+    # 前回タイトル生成時のページから参考情報を作った実行は、再開時もそのステップとして扱う
+    # (呼び出し側はコーパスを保存していないため、再開時の corpus は None になる)
+    resumed_from_corpus = has_context(state) and state["context_source"].startswith(
+        "title_corpus"
+    )
+    if corpus or resumed_from_corpus:
+        # タイトル生成時のページから参考情報を選ぶ (不足する場合はこのステップ内で検索する)
+        tasks = [
+            WorkflowTask(
+                name="corpus_context",
+                message="タイトル生成時の検索結果から関連情報を選んでいます",
+                run=lambda: select_context_from_corpus(state, corpus or []),
+                is_complete=lambda: has_context(state),
+            ),
+        ]
+    else:
+        # 検索 → スクレイピング → 本文生成 は直列に依存する
+        # 参考情報が取得済みであれば、検索クエリ・検索結果が無くても作り直さない
+        tasks = [
+            WorkflowTask(
+                name="search_query",
+                message="検索クエリを生成しています",
+                run=lambda: generate_search_query(state),
+                is_complete=lambda: bool(state["search_query"]) or has_context(state),
+            ),
+            WorkflowTask(
+                name="google_search",
+                message="Web検索を実行しています",
+                run=lambda: perform_google_search(state),
+                depends_on=("search_query",),
+                is_complete=lambda: bool(state["raw_search_results"])
+                or has_context(state),
+            ),
+            WorkflowTask(
+                name="scrape_context",
+                message="関連情報を収集しています",
+                run=lambda: scrape_and_prepare_context(state),
+                depends_on=("google_search",),
+                is_complete=lambda: has_context(state),
+            ),
+        ]
+    tasks += [
+        WorkflowTask(
+            name="generate_article",
+            message="記事本文を生成しています",
+            run=lambda: generate_article_content(state, report_article_progress),
+            depends_on=(tasks[-1].name,),
+            is_complete=lambda: bool(state["generated_article_json"].get("block")),
+        ),
+        # 名言はタイトルのみに依存するため、検索と並行して生成する
+        WorkflowTask(
+            name="generate_aphorism",
+            message="地域の名言を生成しています",
+            run=lambda: generate_aphorism(state),
+            is_complete=lambda: bool(state["aphorism"]),
+        ),
+    ]
+
+    # 画像は都道府県とタイトルのみに依存するため、記事本文の生成と並行して作る
+    if attempt_prefecture_image:
+        tasks.append(
+            WorkflowTask(
+                name="main_image",
+                message="4コマ画像を生成しています",
+                run=lambda: generate_main_image(state, attempt_prefecture_image),
+                image_progress={"type": "main_image"},
+                pool="images",
+                is_complete=lambda: _file_exists(state["main_theme_image_path"]),
+            )
+        )
 
+    subtitle_image_slots: List[str | None] = []
+    if attempt_prefecture_image and state["subtitles"]:
+        total_count = len(state["subtitles"])
+        # 前回の実行で保存済みの画像は、ファイルが残っていれば再利用する
+        saved_slots = state.get("subtitle_image_slots") or []
+        if len(saved_slots) == total_count:
+            subtitle_image_slots = [
+                path if _file_exists(path) else None for path in saved_slots
+            ]
+        else:
+            subtitle_image_slots = [None] * total_count
+        state["subtitle_image_slots"] = subtitle_image_slots
+        subtitle_models: Dict[str, Any] = {}
+
+        def prepare_subtitle_images():
             try:
                 # 設定読み込み
                 settings = get_env_config()
@@ -164,79 +286,175 @@ def generate_article_workflow(
                 from utils.generate_titles_images import (
                     _initialize_vertex_ai,
                     _generate_regional_characteristics,
+                    _generate_image_prompts_batch,
                 )
 
                 image_model, llm = _initialize_vertex_ai(
                     settings["gcp_project_id"],
                     settings["gcp_location"],
-                    settings.get(
-                        "image_gen_model_name", "imagen-3.0-fast-generate-001"
-                    ),
+                    settings.get("image_model_name"),
                     settings.get("model_name", "gemini-1.5-pro-001"),
                 )
 
                 if not image_model or not llm:
                     raise ValueError("モデル初期化に失敗しました")
 
+                # 地域特性・画像プロンプト・保存先は途中保存し、再開時には作り直さない
+                plan = state.get("subtitle_image_plan") or {}
                 # 地域特性生成（一度だけ）
-                regional_characteristics = _generate_regional_characteristics(
-                    llm, state["selected_prefecture_name"]
-                )
-
-                # 一時ディレクトリ作成
-                temp_dir = tempfile.mkdtemp(prefix=f"img_{state['main_title']}_")
-                generated_paths = []
-
-                # 各サブタイトル画像を順次生成
-                for i, subtitle in enumerate(state["subtitles"]):
-                    # 進捗状況をUI送信（画像生成開始前）
-                    yield {
-                        "step": f"subtitle_image_{i+1}",
-                        "message": f"サブ画像生成中 [{i+1}/{total_count}]: 「{subtitle}」",
-                        "state": state,
-                        "image_progress": {
-                            "type": "subtitle_image",
-                            "current": i + 1,
-                            "total": total_count,
-                            "subtitle": subtitle,
-                        },
-                    }
-
-                    # 実際の画像生成処理
-                    image_path = generate_single_subtitle_image(
+                if "regional_characteristics" not in plan:
+                    plan["regional_characteristics"] = (
+                        _generate_regional_characteristics(
+                            llm, state["selected_prefecture_name"]
+                        )
+                    )
+                # 画像プロンプトを1回のLLM呼び出しでまとめて作成
+                if SUBTITLE_PROMPT_MODE == "batch" and "image_prompts" not in plan:
+                    plan["image_prompts"] = _generate_image_prompts_batch(
                         llm,
-                        image_model,
                         state["selected_prefecture_name"],
                         state["main_title"],
-                        subtitle,
-                        regional_characteristics,
-                        temp_dir,
-                        i,
+                        state["subtitles"],
+                        plan["regional_characteristics"],
                     )
-
-                    # 生成成功時はパスを保存
-                    if image_path:
-                        generated_paths.append(image_path)
-
-                # 生成されたパスを状態に保存
-                state["subtitle_image_paths"] = generated_paths
-
+                # 一時ディレクトリ作成
+                if not plan.get("temp_dir") or not os.path.isdir(plan["temp_dir"]):
+                    plan["temp_dir"] = tempfile.mkdtemp(
+                        prefix=f"img_{state['main_title']}_"
+                    )
+                state["subtitle_image_plan"] = plan
+                subtitle_models["image_model"] = image_model
+                subtitle_models["llm"] = llm
             except Exception as e:
                 state["error"] = f"サブ画像生成エラー: {e}"
-                (f"サブ画像生成エラー: {e}")
 
-        # 最終ステップ: HTML整形
-        yield {"step": "format_html", "message": "HTMLを整形しています", "state": state}
-        state = format_html(state)
+        def generate_subtitle_image(index: int, subtitle: str):
+            if "llm" not in subtitle_models:
+                return
+            plan = state["subtitle_image_plan"]
+            subtitle_image_slots[index] = generate_single_subtitle_image(
+                subtitle_models["llm"],
+                subtitle_models["image_model"],
+                state["selected_prefecture_name"],
+                state["main_title"],
+                subtitle,
+                plan["regional_characteristics"],
+                plan["temp_dir"],
+                index,
+                plan.get("image_prompts", [None] * total_count)[index],
+            )
+
+        tasks.append(
+            WorkflowTask(
+                name="subtitle_image_setup",
+                run=prepare_subtitle_images,
+                is_complete=lambda: all(subtitle_image_slots),
+                # 再開時はモデルを読み込み直すだけで、途中保存した地域特性・プロンプトは作り直さない。
+                # 生成済みの画像は再利用し、足りない画像だけを生成する
+                invalidates_dependents=False,
+            )
+        )
+        for i, subtitle in enumerate(state["subtitles"]):
+            tasks.append(
+                WorkflowTask(
+                    name=f"subtitle_image_{i+1}",
+                    message=f"サブ画像生成中 [{i+1}/{total_count}]: 「{subtitle}」",
+                    run=lambda i=i, subtitle=subtitle: generate_subtitle_image(
+                        i, subtitle
+                    ),
+                    depends_on=("subtitle_image_setup",),
+                    pool="images",
+                    image_progress={
+                        "type": "subtitle_image",
+                        "current": i + 1,
+                        "total": total_count,
+                        "subtitle": subtitle,
+                    },
+                    is_complete=lambda i=i: subtitle_image_slots[i] is not None,
+                )
+            )
+
+    def finalize_html():
+        if subtitle_image_slots:
+            # 生成に成功した画像のみ、サブタイトルの順序を保って状態に保存
+            state["subtitle_image_paths"] = [
+                path for path in subtitle_image_slots if path
+            ]
+        format_html(state)
+
+    # 最終ステップ: HTML整形 (全ての枝の完了を待つ)
+    tasks.append(
+        WorkflowTask(
+            name="format_html",
+            message="HTMLを整形しています",
+            run=finalize_html,
+            depends_on=tuple(task.name for task in tasks),
+        )
+    )
 
-        # 完了通知
-        yield {"step": "__end__", "message": "記事生成が完了しました", "state": state}
+    # 実行全体を1つのトレースとし、各ステップ・外部呼び出しをその子区間として記録する
+    with span(
+        "article_workflow",
+        prefecture=selected_prefecture_name,
+        main_title=main_title_input,
+        run_id=run_id,
+        resumed=saved_run is not None,
+        corpus_documents=len(corpus or []),
+    ) as trace_span:
+        if trace_span.recording:
+            state["trace_id"] = trace_span.trace_id
+        try:
+            settings = get_env_config()
+            yield from run_task_graph(
+                tasks,
+                state,
+                max_workers=settings.get("workflow_max_workers", 4),
+                updates=article_updates,
+                on_task_done=lambda step: save_checkpoint(),
+                durations=state["step_durations"],
+                # 画像生成はImagenの枠を待つ間スレッドを占有するため、専用のプールで実行する
+                pool_sizes={"images": IMAGE_MAX_CONCURRENCY},
+            )
+
+            # 正常に完成した記事は保存し、同じ地域の記事として再利用できるようにする
+            if not state.get("error") and state.get("html_output"):
+                try:
+                    state["article_id"] = save_article_from_state(
+                        selected_prefecture_name, generation_params, state
+                    )
+                except Exception as e:
+                    print(f"⚠️ 記事の保存に失敗しました: {e}")
+
+            # 完成した実行の途中状態は不要。失敗した場合は次回の再開用に残す
+            if state.get("article_id"):
+                try:
+                    checkpoints.delete(run_id)
+                except Exception as e:
+                    print(f"⚠️ 途中状態の削除に失敗しました: {e}")
+            else:
+                save_checkpoint(status="failed")
+
+            # 完了通知
+            final_event = {
+                "step": "__end__",
+                "message": "記事生成が完了しました",
+                "state": state,
+            }
 
-    except Exception as e:
-        # エラー発生時の処理
-        yield {
-            "step": "workflow_error",
-            "error": f"ワークフロー実行エラー: {e}",
-            "message": f"ワークフロー実行中にエラーが発生しました: {e}",
-            "state": state,
-        }
+        except Exception as e:
+            # エラー発生時の処理
+            save_checkpoint(status="failed")
+            trace_span.record_error(f"{type(e).__name__}: {e}")
+            final_event = {
+                "step": "workflow_error",
+                "error": f"ワークフロー実行エラー: {e}",
+                "message": f"ワークフロー実行中にエラーが発生しました: {e}",
+                "state": state,
+            }
+        trace_span.set("article_id", state.get("article_id"))
+        trace_span.set("context_source", state.get("context_source"))
+        if state.get("error"):
+            trace_span.record_error(state["error"])
+
+    # 最後のイベントの後に呼び出し側が反復をやめても、トレースは閉じておく
+    yield final_event
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import zlib
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from config.constants import (
+    ARTICLE_MAX_PER_TARGET,
+    ARTICLE_RETENTION_DAYS,
+    ARTICLE_STORE_DIR,
+)
+
+
+@dataclass(frozen=True, slots=True)
+class StoredArticleSummary:
+    """記事一覧の表示用の情報"""
+
+    article_id: str
+    target: str
+    title: str
+    created_at: float
+
+    def label(self) -> str:
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.created_at))
+        return f"{self.title} ({created})"
+
+
+@dataclass(frozen=True)
+class StoredArticle:
+    """保存済み記事の全内容。画像はバイト列で保持する"""
+
+    article_id: str
+    target: str
+    params_key: str
+    created_at: float
+    main_title: str
+    subtitles: List[str]
+    blocks: List[str]
+    aphorism: Optional[str]
+    html: str
+    main_image: Optional[bytes]
+    subtitle_images: List[bytes]
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def generation_params_key(params: Dict[str, Any]) -> str:
+    """生成条件 (モデル名など) を表すキー。条件が同じ記事だけを再利用の候補にする"""
+    canonical = json.dumps(params, ensure_ascii=False, sort_keys=True)
+    return _sha256(canonical.encode("utf-8"))[:16]
+
+
+class ArticleStore:
+    """
+    完成した記事を内容のハッシュで保存するストア。
+    画像とHTMLは blobs/ に内容ハッシュ名で置き (同じ画像は1つだけ保存)、
+    記事ごとのマニフェストと一覧用の索引をSQLiteに持つ。
+    """
+
+    def __init__(self, root: str = ARTICLE_STORE_DIR):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.path = os.path.join(root, "articles.sqlite3")
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS articles (
+                    article_id TEXT PRIMARY KEY,
+                    target TEXT NOT NULL,
+                    params_key TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    manifest TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS articles_by_target "
+                "ON articles (target, params_key, created_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    # --- blob ---
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest)
+
+    def _put_blob(self, data: bytes) -> str:
+        digest = _sha256(data)
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            fd, temp_path = tempfile.mkstemp(dir=self.blob_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(zlib.compress(data, 6))
+            os.replace(temp_path, path)
+        return digest
+
+    def _get_blob(self, digest: str) -> bytes:
+        with open(self._blob_path(digest), "rb") as f:
+            return zlib.decompress(f.read())
+
+    # --- 記事 ---
+
+    def save(
+        self,
+        target: str,
+        params_key: str,
+        main_title: str,
+        subtitles: List[str],
+        blocks: List[str],
+        aphorism: Optional[str],
+        html: str,
+        main_image: Optional[bytes] = None,
+        subtitle_images: Optional[List[bytes]] = None,
+    ) -> str:
+        """記事を保存して記事IDを返す。同じ内容の記事は同じIDになり、重複して保存されない"""
+        manifest = {
+            "target": target,
+            "params_key": params_key,
+            "main_title": main_title,
+            "subtitles": list(subtitles),
+            "blocks": list(blocks),
+            "aphorism": aphorism,
+            "html": self._put_blob(html.encode("utf-8")),
+            "main_image": self._put_blob(main_image) if main_image else None,
+            "subtitle_images": [
+                self._put_blob(image) for image in subtitle_images or []
+            ],
+        }
+        manifest_json = json.dumps(manifest, ensure_ascii=False, sort_keys=True)
+        article_id = _sha256(manifest_json.encode("utf-8"))
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO articles VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    article_id,
+                    target,
+                    params_key,
+                    main_title,
+                    time.time(),
+                    manifest_json,
+                ),
+            )
+        self.prune()
+        return article_id
+
+    def list_recent(
+        self, target: str, params_key: Optional[str] = None, limit: int = 5
+    ) -> List[StoredArticleSummary]:
+        """対象地域の記事を新しい順に返す (params_key を指定した場合は同じ生成条件のみ)"""
+        query = (
+            "SELECT article_id, target, title, created_at FROM articles "
+            "WHERE target = ?"
+        )
+        args: List[Any] = [target]
+        if params_key is not None:
+            query += " AND params_key = ?"
+            args.append(params_key)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        args.append(limit)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query, args).fetchall()
+        return [StoredArticleSummary(*row) for row in rows]
+
+    def load(self, article_id: str) -> Optional[StoredArticle]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT created_at, manifest FROM articles WHERE article_id = ?",
+                (article_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        created_at, manifest_json = row
+        manifest = json.loads(manifest_json)
+        try:
+            return StoredArticle(
+                article_id=article_id,
+                target=manifest["target"],
+                params_key=manifest["params_key"],
+                created_at=created_at,
+                main_title=manifest["main_title"],
+                subtitles=manifest["subtitles"],
+                blocks=manifest["blocks"],
+                aphorism=manifest["aphorism"],
+                html=self._get_blob(manifest["html"]).decode("utf-8"),
+                main_image=(
+                    self._get_blob(manifest["main_image"])
+                    if manifest["main_image"]
+                    else None
+                ),
+                subtitle_images=[
+                    self._get_blob(digest) for digest in manifest["subtitle_images"]
+                ],
+            )
+        except FileNotFoundError:
+            print(f"⚠️ 記事 {article_id[:12]} の画像またはHTMLが見つかりません")
+            return None
+
+    def prune(self) -> None:
+        """保存期間を過ぎた記事と、対象地域・生成条件ごとの上限を超えた古い記事を削除する"""
+        cutoff = time.time() - ARTICLE_RETENTION_DAYS * 24 * 60 * 60
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM articles WHERE created_at < ?", (cutoff,))
+            conn.execute(
+                """
+                DELETE FROM articles WHERE article_id IN (
+                    SELECT article_id FROM (
+                        SELECT article_id, ROW_NUMBER() OVER (
+                            PARTITION BY target, params_key ORDER BY created_at DESC
+                        ) AS rank
+                        FROM articles
+                    ) WHERE rank > ?
+                )
+                """,
+                (ARTICLE_MAX_PER_TARGET,),
+            )
+            manifests = [
+                row[0] for row in conn.execute("SELECT manifest FROM articles")
+            ]
+
+        referenced = set()
+        for manifest_json in manifests:
+            manifest = json.loads(manifest_json)
+            referenced.add(manifest["html"])
+            if manifest["main_image"]:
+                referenced.add(manifest["main_image"])
+            referenced.update(manifest["subtitle_images"])
+
+        # 保存処理中のblobを消さないよう、作成から時間の経っていないものは残す
+        grace_cutoff = time.time() - 60 * 60
+        for name in os.listdir(self.blob_dir):
+            path = os.path.join(self.blob_dir, name)
+            if name not in referenced and os.path.getmtime(path) < grace_cutoff:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+_article_store: Optional[ArticleStore] = None
+
+
+def get_article_store() -> ArticleStore:
+    global _article_store
+    if _article_store is None:
+        _article_store = ArticleStore()
+    return _article_store
+
+
+def _read_file(path: Optional[str]) -> Optional[bytes]:
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def save_article_from_state(
+    target: str, params: Dict[str, Any], state: Dict[str, Any]
+) -> str:
+    """ワークフローの最終状態から記事を保存して記事IDを返す"""
+    subtitle_paths = state.get("subtitle_image_paths") or []
+    subtitle_images = [
+        image for image in (_read_file(path) for path in subtitle_paths) if image
+    ]
+    return get_article_store().save(
+        target=target,
+        params_key=generation_params_key(params),
+        main_title=state.get("initial_article_title") or state.get("main_title", ""),
+        subtitles=state.get("subtitles", []),
+        blocks=state.get("generated_article_json", {}).get("block", []),
+        aphorism=state.get("aphorism"),
+        html=state.get("html_output", ""),
+        main_image=_read_file(state.get("main_theme_image_path")),
+        subtitle_images=subtitle_images,
+    )
@@ -0,0 +1,238 @@
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import closing
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config.constants import CASSETTE_MODE, CASSETTE_PATH, CASSETTE_REPLAY_LATENCY
+
+
+class CassetteMiss(Exception):
+    """再生モードで、カセットに記録されていない呼び出しが行われた"""
+
+
+class RecordedCallError(Exception):
+    """記録時に失敗した呼び出しを再生した (元の例外名とメッセージを持つ)"""
+
+    def __init__(self, error_type: str, message: str):
+        super().__init__(f"{error_type}: {message}")
+        self.error_type = error_type
+
+
+def encode_bytes(data: bytes) -> str:
+    """画像などのバイト列をカセットに保存できる文字列にする"""
+    return base64.b64encode(data).decode("ascii")
+
+
+def decode_bytes(data: str) -> bytes:
+    return base64.b64decode(data)
+
+
+def _request_key(kind: str, request: Any) -> str:
+    canonical = json.dumps(request, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(f"{kind}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+class Cassette:
+    """
+    外部呼び出し (Google検索・Webページ・LLM・画像生成) の要求と応答を記録・再生する。
+    - record: 実際に呼び出し、応答と所要時間をSQLiteのカセットに追記する
+    - replay: 呼び出さずにカセットから応答を返す (同じ要求は記録順に返し、尽きたら最後のものを返す)
+    要求の同一性は kind と要求内容 (JSON化したもの) のハッシュで判定する。
+    """
+
+    def __init__(
+        self,
+        path: str = CASSETTE_PATH,
+        mode: str = CASSETTE_MODE,
+        latency_scale: float = CASSETTE_REPLAY_LATENCY,
+    ):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"不明なカセットのモードです: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._replay_positions: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS recordings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    request_key TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    latency_sec REAL NOT NULL,
+                    recorded_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS recordings_by_key "
+                "ON recordings (kind, request_key, id)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    # --- 保存・読み出し ---
+
+    def _record(self, kind: str, key: str, payload: Any, latency_sec: float) -> None:
+        data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO recordings "
+                "(kind, request_key, payload, latency_sec, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (kind, key, zlib.compress(data, 6), latency_sec, time.time()),
+            )
+
+    def _next_recording(self, kind: str, key: str) -> Tuple[Any, float]:
+        with self._lock:
+            position = self._replay_positions.get((kind, key), 0)
+            self._replay_positions[(kind, key)] = position + 1
+        query = (
+            "SELECT payload, latency_sec FROM recordings "
+            "WHERE kind = ? AND request_key = ? ORDER BY id"
+        )
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                query + " LIMIT 1 OFFSET ?", (kind, key, position)
+            ).fetchone()
+            if row is None:
+                row = conn.execute(query + " DESC LIMIT 1", (kind, key)).fetchone()
+        if row is None:
+            raise CassetteMiss(f"{kind} の呼び出しがカセットに記録されていません")
+        payload, latency_sec = row
+        return json.loads(zlib.decompress(payload)), latency_sec
+
+    def _sleep(self, seconds: float) -> None:
+        if self.latency_scale > 0 and seconds > 0:
+            time.sleep(seconds * self.latency_scale)
+
+    # --- 呼び出し ---
+
+    def call(
+        self,
+        kind: str,
+        request: Any,
+        func: Callable[[], Any],
+        encode: Callable[[Any], Any] = _identity,
+        decode: Callable[[Any], Any] = _identity,
+    ) -> Any:
+        """
+        記録モードでは func() を呼んで結果を encode したものを記録し、
+        再生モードでは記録を decode して返す。失敗した呼び出しは RecordedCallError として再生する。
+        """
+        key = _request_key(kind, request)
+        if self.replaying:
+            payload, latency_sec = self._next_recording(kind, key)
+            self._sleep(latency_sec)
+            if "error" in payload:
+                raise RecordedCallError(payload["error"], payload["message"])
+            return decode(payload["result"])
+
+        started = time.monotonic()
+        try:
+            result = func()
+        except Exception as e:
+            self._record(
+                kind,
+                key,
+                {"error": type(e).__name__, "message": str(e)},
+                time.monotonic() - started,
+            )
+            raise
+        self._record(kind, key, {"result": encode(result)}, time.monotonic() - started)
+        return result
+
+    def stream(
+        self,
+        kind: str,
+        request: Any,
+        func: Callable[[], Iterator[Any]],
+        encode: Callable[[Any], Any] = _identity,
+        decode: Callable[[Any], Any] = _identity,
+    ) -> Iterator[Any]:
+        """
+        ストリーミング呼び出し用の call。チャンクごとの到着間隔も記録・再生する。
+        呼び出し側が途中でストリームを閉じた場合も、それまでに受け取ったチャンクを記録する
+        (再生時は記録したチャンクで終わる)。
+        """
+        key = _request_key(kind, request)
+        if self.replaying:
+            payload, _ = self._next_recording(kind, key)
+            for chunk, delay_sec in zip(payload["chunks"], payload["delays"]):
+                self._sleep(delay_sec)
+                yield decode(chunk)
+            if "error" in payload:
+                raise RecordedCallError(payload["error"], payload["message"])
+            return
+
+        chunks: List[Any] = []
+        delays: List[float] = []
+        # 最後まで受け取れなかった場合 (GeneratorExit など) は途中で閉じたものとして記録する
+        outcome: Dict[str, Any] = {"closed": True}
+        started = last = time.monotonic()
+        try:
+            for chunk in func():
+                now = time.monotonic()
+                chunks.append(encode(chunk))
+                delays.append(now - last)
+                last = now
+                yield chunk
+            outcome = {}
+        except Exception as e:
+            outcome = {"error": type(e).__name__, "message": str(e)}
+            raise
+        finally:
+            self._record(
+                kind,
+                key,
+                {"chunks": chunks, "delays": delays, **outcome},
+                time.monotonic() - started,
+            )
+
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+# set_cassette で差し替えたカセット (CASSETTE_MODE より優先する)
+_cassette_override: Optional[Any] = None
+
+
+def set_cassette(cassette: Optional[Any]) -> None:
+    """
+    共有のカセットを差し替える (ベンチマークの模擬バックエンドなど)。
+    call / stream / replaying を Cassette と同じ形で持つオブジェクトを渡す。None で元に戻す。
+    """
+    global _cassette_override
+    _cassette_override = cassette
+
+
+def get_cassette() -> Optional[Cassette]:
+    """CASSETTE_MODE が "record" / "replay" の場合に共有のカセットを返す ("off" なら None)"""
+    global _cassette
+    if _cassette_override is not None:
+        return _cassette_override
+    if CASSETTE_MODE == "off":
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette()
+            print(f"📼 カセット ({CASSETTE_MODE}): {CASSETTE_PATH}")
+        return _cassette
@@ -1,27 +1,76 @@
 import streamlit as st
 import geopandas as gpd
 from shapely.geometry import Point
-from config.constants import INITIAL_CENTER_LON, INITIAL_CENTER_LAT
+from config.constants import (
+    INITIAL_CENTER_LON,
+    INITIAL_CENTER_LAT,
+    GEOJSON_LOCAL_PATH,
+    GEOJSON_SOURCE_URL,
+    GEOMETRY_LOD_TIERS,
+)
+from utils.geo_cache import (
+    build_cache_key,
+    ensure_local_file,
+    read_cached_frame,
+    write_cached_frame,
+)
+
+PREFECTURE_CACHE_NAME = "prefectures"
+
+
+def lod_geometry_column(tier: int) -> str:
+    """LOD段階に対応するジオメトリ列名を返す (最も細かい段階は geometry 列)"""
+    if tier >= len(GEOMETRY_LOD_TIERS) - 1:
+        return "geometry"
+    return f"geometry_lod{tier}"
+
+
+def attach_centers(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """キャッシュから読み込んだ center_x / center_y から center 列を復元"""
+    gdf["center"] = gpd.points_from_xy(gdf["center_x"], gdf["center_y"])
+    return gdf
+
+
+def get_dataset_key(gdf: gpd.GeoDataFrame) -> str:
+    """load_geojson が付与したデータセットの世代キーを返す (派生キャッシュのキー用)"""
+    return gdf.attrs.get("dataset_key") or f"rows-{len(gdf)}"
 
 
 @st.cache_data
 def load_geojson():
-    urls = [
-        "https://raw.githubusercontent.com/dataofjapan/land/master/japan.geojson",
-    ]
-    gdf = None
-    for url in urls:
-        try:
-            gdf = gpd.read_file(url)
-            if not gdf.empty:
-                break
-        except Exception:
-            pass
+    source_path = ensure_local_file(GEOJSON_LOCAL_PATH, GEOJSON_SOURCE_URL)
+    if source_path is None:
+        st.error("GeoJSONデータをロードできませんでした。")
+        return gpd.GeoDataFrame()
+
+    cache_key = build_cache_key(source_path, {"lod_tiers": GEOMETRY_LOD_TIERS})
+    cached_gdf = read_cached_frame(PREFECTURE_CACHE_NAME, cache_key)
+    if cached_gdf is not None and not cached_gdf.empty:
+        cached_gdf = attach_centers(cached_gdf)
+        cached_gdf.attrs["dataset_key"] = cache_key
+        return cached_gdf
+
+    try:
+        gdf = gpd.read_file(source_path)
+    except Exception:
+        gdf = None
 
     if gdf is None or gdf.empty:
-        st.error("すべてのGeoJSON URLからデータをロードできませんでした。")
+        st.error("GeoJSONデータをロードできませんでした。")
         return gpd.GeoDataFrame()
 
+    gdf = _preprocess(gdf)
+    if not gdf.empty:
+        write_cached_frame(
+            PREFECTURE_CACHE_NAME, cache_key, gdf.drop(columns=["center"])
+        )
+        # 地図描画側のキャッシュ (FeatureCollection等) はこのキーで世代管理する
+        gdf.attrs["dataset_key"] = cache_key
+    return gdf
+
+
+def _preprocess(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """列名の正規化・座標系変換・検証・簡略化・重心計算を行う"""
     column_mappings = {
         "name_ja": "nam_ja",
         "NAME_JA": "nam_ja",
@@ -57,7 +106,12 @@ def load_geojson():
         st.error("有効なジオメトリがありません。")
         return gpd.GeoDataFrame()
 
-    gdf["geometry"] = gdf["geometry"].simplify(tolerance=0.01, preserve_topology=True)
+    # ズームレベルごとの簡略化ジオメトリを事前計算 (元ジオメトリから各段階を作る)
+    source_geometry = gdf["geometry"]
+    for tier, (_, tolerance) in enumerate(GEOMETRY_LOD_TIERS):
+        gdf[lod_geometry_column(tier)] = source_geometry.simplify(
+            tolerance=tolerance, preserve_topology=True
+        )
 
     try:
         gdf["center"] = gdf["geometry"].centroid
@@ -1,36 +1,28 @@
 from PIL import Image
-from vertexai.preview.vision_models import ImageGenerationModel
-from langchain_google_vertexai import ChatVertexAI
 import io
 import json
 import tempfile
 
 from config.env_config import get_env_config
+from utils.model_clients import generate_images, get_chat_model, get_image_model
+from utils.rate_limiter import is_throttle_error
 
-MODEL_LOADED = False
-LLM_LOADED = False
-model = None
-llm = None
-config_settings = None
+# シーン記述の生成に使うLLMのtemperature
+SCENE_LLM_TEMPERATURE = 0.1
 
-print("アプリケーション設定の読み込みを開始します...")
-config_settings = get_env_config()
 
-print(f"画像生成モデル ({config_settings['image_model_name']}) のロードを開始します...")
-model = ImageGenerationModel.from_pretrained(config_settings["image_model_name"])
-MODEL_LOADED = True
-print(f"✅ 画像生成モデル ({config_settings['image_model_name']}) の準備ができました。")
-
-print(f"LLM ({config_settings['model_name']}) の初期化を開始します...")
-llm = ChatVertexAI(
-    model_name=config_settings["model_name"],
-    project=config_settings["gcp_project_id"],
-    location=config_settings["gcp_location"],
-    temperature=0.1,
-)
-LLM_LOADED = True
-print(f"✅ LLM ({config_settings['model_name']}) の準備ができました。")
-print("\n✨ 全てのモデルの準備が整いました。✨\n")
+def _load_models():
+    """
+    画像生成モデルとLLMを取得する。
+    インポート時には読み込まず、初回の画像生成時 (または事前ウォームアップ時) に生成して共有する。
+    """
+    config_settings = get_env_config()
+    model = get_image_model(config_settings["image_model_name"])
+    llm = get_chat_model(
+        model_name=config_settings["model_name"],
+        temperature=SCENE_LLM_TEMPERATURE,
+    )
+    return model, llm
 
 
 prefecture_data_store = {}
@@ -40,11 +32,10 @@ def generate_single_prefecture_data(prefecture_name: str):
     """
     単一の都道府県のデータをLLMで生成する関数
     """
-    if not LLM_LOADED or not llm:
-        print("LLMが初期化されていません。処理を中断します。")
-        return None
-    if not config_settings:
-        print("設定がロードされていません。処理を中断します。")
+    try:
+        _, llm = _load_models()
+    except Exception as e:
+        print(f"LLMを初期化できませんでした。処理を中断します: {e}")
         return None
 
     print(f"▶️  LLMを使用して「{prefecture_name}」のシーン記述を生成します...")
@@ -195,11 +186,10 @@ def generate_four_images(prefecture_name: str) -> str | None:
     生成された画像を一時ファイルに保存してそのパスを返す関数。
     """
     print(f"\n🚀 「{prefecture_name}」の画像生成プロセスを開始します。")
-    if not MODEL_LOADED or not LLM_LOADED or not model or not llm:
-        print("❌ 画像生成モデルまたはLLMが初期化されていません。処理を中止します。")
-        return None
-    if not config_settings:
-        print("❌ 設定情報がロードされていません。処理を中止します。")
+    try:
+        model, _ = _load_models()
+    except Exception as e:
+        print(f"❌ 画像生成モデルを初期化できませんでした。処理を中止します: {e}")
         return None
 
     # ステップ1: データ生成 (プロンプトの元となるシーン記述)
@@ -231,7 +221,8 @@ def generate_four_images(prefecture_name: str) -> str | None:
                 f"\n   📝 画像生成モデルへの最終プロンプト (一部):\n   {comic_prompt[:200]}...\n"
             )  # 長すぎるので一部表示
 
-            images = model.generate_images(
+            images = generate_images(
+                model,
                 prompt=comic_prompt,
                 number_of_images=1,
                 aspect_ratio="1:1",
@@ -239,23 +230,15 @@ def generate_four_images(prefecture_name: str) -> str | None:
             )
 
             if images:
-                pil_image = None
                 print("   🖼️ 画像データを処理中...")
-                # Vertex AI SDK の Image オブジェクトからPillow Imageへの変換
-                if (
-                    hasattr(images[0], "_pil_image")
-                    and images[0]._pil_image is not None
-                ):
-                    pil_image = images[0]._pil_image.copy()
-                elif hasattr(images[0], "load_image_bytes"):
-                    try:
-                        image_bytes = images[0].load_image_bytes()
-                        pil_image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-                    except Exception as img_load_e:
-                        print(
-                            f"   ❌ 画像バイトデータのPillowイメージへの変換エラー: {img_load_e}"
-                        )
-                        return None
+                # 画像のバイト列からPillow Imageへの変換
+                try:
+                    pil_image = Image.open(io.BytesIO(images[0])).convert("RGB")
+                except Exception as img_load_e:
+                    print(
+                        f"   ❌ 画像バイトデータのPillowイメージへの変換エラー: {img_load_e}"
+                    )
+                    return None
 
                 if pil_image:
                     print("   💾 生成画像を一時ファイルに保存中...")
@@ -285,6 +268,10 @@ def generate_four_images(prefecture_name: str) -> str | None:
                 return None
 
         except Exception as e:
+            if is_throttle_error(e):
+                print(
+                    "   ❌ クォータ超過 (429) が続いたため4コマ画像を生成できませんでした。"
+                )
             print(f"   ❌ 画像生成中の予期せぬエラー: {e}")
             return None
     else:
@@ -1,21 +1,22 @@
 import streamlit as st
 from config.env_config import get_env_config
-from langchain_google_vertexai import ChatVertexAI
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain.output_parsers import RetryWithErrorOutputParser
 from langchain_core.exceptions import OutputParserException
 import traceback
 from langchain_core.prompts import ChatPromptTemplate
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Tuple, Union
 from pydantic import BaseModel, Field
 from langchain_core.runnables import (
     RunnableLambda,
     RunnablePassthrough,
 )  # 必要なものをインポート
 from langchain_core.messages import AIMessage  # LLM出力の型ヒント用
-from langchain_google_community.search import GoogleSearchAPIWrapper
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.document_transformers import BeautifulSoupTransformer
+from utils.model_clients import get_chat_model
+from utils.search_cache import search_with_cache
+from utils.web_fetcher import fetch_pages
+from utils.tracing import span
+from utils.search_corpus import corpus_document
 from prompts.PHILOSOPHICAL_TITLES_PROMPT import PHILOSOPHICAL_TITLES_PROMPT
 
 
@@ -34,16 +35,9 @@ class TitlesOutput(BaseModel):
 def _get_search_results(
     query: str, api_key: str, cse_id: str, num_results: int
 ) -> List[Dict[str, Any]]:
-    """Google検索を実行し、結果のリストを返す。"""
-    search_wrapper = GoogleSearchAPIWrapper(
-        google_api_key=api_key,
-        google_cse_id=cse_id,
-    )
-    search_results_list = search_wrapper.results(
-        query=query,
-        num_results=num_results,
-    )
-    print(f"--- 「{query}」の検索結果 (resultsメソッド) ---")
+    """Google検索を実行し (同じクエリはキャッシュを利用)、結果のリストを返す。"""
+    search_results_list, source = search_with_cache(query, api_key, cse_id, num_results)
+    print(f"--- 「{query}」の検索結果 (取得元: {source}) ---")
     if search_results_list:
         for i, result in enumerate(search_results_list):
             print(f"\n結果 {i+1}:")
@@ -57,74 +51,65 @@ def _get_search_results(
 
 def _scrape_and_prepare_context(
     search_results_list: List[Dict[str, Any]], settings: dict
-) -> str:
-    """検索結果のURLからウェブページをスクレイピングし、LLM用コンテキスト文字列を作成する。"""
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    検索結果のURLからウェブページをスクレイピングし、LLM用コンテキスト文字列を作成する。
+    記事生成で再利用するため、取得したページ本文 (コーパス) も返す。
+    """
     scraped_contents = []
+    corpus = []
     if not search_results_list:
-        return "関連情報は見つかりませんでした。"
+        return "関連情報は見つかりませんでした。", corpus
 
     max_content_length_per_page = settings.get("max_content_length_per_page", 2000)
 
+    # 全URLを並行取得し、必要件数の成功か制限時間到達で打ち切る
+    fetched_pages = fetch_pages(
+        [result.get("link") for result in search_results_list],
+        tags_to_extract=["p", "h1", "h2", "h3", "li", "span", "article"],
+        target_successes=settings.get("scrape_target_pages"),
+        deadline_sec=settings.get("scrape_deadline_sec", 12.0),
+        per_host_limit=settings.get("scrape_per_host_limit", 2),
+    )
+
     for i, result in enumerate(search_results_list):
         title = result.get("title", "タイトルなし")
         link = result.get("link")
         snippet = result.get("snippet", "スニペットなし")
 
         if link:
-            try:
-                loader = WebBaseLoader(
-                    web_path=link, requests_kwargs={"timeout": 10}
-                )  # タイムアウト設定
-                documents = loader.load()
-
-                if documents:
-                    bs_transformer = BeautifulSoupTransformer()
-                    docs_transformed = bs_transformer.transform_documents(
-                        documents,
-                        tags_to_extract=[
-                            "p",
-                            "h1",
-                            "h2",
-                            "h3",
-                            "li",
-                            "span",
-                            "article",
-                        ],
-                    )
-                    page_content = " ".join(
-                        [doc.page_content for doc in docs_transformed]
-                    )
-                    shortened_content = page_content[
-                        :max_content_length_per_page
-                    ].strip()
-
-                    if shortened_content:
-                        scraped_contents.append(
-                            f"参照元URL: {link}\nタイトル: {title}\n内容:\n{shortened_content}"
-                        )
-                        print(
-                            f"    -> コンテンツ取得成功 (先頭{len(shortened_content)}文字): {link}"
-                        )
-                    else:
-                        scraped_contents.append(
-                            f"参照元URL: {link}\nタイトル: {title}\n概要: {snippet}\n(主要コンテンツ抽出失敗)"
-                        )
-                        print(f"    -> 主要コンテンツ抽出失敗、スニペット利用: {link}")
-
-                else:
-                    scraped_contents.append(
-                        f"参照元URL: {link}\nタイトル: {title}\n概要: {snippet}\n(コンテンツ取得失敗: ドキュメントなし)"
-                    )
-                    print(f"    -> コンテンツ取得失敗 (ドキュメントなし): {link}")
-            except Exception as e_scrape:
+            page = fetched_pages.get(link)
+            corpus.append(
+                corpus_document(result, page.text if page and page.ok else None)
+            )
+            if page and page.ok:
+                shortened_content = page.text[:max_content_length_per_page].strip()
+                scraped_contents.append(
+                    f"参照元URL: {link}\nタイトル: {title}\n内容:\n{shortened_content}"
+                )
                 print(
-                    f"    -> URLからのコンテンツ読み込みエラー: {link}, エラー: {e_scrape}"
+                    f"    -> コンテンツ取得成功 (先頭{len(shortened_content)}文字): {link}"
                 )
+            elif page is None:
                 scraped_contents.append(
-                    f"参照元URL: {link}\nタイトル: {title}\n概要: {snippet}\n(コンテンツの読み込みに失敗しました: {type(e_scrape).__name__})"
+                    f"参照元URL: {link}\nタイトル: {title}\n概要: {snippet}\n(時間内に取得できなかったためスニペットを利用)"
+                )
+                print(f"    -> 取得打ち切り、スニペット利用: {link}")
+            elif page.error == "EmptyContent":
+                scraped_contents.append(
+                    f"参照元URL: {link}\nタイトル: {title}\n概要: {snippet}\n(主要コンテンツ抽出失敗)"
+                )
+                print(f"    -> 主要コンテンツ抽出失敗、スニペット利用: {link}")
+            else:
+                print(
+                    f"    -> URLからのコンテンツ読み込みエラー: {link}, エラー: {page.error}"
+                )
+                scraped_contents.append(
+                    f"参照元URL: {link}\nタイトル: {title}\n概要: {snippet}\n(コンテンツの読み込みに失敗しました: {page.error})"
                 )
         else:
             scraped_contents.append(f"タイトル: {title}\n概要: {snippet} (URLなし)")
+            corpus.append(corpus_document(result, None))
 
     if scraped_contents:
         search_context_str = "\n\n===\n\n".join(scraped_contents)
@@ -133,19 +118,17 @@ def _scrape_and_prepare_context(
             "関連性の高いウェブページのコンテンツは見つかりませんでした。"
         )
 
-    return search_context_str
+    return search_context_str, corpus
 
 
 def _invoke_llm_for_titles(
     selected_prefecture: str, search_context: str, settings: dict
 ) -> Union[TitlesOutput, dict]:
     """LLMチェーンを準備・実行し、パースされたタイトル群またはエラー情報を返す。"""
-    llm = ChatVertexAI(
+    llm = get_chat_model(
         model_name=settings.get("model_name", "gemini-1.0-pro-001"),
         temperature=0,
         max_output_tokens=settings.get("max_output_tokens", 2048),
-        max_retries=settings.get("llm_max_retries", 6),
-        stop=None,
     )
 
     pydantic_parser = PydanticOutputParser(pydantic_object=TitlesOutput)
@@ -249,12 +232,22 @@ def _invoke_llm_for_titles(
 
 
 def generate_titles_for_prefecture(selected_prefecture: str) -> dict:
+    # タイトル生成全体を1つのトレースとし、検索・ページ取得・LLM呼び出しを子区間として記録する
+    with span("title_generation", prefecture=selected_prefecture) as trace_span:
+        result = _generate_titles_for_prefecture(selected_prefecture)
+        if result.get("error"):
+            trace_span.record_error(str(result["error"]))
+        return result
+
+
+def _generate_titles_for_prefecture(selected_prefecture: str) -> dict:
     settings = get_env_config()
 
     google_api_key = settings.get("google_api_key")
     google_cse_id = settings.get("google_cse_id")
 
     raw_search_results_for_display = []
+    search_corpus = []
     search_context_str = "検索処理が実行されませんでした。"
 
     try:
@@ -270,7 +263,7 @@ def generate_titles_for_prefecture(selected_prefecture: str) -> dict:
         if not raw_search_results_for_display:
             search_context_str = "関連情報は見つかりませんでした。"
         else:
-            search_context_str = _scrape_and_prepare_context(
+            search_context_str, search_corpus = _scrape_and_prepare_context(
                 raw_search_results_for_display, settings
             )
 
@@ -293,6 +286,8 @@ def generate_titles_for_prefecture(selected_prefecture: str) -> dict:
         return {
             "titles_output": llm_response_or_titles.model_dump(),  # Pydanticモデルを辞書に変換
             "search_results_for_display": raw_search_results_for_display,
+            # 記事生成で2回目の検索を省くため、取得したページ本文を返す
+            "corpus": search_corpus,
         }
     elif (
         isinstance(llm_response_or_titles, dict) and "error" in llm_response_or_titles
@@ -3,18 +3,28 @@ import tempfile
 import traceback
 from typing import List, Optional, Tuple
 
-import vertexai
 from langchain_google_vertexai import ChatVertexAI
 from langchain.prompts import PromptTemplate
 from langchain_core.messages import HumanMessage
+from langchain_core.output_parsers import PydanticOutputParser
+from pydantic import BaseModel, Field
 from vertexai.preview.vision_models import ImageGenerationModel
 
 from dotenv import load_dotenv
 
+from utils.model_clients import generate_images, get_chat_model, get_image_model
+from utils.rate_limiter import is_throttle_error
+
 # .envファイルから環境変数をロード
 load_dotenv()
 
 
+class SubtitleImagePrompts(BaseModel):
+    prompts: List[str] = Field(
+        description="各サブタイトルに対応する英語の画像生成プロンプト。サブタイトルと同じ順序・同じ件数で出力すること。"
+    )
+
+
 # 画像プロンプト生成用テンプレート - サブタイトル内容重視
 SUBTITLE_FOCUSED_IMAGE_PROMPT_TEMPLATE = PromptTemplate(
     input_variables=[
@@ -141,23 +151,20 @@ def _get_color_palette(image_index: int) -> str:
 
 
 def _initialize_vertex_ai(
-    project_id: str, location: str, image_gen_model_name: str, llm_model_name: str
+    project_id: str,
+    location: str,
+    image_gen_model_name: Optional[str],
+    llm_model_name: str,
 ) -> Tuple[Optional[ImageGenerationModel], Optional[ChatVertexAI]]:
-    """Vertex AIモデルを初期化する"""
+    """Vertex AIモデルを取得する (初回のみ生成し、以降は共有のクライアントを再利用)"""
     try:
-        print(f"🔧 Vertex AI初期化中... プロジェクト: {project_id}, 場所: {location}")
-        # Vertex AIを初期化
-        vertexai.init(project=project_id, location=location)
-        # 画像生成モデルをロード
-        image_model = ImageGenerationModel.from_pretrained(image_gen_model_name)
-        # Chat LLMモデルを初期化
-        llm = ChatVertexAI(
+        image_model = get_image_model(image_gen_model_name, project_id, location)
+        llm = get_chat_model(
             model_name=llm_model_name,
+            temperature=0.8,  # 創造性向上のため高く設定
             project=project_id,
             location=location,
-            temperature=0.8,  # 創造性向上のため高く設定
         )
-        print("✅ Vertex AIとLLMの初期化に成功しました!")
         return image_model, llm
     except Exception as e:
         print(f"❌ Vertex AI初期化失敗: {e}")
@@ -314,6 +321,81 @@ def _generate_image_prompt(
         return f"A beautiful anime-style scene of {prefecture or 'Japan'}, Japan, depicting the theme '{sub_title}' with regional characteristics."
 
 
+def _generate_image_prompts_batch(
+    llm: ChatVertexAI,
+    prefecture: str,
+    main_title: str,
+    sub_titles: List[str],
+    regional_chars: str,
+) -> List[str]:
+    """
+    全サブタイトルの画像生成用プロンプトを1回のLLM呼び出しでまとめて作成する。
+    地域特性は一度だけ送る。件数が合わない場合や失敗した分は画像ごとの生成で補う。
+    """
+    prefecture_clean = (prefecture or "").strip() or "日本"
+    total_images = len(sub_titles)
+    parser = PydanticOutputParser(pydantic_object=SubtitleImagePrompts)
+
+    image_specs = "\n".join(
+        f"{i}. サブタイトル「{sub_title}」\n"
+        f"   - カメラアングル: {_get_camera_angle(i)}\n"
+        f"   - 時間帯・照明: {_get_lighting_condition(i)}\n"
+        f"   - 構図スタイル: {_get_composition_style(i)}\n"
+        f"   - アートスタイル: {_get_art_style(i)}\n"
+        f"   - 色彩傾向: {_get_color_palette(i)}"
+        for i, sub_title in enumerate(sub_titles, start=1)
+    )
+
+    batch_prompt = f"""
+あなたは創造的なアートディレクターです。以下の{total_images}個のサブタイトルそれぞれについて、その内容を{prefecture_clean}の地域特色で表現する、魅力的な英語の画像生成プロンプトを作成してください。
+
+# 基本情報
+- 地域: {prefecture_clean}
+- 記事のメインテーマ: {main_title}
+- 地域の特徴: {regional_chars}
+
+# 各画像のテーマと視覚的特徴 (画像同士が似ないよう、指定の特徴を必ず反映)
+{image_specs}
+
+# 表現要件 (全画像共通)
+- 各サブタイトルが何について語っているか (歴史・自然・食文化・伝統・観光・季節・産業など) を理解し、{prefecture_clean}の該当する象徴的要素を中心に描く
+- 基本スタイル: 美しいアニメの背景美術 (Beautiful anime background art), highly detailed, high quality
+- 文字、テキスト、人物の顔は含めない (no text, no letters, no character faces, no people)
+- アスペクト比: 4:3
+
+# 出力
+{parser.get_format_instructions()}
+prompts にはサブタイトルと同じ順序で{total_images}個の英語プロンプトのみを入れてください。
+"""
+
+    prompts: List[Optional[str]] = [None] * total_images
+    try:
+        print(f"🎨 {total_images}件のサブタイトル画像プロンプトを一括生成中...")
+        response = llm.invoke([HumanMessage(content=batch_prompt)])
+        generated = parser.parse(response.content).prompts
+        if len(generated) != total_images:
+            print(
+                f"⚠️ 一括生成したプロンプト数が一致しません ({len(generated)}/{total_images})"
+            )
+        for i, prompt in enumerate(generated[:total_images]):
+            prompts[i] = prompt.strip() or None
+    except Exception as e:
+        print(f"⚠️ プロンプト一括生成エラー: {e}")
+
+    for i, sub_title in enumerate(sub_titles):
+        if prompts[i] is None:
+            prompts[i] = _generate_image_prompt(
+                llm,
+                prefecture,
+                main_title,
+                sub_title,
+                regional_chars,
+                i + 1,
+                total_images,
+            )
+    return prompts
+
+
 def _generate_image(
     image_model: ImageGenerationModel,
     prompt: str,
@@ -329,8 +411,9 @@ def _generate_image(
             f"🖼️ サブタイトル重視画像生成中 [{image_index}/{total_images}] (プロンプト: {prompt[:80]}...)"
         )
 
-        # 画像生成モデルを呼び出して画像を生成
-        response = image_model.generate_images(
+        # 画像生成モデルを呼び出して画像を生成 (共有リミッターで同時実行数と再試行を制御)
+        images = generate_images(
+            image_model,
             prompt=prompt,
             number_of_images=1,
             aspect_ratio="4:3",
@@ -340,14 +423,18 @@ def _generate_image(
         )
 
         # 生成された画像バイトを取得
-        if response.images and hasattr(response.images[0], "_image_bytes"):
+        if images:
             print(f"✅ サブタイトル重視画像 [{image_index}/{total_images}] 生成成功")
-            return response.images[0]._image_bytes
+            return images[0]
         else:
             print(f"⚠️ 画像 [{image_index}/{total_images}] の取得に失敗")
             return None
 
     except Exception as e:
+        if is_throttle_error(e):
+            print(
+                f"❌ 画像 [{image_index}/{total_images}] はクォータ超過 (429) が続いたため生成できませんでした"
+            )
         print(f"❌ 画像 [{image_index}/{total_images}] 生成APIエラー: {e}")
         # エラーのトレースバックを出力
         traceback.print_exc()
@@ -361,7 +448,7 @@ def generate_prefecture_image_and_get_path(
     gcp_project_id: str,
     gcp_location: str,
     llm_model_name: str = "gemini-1.5-pro-001",
-    image_gen_model_name: str = "imagen-3.0-fast-generate-001",
+    image_gen_model_name: Optional[str] = None,
 ) -> List[str]:
     """
     都道府県とサブタイトルに基づいて、各サブタイトルの内容を反映した地域特色画像を生成します。
@@ -373,7 +460,7 @@ def generate_prefecture_image_and_get_path(
         gcp_project_id: GCPプロジェクトID
         gcp_location: GCPロケーション
         llm_model_name: 使用するLLMモデル名
-        image_gen_model_name: 使用する画像生成モデル名
+        image_gen_model_name: 使用する画像生成モデル名 (省略時は IMAGE_MODEL_NAME の設定)
 
     Returns:
         生成された画像ファイルのパスのリスト
@@ -473,7 +560,7 @@ def generate_prefecture_image_and_get_path_with_progress(
     gcp_project_id: str,
     gcp_location: str,
     llm_model_name: str = "gemini-1.5-pro-001",
-    image_gen_model_name: str = "imagen-3.0-fast-generate-001",
+    image_gen_model_name: Optional[str] = None,
 ):
     """
     進捗状況をyieldしながらサブタイトル重視画像を生成するジェネレータ関数
@@ -0,0 +1,97 @@
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import urllib.request
+from typing import Optional
+
+import geopandas as gpd
+
+from config.constants import GEO_CACHE_DIR, GEO_CACHE_VERSION
+
+
+def ensure_local_file(local_path: str, source_url: str) -> Optional[str]:
+    """
+    同梱データのパスを返す。
+    データはビルド時 (make fetch-data) に同梱する。無い場合のみ予備としてダウンロードして保存する
+    """
+    if os.path.exists(local_path):
+        return local_path
+
+    print(
+        f"📥 同梱データが無いため取得します (make fetch-data で同梱できます): {source_url}"
+    )
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(local_path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f, urllib.request.urlopen(
+            source_url, timeout=30
+        ) as response:
+            f.write(response.read())
+        os.replace(tmp_path, local_path)
+        return local_path
+    except Exception as e:
+        print(f"❌ データの取得に失敗しました: {source_url} ({e})")
+        # 書きかけの一時ファイルをデータディレクトリに残さない
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        return None
+
+
+def file_checksum(path: str) -> str:
+    """ファイル内容のSHA-256ハッシュを返す"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_cache_key(source_path: str, params: dict) -> str:
+    """入力ファイルと前処理パラメータからキャッシュキーを作成する"""
+    digest = hashlib.sha256()
+    digest.update(file_checksum(source_path).encode("utf-8"))
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(str(GEO_CACHE_VERSION).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def cache_path(name: str, key: str, ext: str = "parquet") -> str:
+    """キャッシュファイルのパスを返す"""
+    return os.path.join(GEO_CACHE_DIR, f"{name}_v{GEO_CACHE_VERSION}_{key}.{ext}")
+
+
+def read_cached_frame(name: str, key: str) -> Optional[gpd.GeoDataFrame]:
+    """キャッシュ済みのGeoParquetを読み込む。存在しない・壊れている場合はNone"""
+    path = cache_path(name, key)
+    if not os.path.exists(path):
+        return None
+    try:
+        return gpd.read_parquet(path)
+    except Exception as e:
+        print(f"⚠️ キャッシュの読み込みに失敗したため再生成します: {path} ({e})")
+        return None
+
+
+def write_cached_frame(name: str, key: str, gdf: gpd.GeoDataFrame) -> None:
+    """GeoParquetとしてキャッシュを書き込み、同名の古いキャッシュを削除する"""
+    path = cache_path(name, key)
+    try:
+        os.makedirs(GEO_CACHE_DIR, exist_ok=True)
+        # 書き込み途中のファイルを他プロセスが読まないよう一時ファイル経由で置き換える
+        fd, tmp_path = tempfile.mkstemp(dir=GEO_CACHE_DIR, suffix=".tmp")
+        os.close(fd)
+        gdf.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"⚠️ キャッシュの書き込みに失敗しました: {path} ({e})")
+        return
+
+    for stale_path in glob.glob(os.path.join(GEO_CACHE_DIR, f"{name}_v*_*.*")):
+        if stale_path != path:
+            try:
+                os.remove(stale_path)
+            except OSError:
+                pass
@@ -0,0 +1,102 @@
+import math
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import shapely
+
+from config.constants import (
+    GEOLOCATION_HYSTERESIS_M,
+    GEOLOCATION_MIN_DISTANCE_M,
+    GEOLOCATION_MIN_INTERVAL_SEC,
+)
+from utils.prefecture_locator import PrefectureLocator
+
+EARTH_RADIUS_M = 6_371_000
+
+
+@dataclass(frozen=True, slots=True)
+class GeolocationFix:
+    """採用済みの現在地と、その時点で判定した都道府県"""
+
+    longitude: float
+    latitude: float
+    timestamp: float
+    prefecture: Optional[str]
+
+
+@dataclass(frozen=True, slots=True)
+class GeolocationDecision:
+    """
+    filter_geolocation の判定結果
+    - fix: 次回の比較に使う採用済み位置 (セッションに保存する)
+    - prefecture_changed: 都道府県が実際に変わった (地図更新と再実行が必要)
+    - pending: 最小間隔内のため保留した (同じ位置を後で再評価する)
+    """
+
+    fix: Optional[GeolocationFix]
+    prefecture_changed: bool
+    pending: bool = False
+
+
+def haversine_m(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    """2点間の大円距離 (m)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(d_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def distance_to_region_m(
+    locator: PrefectureLocator, name: str, longitude: float, latitude: float
+) -> float:
+    """座標から指定地域ポリゴンまでの距離 (m)。地域内なら 0"""
+    geometry = locator.geometry(name)
+    if geometry is None:
+        return math.inf
+    line = shapely.shortest_line(geometry, shapely.Point(longitude, latitude))
+    (lon1, lat1), (lon2, lat2) = line.coords
+    return haversine_m(lon1, lat1, lon2, lat2)
+
+
+def filter_geolocation(
+    previous: Optional[GeolocationFix],
+    longitude: float,
+    latitude: float,
+    locator: PrefectureLocator,
+    now: Optional[float] = None,
+) -> GeolocationDecision:
+    """
+    GPSの揺らぎを吸収し、都道府県が実際に変わったときだけ変更を通知する。
+    距離しきい値・最小間隔・都道府県境のヒステリシスの順に判定する。
+    """
+    now = time.time() if now is None else now
+
+    if previous is not None:
+        if now - previous.timestamp < GEOLOCATION_MIN_INTERVAL_SEC:
+            return GeolocationDecision(previous, False, pending=True)
+        moved_m = haversine_m(
+            previous.longitude, previous.latitude, longitude, latitude
+        )
+        if moved_m < GEOLOCATION_MIN_DISTANCE_M:
+            return GeolocationDecision(previous, False)
+
+    prefecture = locator.locate_name(longitude, latitude)
+
+    if (
+        previous is not None
+        and previous.prefecture is not None
+        and prefecture != previous.prefecture
+        and distance_to_region_m(locator, previous.prefecture, longitude, latitude)
+        < GEOLOCATION_HYSTERESIS_M
+    ):
+        # 境界付近の揺らぎとみなし、前回の都道府県に留まる
+        prefecture = previous.prefecture
+
+    fix = GeolocationFix(longitude, latitude, now, prefecture)
+    changed = previous is None or prefecture != previous.prefecture
+    return GeolocationDecision(fix, changed)
@@ -1,6 +1,9 @@
 import streamlit as st
 import geopandas as gpd
-from shapely.geometry import Point
+
+from utils.prefecture_locator import get_prefecture_locator
+from utils.prefecture_registry import get_prefecture_registry
+from utils.geolocation_filter import filter_geolocation
 
 
 def process_geolocation_data(current_location: dict, gdf: gpd.GeoDataFrame):
@@ -20,32 +23,40 @@ def process_geolocation_data(current_location: dict, gdf: gpd.GeoDataFrame):
 
     # ジオロケーションデータが前回と異なる場合のみ処理
     if current_location != st.session_state.last_location_data:
-        st.session_state.last_location_data = current_location
-        user_point = Point(current_location["longitude"], current_location["latitude"])
-
         # ジオメトリカラムが存在しない、または全てがNoneの場合は処理しない
         if "geometry" not in gdf.columns or gdf["geometry"].isnull().all():
             return
 
-        # 現在地がどの都道府県に含まれるか検索
-        matched_row = gdf[gdf.geometry.contains(user_point)]
+        # 現在地がどの都道府県に含まれるか空間インデックスで検索
+        # (GPSの揺らぎや境界付近の往復では都道府県を切り替えない)
+        decision = filter_geolocation(
+            st.session_state.get("geolocation_fix"),
+            current_location["longitude"],
+            current_location["latitude"],
+            get_prefecture_locator(gdf),
+        )
+        if decision.pending:
+            return
+        st.session_state.last_location_data = current_location
+        st.session_state.geolocation_fix = decision.fix
+        if not decision.prefecture_changed:
+            return
+
+        pref_record = get_prefecture_registry(gdf).get(decision.fix.prefecture)
 
-        if not matched_row.empty:
-            prefecture_data = matched_row.iloc[0]
-            pref_center = prefecture_data["center"]
-            new_center = [pref_center.y, pref_center.x]
+        if pref_record is not None:
+            new_center = [pref_record.center_lat, pref_record.center_lon]
             new_zoom = 8  # 都道府県の中心にズームイン
 
             # 地図の中心、ズーム、または選択都道府県が変更された場合のみ更新
             if (
                 st.session_state.map_center != new_center
                 or st.session_state.map_zoom != new_zoom
-                or st.session_state.selected_prefecture_info
-                != prefecture_data["nam_ja"]
+                or st.session_state.selected_prefecture_info != pref_record.name
             ):
                 st.session_state.map_center = new_center
                 st.session_state.map_zoom = new_zoom
-                st.session_state.selected_prefecture_info = prefecture_data["nam_ja"]
+                st.session_state.selected_prefecture_info = pref_record.name
                 st.session_state.last_map_interaction_type = "geolocation_update"
                 st.rerun()  # 状態変更を反映するため再実行
         elif st.session_state.last_map_interaction_type != "geolocation_outside_japan":
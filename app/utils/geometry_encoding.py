@@ -0,0 +1,85 @@
+import json
+import math
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import shapely
+import geopandas as gpd
+
+
+@dataclass(frozen=True, slots=True)
+class PayloadReport:
+    """ブラウザへ送るジオメトリの量子化前後のサイズ"""
+
+    precision: int
+    bytes_before: int
+    bytes_after: int
+    vertices_before: int
+    vertices_after: int
+
+    @property
+    def ratio(self) -> float:
+        return self.bytes_after / self.bytes_before if self.bytes_before else 1.0
+
+    def summary(self) -> str:
+        return (
+            f"小数{self.precision}桁: {self.bytes_before:,} → {self.bytes_after:,} bytes "
+            f"({self.ratio:.0%}), 頂点 {self.vertices_before:,} → {self.vertices_after:,}"
+        )
+
+
+def precision_for_tolerance(tolerance: float) -> int:
+    """簡略化の許容誤差より一桁細かい小数桁数を返す (それ以上の桁は見た目に影響しない)"""
+    if tolerance <= 0:
+        return 6
+    return max(0, math.ceil(-math.log10(tolerance)) + 1)
+
+
+def _compact_json_size(collection: dict) -> int:
+    return len(
+        json.dumps(collection, ensure_ascii=False, separators=(",", ":")).encode(
+            "utf-8"
+        )
+    )
+
+
+def _round_coordinates(coordinates, precision: int):
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        return [round(value, precision) for value in coordinates]
+    return [_round_coordinates(part, precision) for part in coordinates]
+
+
+def quantize_frame(
+    frame: gpd.GeoDataFrame, precision: int
+) -> Tuple[dict, PayloadReport]:
+    """
+    座標を 10^-precision 度のグリッドに揃えてFeatureCollectionを作る。
+    shapely.set_precision でトポロジを保ったままスナップし、重複頂点を除去した上で、
+    JSONの数値表現も同じ桁数に丸める。
+    """
+    before = json.loads(frame.to_json(drop_id=True))
+    vertices_before = int(shapely.get_num_coordinates(frame.geometry.values).sum())
+
+    snapped = frame.copy()
+    snapped["geometry"] = shapely.set_precision(
+        frame.geometry.values, grid_size=10**-precision
+    )
+    snapped = snapped[~snapped.geometry.is_empty]
+    vertices_after = int(shapely.get_num_coordinates(snapped.geometry.values).sum())
+
+    after = json.loads(snapped.to_json(drop_id=True))
+    for feature in after["features"]:
+        geometry: Optional[dict] = feature.get("geometry")
+        if geometry and "coordinates" in geometry:
+            geometry["coordinates"] = _round_coordinates(
+                geometry["coordinates"], precision
+            )
+
+    report = PayloadReport(
+        precision=precision,
+        bytes_before=_compact_json_size(before),
+        bytes_after=_compact_json_size(after),
+        vertices_before=vertices_before,
+        vertices_after=vertices_after,
+    )
+    return after, report
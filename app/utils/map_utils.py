@@ -1,5 +1,5 @@
 import pydeck as pdk
-from config.constants import JAPAN_BOUNDS
+from config.constants import JAPAN_BOUNDS, GEOMETRY_LOD_TIERS
 
 
 def limit_view_state(view_state):
@@ -20,3 +20,12 @@ def limit_view_state(view_state):
         pitch=view_state.pitch,
         bearing=view_state.bearing,
     )
+
+
+def select_lod_tier(zoom):
+    """ズームレベルから使用するジオメトリのLOD段階を選ぶ"""
+    tier = 0
+    for index, (min_zoom, _) in enumerate(GEOMETRY_LOD_TIERS):
+        if zoom >= min_zoom:
+            tier = index
+    return tier
@@ -0,0 +1,375 @@
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import vertexai
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_google_vertexai import ChatVertexAI
+from vertexai.preview.vision_models import ImageGenerationModel
+
+from config.env_config import get_env_config
+from utils.cassette import decode_bytes, encode_bytes, get_cassette
+from utils.rate_limiter import get_limiter
+from utils.tracing import current_span, span
+
+
+def _encode_chat_result(result: ChatResult) -> Dict[str, Any]:
+    return {
+        "generations": [
+            {
+                "message": message_to_dict(generation.message),
+                "generation_info": generation.generation_info,
+            }
+            for generation in result.generations
+        ],
+        "llm_output": result.llm_output,
+    }
+
+
+def _decode_chat_result(data: Dict[str, Any]) -> ChatResult:
+    return ChatResult(
+        generations=[
+            ChatGeneration(
+                message=messages_from_dict([generation["message"]])[0],
+                generation_info=generation["generation_info"],
+            )
+            for generation in data["generations"]
+        ],
+        llm_output=data["llm_output"],
+    )
+
+
+def _encode_chat_chunk(chunk: ChatGenerationChunk) -> Dict[str, Any]:
+    return {
+        "message": message_to_dict(chunk.message),
+        "generation_info": chunk.generation_info,
+    }
+
+
+def _decode_chat_chunk(data: Dict[str, Any]) -> ChatGenerationChunk:
+    return ChatGenerationChunk(
+        message=messages_from_dict([data["message"]])[0],
+        generation_info=data["generation_info"],
+    )
+
+
+def _cassette_value(value: Any) -> Any:
+    """
+    カセットのキーに含める値をJSONにできる形にする。
+    ツール定義などのオブジェクトは内容で、関数は名前で表す (実行ごとに変わるアドレスを含めない)。
+    """
+    if isinstance(value, dict):
+        return {str(key): _cassette_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_cassette_value(item) for item in value]
+    if hasattr(value, "model_dump"):
+        return _cassette_value(value.model_dump())
+    if callable(value):
+        return getattr(value, "__qualname__", type(value).__name__)
+    return value
+
+
+# 応答を変える生成の設定 (カセットのキーに含める)
+_CASSETTE_MODEL_PARAMS = (
+    "temperature",
+    "max_output_tokens",
+    "top_p",
+    "top_k",
+    "response_mime_type",
+)
+
+
+def _record_usage(trace_span, message) -> None:
+    """応答 (またはチャンク) のトークン数を区間に加算する"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    trace_span.add("prompt_tokens", usage.get("input_tokens", 0))
+    trace_span.add("response_tokens", usage.get("output_tokens", 0))
+
+
+class LimitedChatVertexAI(ChatVertexAI):
+    """
+    生成呼び出しを共有リミッター ("vertex_chat") 経由で行う ChatVertexAI。
+    再試行もリミッター側で行うため、クライアント自身の再試行は1回に抑えて生成する。
+    カセットの記録・再生モードでは、リミッターの外側でカセットを経由する。
+    """
+
+    def _cassette_request(
+        self, messages, stop, kwargs: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        カセットのキーにする要求内容。モデルの生成設定と、呼び出し時の引数
+        (tools・max_output_tokens など) が違う呼び出しは別の要求として記録する。
+        """
+        return {
+            "model_name": self.model_name,
+            **{name: getattr(self, name, None) for name in _CASSETTE_MODEL_PARAMS},
+            "messages": [message_to_dict(message) for message in messages],
+            "stop": stop,
+            "kwargs": _cassette_value(kwargs),
+        }
+
+    def _latency_kind(self, method: str, kwargs: Dict[str, Any]) -> str:
+        """
+        リミッターで応答時間を比べる呼び出しの種類。
+        出力上限が違う呼び出し (タイトルと記事本文など) は所要時間も大きく違うため分ける。
+        """
+        max_output_tokens = kwargs.get("max_output_tokens", self.max_output_tokens)
+        return f"{method}:{self.model_name}:{max_output_tokens}"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        with span(
+            "vertex_chat", model=self.model_name, messages=len(messages)
+        ) as trace_span:
+            result = self._generate_recorded(messages, stop, run_manager, **kwargs)
+            for generation in result.generations:
+                _record_usage(trace_span, generation.message)
+            return result
+
+    def _generate_recorded(self, messages, stop, run_manager, **kwargs: Any):
+        generate = super()._generate
+        latency_kind = self._latency_kind("generate", kwargs)
+        cassette = get_cassette()
+        if cassette is None:
+            return get_limiter("vertex_chat").call(
+                generate,
+                messages,
+                stop=stop,
+                run_manager=run_manager,
+                latency_kind=latency_kind,
+                **kwargs,
+            )
+        current_span().set("replayed", cassette.replaying)
+        return cassette.call(
+            "vertex_chat",
+            self._cassette_request(messages, stop, kwargs),
+            lambda: get_limiter("vertex_chat").call(
+                generate,
+                messages,
+                stop=stop,
+                run_manager=run_manager,
+                latency_kind=latency_kind,
+                **kwargs,
+            ),
+            encode=_encode_chat_result,
+            decode=_decode_chat_result,
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        with span(
+            "vertex_chat_stream", model=self.model_name, messages=len(messages)
+        ) as trace_span:
+            started = time.monotonic()
+            chunk_count = 0
+            for chunk in self._stream_recorded(messages, stop, run_manager, **kwargs):
+                if chunk_count == 0:
+                    trace_span.set(
+                        "first_chunk_sec", round(time.monotonic() - started, 3)
+                    )
+                chunk_count += 1
+                trace_span.set("chunks", chunk_count)
+                _record_usage(trace_span, chunk.message)
+                yield chunk
+
+    def _stream_recorded(self, messages, stop, run_manager, **kwargs: Any):
+        stream = super()._stream
+        latency_kind = self._latency_kind("stream", kwargs)
+        cassette = get_cassette()
+        if cassette is None:
+            return get_limiter("vertex_chat").stream(
+                stream,
+                messages,
+                stop=stop,
+                run_manager=run_manager,
+                latency_kind=latency_kind,
+                **kwargs,
+            )
+        current_span().set("replayed", cassette.replaying)
+        return cassette.stream(
+            "vertex_chat_stream",
+            self._cassette_request(messages, stop, kwargs),
+            lambda: get_limiter("vertex_chat").stream(
+                stream,
+                messages,
+                stop=stop,
+                run_manager=run_manager,
+                latency_kind=latency_kind,
+                **kwargs,
+            ),
+            encode=_encode_chat_chunk,
+            decode=_decode_chat_chunk,
+        )
+
+
+class ReplayImageModel:
+    """
+    カセットの再生モードで ImageGenerationModel の代わりに使うモデル。
+    from_pretrained による通信を避けるためのもので、画像は generate_images でカセットから返す。
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+
+# 生成したクライアントはプロセス内で共有し、Streamlitのセッションをまたいで再利用する
+_chat_models: Dict[Tuple[Hashable, ...], ChatVertexAI] = {}
+_image_models: Dict[Tuple[Hashable, ...], ImageGenerationModel] = {}
+_registry_lock = threading.RLock()
+_vertexai_target: Optional[Tuple[Optional[str], Optional[str]]] = None
+
+
+def _ensure_vertexai(project: Optional[str], location: Optional[str]) -> None:
+    """指定のプロジェクト・リージョンで vertexai を初期化する (同じ組み合わせなら何もしない)"""
+    global _vertexai_target
+    settings = get_env_config()
+    if _vertexai_target is None:
+        # get_env_config が既定のプロジェクト・リージョンで初期化済み
+        _vertexai_target = (
+            settings.get("gcp_project_id"),
+            settings.get("gcp_location"),
+        )
+    if _vertexai_target != (project, location):
+        vertexai.init(project=project, location=location)
+        _vertexai_target = (project, location)
+
+
+def get_chat_model(
+    model_name: Optional[str] = None,
+    temperature: float = 0.7,
+    project: Optional[str] = None,
+    location: Optional[str] = None,
+    **options: Any,
+) -> ChatVertexAI:
+    """
+    共有の ChatVertexAI を返す。
+    モデル名・temperature・プロジェクト・リージョンとその他の引数が同じであれば同じインスタンスを使う。
+    省略した値は get_env_config の設定を使う。
+    """
+    settings = get_env_config()
+    model_name = model_name or settings.get("model_name") or "gemini-1.5-pro-001"
+    project = project or settings.get("gcp_project_id")
+    location = location or settings.get("gcp_location")
+    key = (
+        model_name,
+        temperature,
+        project,
+        location,
+        tuple(sorted(options.items())),
+    )
+
+    llm = _chat_models.get(key)
+    if llm is None:
+        with _registry_lock:
+            llm = _chat_models.get(key)
+            if llm is None:
+                print(
+                    f"🔧 LLMクライアントを生成: {model_name} (temperature={temperature})"
+                )
+                llm = LimitedChatVertexAI(
+                    model_name=model_name,
+                    project=project,
+                    location=location,
+                    temperature=temperature,
+                    **{"max_retries": 1, **options},
+                )
+                _chat_models[key] = llm
+    return llm
+
+
+def get_image_model(
+    model_name: Optional[str] = None,
+    project: Optional[str] = None,
+    location: Optional[str] = None,
+) -> ImageGenerationModel:
+    """共有の ImageGenerationModel を返す (from_pretrained はモデルごとに一度だけ呼ぶ)"""
+    settings = get_env_config()
+    model_name = (
+        model_name or settings.get("image_model_name") or "imagen-3.0-fast-generate-001"
+    )
+    project = project or settings.get("gcp_project_id")
+    location = location or settings.get("gcp_location")
+    key = (model_name, project, location)
+
+    image_model = _image_models.get(key)
+    if image_model is None:
+        with _registry_lock:
+            image_model = _image_models.get(key)
+            if image_model is None:
+                cassette = get_cassette()
+                if cassette is not None and cassette.replaying:
+                    return ReplayImageModel(model_name)
+                print(f"🔧 画像生成モデルをロード: {model_name} ({location})")
+                _ensure_vertexai(project, location)
+                image_model = ImageGenerationModel.from_pretrained(model_name)
+                _image_models[key] = image_model
+    return image_model
+
+
+def generate_images(image_model, **options: Any) -> List[bytes]:
+    """
+    画像を生成し、各画像のバイト列を返す。
+    共有リミッター ("imagen") で同時実行数と再試行を制御し、記録・再生モードではカセットを経由する。
+    """
+
+    def generate() -> List[bytes]:
+        response = get_limiter("imagen").call(image_model.generate_images, **options)
+        return [image._image_bytes for image in response.images]
+
+    with span(
+        "imagen",
+        model=getattr(image_model, "model_name", None) or type(image_model).__name__,
+        requested_images=options.get("number_of_images", 1),
+    ) as trace_span:
+        cassette = get_cassette()
+        if cassette is None:
+            images = generate()
+        else:
+            trace_span.set("replayed", cassette.replaying)
+            images = cassette.call(
+                "imagen",
+                options,
+                generate,
+                encode=lambda images: [encode_bytes(image) for image in images],
+                decode=lambda images: [decode_bytes(image) for image in images],
+            )
+        trace_span.set("images", len(images))
+        trace_span.set("bytes", sum(len(image) for image in images))
+        return images
+
+
+# --- バックグラウンドでの事前読み込み ---
+# "idle" / "loading" / "ready" / "failed"
+_warmup_status = "idle"
+_warmup_error: Optional[str] = None
+_warmup_lock = threading.Lock()
+
+
+def _warm_up() -> None:
+    global _warmup_status, _warmup_error
+    try:
+        settings = get_env_config()
+        get_image_model(settings.get("image_model_name"))
+        get_chat_model(temperature=0.1)
+        _warmup_status = "ready"
+    except Exception as e:
+        _warmup_error = f"{type(e).__name__}: {e}"
+        _warmup_status = "failed"
+        print(f"⚠️ モデルの事前読み込みに失敗しました: {_warmup_error}")
+
+
+def warm_up_models() -> None:
+    """
+    画像生成モデルとLLMの読み込みをバックグラウンドスレッドで開始する。
+    プロセス内で一度だけ実行され、画面の描画を待たせない。
+    """
+    global _warmup_status
+    with _warmup_lock:
+        if _warmup_status != "idle":
+            return
+        _warmup_status = "loading"
+    threading.Thread(target=_warm_up, name="model-warmup", daemon=True).start()
+
+
+def get_warmup_status() -> Tuple[str, Optional[str]]:
+    """事前読み込みの状態とエラー内容を返す (UIの表示用)"""
+    return _warmup_status, _warmup_error
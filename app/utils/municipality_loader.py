@@ -0,0 +1,106 @@
+import os
+
+import streamlit as st
+import geopandas as gpd
+
+from config.constants import (
+    JAPAN_PREFECTURES,
+    MUNICIPALITY_CACHE_MAX_PREFECTURES,
+    MUNICIPALITY_DATA_DIR,
+    MUNICIPALITY_SIMPLIFY_TOLERANCE,
+    MUNICIPALITY_SOURCE_URL_TEMPLATE,
+)
+from utils.data_loader import attach_centers
+from utils.geo_cache import (
+    build_cache_key,
+    ensure_local_file,
+    read_cached_frame,
+    write_cached_frame,
+)
+
+
+def prefecture_code(prefecture_name: str) -> str | None:
+    """都道府県名からJISの都道府県コード (2桁) を返す"""
+    if prefecture_name not in JAPAN_PREFECTURES:
+        return None
+    return f"{JAPAN_PREFECTURES.index(prefecture_name) + 1:02d}"
+
+
+def _municipality_name(row) -> str:
+    """政令指定都市の区は「札幌市中央区」のように市名を付けて一意にする"""
+    county_or_city = row.get("N03_003") or ""
+    name = row.get("N03_004") or ""
+    if county_or_city.endswith("市") and name.endswith("区"):
+        return f"{county_or_city}{name}"
+    return name
+
+
+@st.cache_data(max_entries=MUNICIPALITY_CACHE_MAX_PREFECTURES, show_spinner=False)
+def load_municipalities(prefecture_name: str) -> gpd.GeoDataFrame:
+    """
+    指定された都道府県の市区町村ポリゴンを読み込む。
+    都道府県を選択したときにだけ呼ばれ、直近に選ばれた数都道府県分のみメモリに保持する。
+    """
+    pref_code = prefecture_code(prefecture_name)
+    if pref_code is None:
+        return gpd.GeoDataFrame()
+
+    source_path = ensure_local_file(
+        os.path.join(MUNICIPALITY_DATA_DIR, f"{pref_code}.json"),
+        MUNICIPALITY_SOURCE_URL_TEMPLATE.format(pref_code=pref_code),
+    )
+    if source_path is None:
+        return gpd.GeoDataFrame()
+
+    cache_name = f"municipalities_{pref_code}"
+    cache_key = build_cache_key(
+        source_path, {"simplify_tolerance": MUNICIPALITY_SIMPLIFY_TOLERANCE}
+    )
+    cached_gdf = read_cached_frame(cache_name, cache_key)
+    if cached_gdf is not None and not cached_gdf.empty:
+        cached_gdf = attach_centers(cached_gdf)
+        cached_gdf.attrs["dataset_key"] = f"{cache_name}_{cache_key}"
+        return cached_gdf
+
+    try:
+        gdf = _preprocess(gpd.read_file(source_path), prefecture_name)
+    except Exception as e:
+        print(f"❌ 市区町村データの読み込みに失敗しました: {prefecture_name} ({e})")
+        return gpd.GeoDataFrame()
+
+    if not gdf.empty:
+        write_cached_frame(cache_name, cache_key, gdf.drop(columns=["center"]))
+        gdf.attrs["dataset_key"] = f"{cache_name}_{cache_key}"
+    return gdf
+
+
+def _preprocess(gdf: gpd.GeoDataFrame, prefecture_name: str) -> gpd.GeoDataFrame:
+    """行政区域コード単位に統合し、名称付与・簡略化・重心計算を行う"""
+    if gdf.empty or "N03_007" not in gdf.columns:
+        return gpd.GeoDataFrame()
+
+    if gdf.crs is None:
+        gdf = gdf.set_crs("EPSG:4326", allow_override=True)
+    elif gdf.crs.to_string().upper() != "EPSG:4326":
+        gdf = gdf.to_crs("EPSG:4326")
+
+    # 所属未定地などコードの無い区域は除外し、島嶼などで分かれた地物をコード単位にまとめる
+    gdf = gdf[gdf["N03_007"].notna() & gdf.geometry.notna()].copy()
+    gdf["geometry"] = gdf.geometry.make_valid()
+    gdf = gdf.dissolve(by="N03_007", aggfunc="first", as_index=False)
+
+    gdf["nam_ja"] = gdf.apply(_municipality_name, axis=1)
+    gdf["pref_ja"] = prefecture_name
+    gdf = gdf.rename(columns={"N03_007": "code"})[
+        ["code", "nam_ja", "pref_ja", "geometry"]
+    ]
+
+    gdf["geometry"] = gdf["geometry"].simplify(
+        tolerance=MUNICIPALITY_SIMPLIFY_TOLERANCE, preserve_topology=True
+    )
+    gdf = gdf[gdf.geometry.is_valid & ~gdf.geometry.is_empty].reset_index(drop=True)
+
+    gdf["center"] = gdf["geometry"].representative_point()
+    gdf["center_x"] = gdf["center"].x
+    gdf["center_y"] = gdf["center"].y
+    return gdf
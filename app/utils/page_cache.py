@@ -0,0 +1,292 @@
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+
+from config.constants import (
+    PAGE_CACHE_TTL_SEC,
+    PAGE_FAILURE_TTL_SEC,
+    WEB_CACHE_PATH,
+)
+from utils.cassette import get_cassette
+from utils.tracing import span
+
+REQUEST_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "ja,en;q=0.8",
+}
+
+# 失敗をドメイン単位で記録する理由 (同じサイトの別URLも同様に失敗しやすいもの)
+# タイムアウトはページ単位の遅さのことが多いため、URL単位で記録する
+DOMAIN_WIDE_FAILURES = {"ConnectionError", "HTTP403", "HTTP429"}
+
+_TRACKING_PARAM_PREFIXES = ("utm_", "fbclid", "gclid")
+
+
+class PageFetchError(Exception):
+    """ページを取得できなかった (キャッシュされた失敗を含む)"""
+
+    def __init__(self, reason: str, cached: bool = False):
+        super().__init__(reason)
+        self.reason = reason
+        self.cached = cached
+
+
+@dataclass(frozen=True)
+class CachedPage:
+    url: str
+    html: str
+    fetched_at: float
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+
+def normalize_url(url: str) -> str:
+    """キャッシュキー用にURLを正規化する (フラグメント・追跡用パラメータを除去)"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not (
+        (scheme == "http" and parts.port == 80)
+        or (scheme == "https" and parts.port == 443)
+    ):
+        host = f"{host}:{parts.port}"
+    query = urlencode(
+        sorted(
+            (key, value)
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if not key.lower().startswith(_TRACKING_PARAM_PREFIXES)
+        )
+    )
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def url_domain(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+class PageCache:
+    """
+    取得済みHTML (zlib圧縮) と失敗記録を保持するSQLiteキャッシュ。
+    スレッドごとに接続を開くため、並行取得からそのまま呼び出せる。
+    """
+
+    def __init__(self, path: str = WEB_CACHE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    body BLOB NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS failures (
+                    key TEXT PRIMARY KEY,
+                    reason TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get_page(self, url: str) -> Optional[CachedPage]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT body, fetched_at, etag, last_modified FROM pages WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        body, fetched_at, etag, last_modified = row
+        html = zlib.decompress(body).decode("utf-8")
+        return CachedPage(url, html, fetched_at, etag, last_modified)
+
+    def put_page(
+        self,
+        url: str,
+        html: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        fetched_at: Optional[float] = None,
+    ) -> None:
+        body = zlib.compress(html.encode("utf-8"), 6)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                (url, body, fetched_at or time.time(), etag, last_modified),
+            )
+
+    def touch_page(self, url: str) -> None:
+        """304応答で再検証できたページの取得時刻を更新する"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url)
+            )
+
+    def get_failure(self, url: str) -> Optional[str]:
+        """URLまたはそのドメインに有効な失敗記録があれば理由を返す"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT reason FROM failures WHERE key IN (?, ?) AND expires_at > ?",
+                (url, f"domain:{url_domain(url)}", now),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_failure(self, url: str, reason: str, ttl_sec: float) -> None:
+        key = f"domain:{url_domain(url)}" if reason in DOMAIN_WIDE_FAILURES else url
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO failures VALUES (?, ?, ?)",
+                (key, reason, time.time() + ttl_sec),
+            )
+
+
+_page_cache: Optional[PageCache] = None
+
+
+def get_page_cache() -> PageCache:
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = PageCache()
+    return _page_cache
+
+
+def _classify_response(response: requests.Response) -> Optional[str]:
+    """失敗として扱う応答であれば理由を返す"""
+    if response.status_code != 200:
+        return f"HTTP{response.status_code}"
+    content_type = response.headers.get("Content-Type", "").lower()
+    if content_type and "html" not in content_type:
+        return "NotHTML"
+    return None
+
+
+def fetch_html(
+    url: str, timeout_sec: float, cache_timeout: bool = True
+) -> Tuple[str, str]:
+    """
+    キャッシュを考慮してページのHTMLを取得する。
+    戻り値は (HTML, 取得元) で、取得元は "cache" / "revalidated" / "network"。
+    取得できない場合は PageFetchError を送出する。
+    cache_timeout が False の場合、タイムアウトを失敗として記録しない
+    (全体の期限に合わせて短くしたタイムアウトで、ページ自体が遅いとは限らない場合)。
+    カセットの記録・再生モードでは、取得失敗も含めてカセットを経由する。
+    """
+    with span("web_page", url=url, domain=url_domain(url)) as trace_span:
+        try:
+            html, source = _fetch_html_recorded(
+                url, timeout_sec, cache_timeout, trace_span
+            )
+        except PageFetchError as e:
+            trace_span.set("failure", e.reason)
+            trace_span.set("cache_hit", e.cached)
+            raise
+        trace_span.set("source", source)
+        trace_span.set("cache_hit", source != "network")
+        if trace_span.recording:
+            trace_span.set("bytes", len(html.encode("utf-8")))
+        return html, source
+
+
+def _fetch_html_recorded(
+    url: str, timeout_sec: float, cache_timeout: bool, trace_span
+) -> Tuple[str, str]:
+    cassette = get_cassette()
+    if cassette is None:
+        return _fetch_html(url, timeout_sec, cache_timeout)
+    trace_span.set("replayed", cassette.replaying)
+
+    def fetch():
+        try:
+            return list(_fetch_html(url, timeout_sec, cache_timeout))
+        except PageFetchError as e:
+            return {"failure": e.reason, "cached": e.cached}
+
+    result = cassette.call("web_page", {"url": normalize_url(url)}, fetch)
+    if isinstance(result, dict):
+        raise PageFetchError(result["failure"], cached=result["cached"])
+    html, source = result
+    return html, source
+
+
+def _fetch_html(url: str, timeout_sec: float, cache_timeout: bool) -> Tuple[str, str]:
+    cache = get_page_cache()
+    key = normalize_url(url)
+
+    # 有効期間内のキャッシュは、その後に記録された失敗より優先する
+    cached = cache.get_page(key)
+    if cached and time.time() - cached.fetched_at < PAGE_CACHE_TTL_SEC:
+        return cached.html, "cache"
+
+    failure = cache.get_failure(key)
+    if failure:
+        raise PageFetchError(failure, cached=True)
+
+    headers = dict(REQUEST_HEADERS)
+    if cached and cached.etag:
+        headers["If-None-Match"] = cached.etag
+    if cached and cached.last_modified:
+        headers["If-Modified-Since"] = cached.last_modified
+
+    def timed_out() -> PageFetchError:
+        if cache_timeout:
+            cache.put_failure(key, "Timeout", PAGE_FAILURE_TTL_SEC)
+        return PageFetchError("Timeout")
+
+    # 本文は応答ヘッダーを確認してから読む (HTML以外の大きなファイルを受信しない)
+    try:
+        response = requests.get(url, headers=headers, timeout=timeout_sec, stream=True)
+    except requests.Timeout:
+        raise timed_out()
+    except requests.ConnectionError:
+        cache.put_failure(key, "ConnectionError", PAGE_FAILURE_TTL_SEC)
+        raise PageFetchError("ConnectionError")
+
+    with closing(response):
+        if cached and response.status_code == 304:
+            cache.touch_page(key)
+            return cached.html, "revalidated"
+
+        failure = _classify_response(response)
+        if failure:
+            cache.put_failure(key, failure, PAGE_FAILURE_TTL_SEC)
+            raise PageFetchError(failure)
+
+        # charset未指定のHTMLは requests が ISO-8859-1 とみなすため、本文から推定し直す
+        try:
+            if not response.encoding or response.encoding.lower() == "iso-8859-1":
+                response.encoding = response.apparent_encoding
+            html = response.text
+        except requests.RequestException:
+            # 本文の受信中のタイムアウト (requests は ConnectionError として送出する)
+            raise timed_out()
+
+    cache.put_page(
+        key,
+        html,
+        response.headers.get("ETag"),
+        response.headers.get("Last-Modified"),
+    )
+    return html, "network"
@@ -0,0 +1,96 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+import shapely
+import streamlit as st
+import geopandas as gpd
+
+from utils.data_loader import get_dataset_key
+
+
+class PrefectureLocator:
+    """
+    緯度経度から都道府県を特定するための空間インデックス。
+    nam_ja 列を持つ任意の行政区域 (市区町村など) のGeoDataFrameにも使える。
+    STRtree によるバウンディングボックスの絞り込みと、prepared geometry による
+    contains 判定を組み合わせ、全ポリゴンの線形走査を避ける。
+    """
+
+    def __init__(self, names: Sequence[str], geometries: Sequence):
+        self._names = list(names)
+        self._geometries = np.asarray(geometries, dtype=object)
+        self._position_by_name = {}
+        for position, name in enumerate(self._names):
+            self._position_by_name.setdefault(name, position)
+        shapely.prepare(self._geometries)
+        self._tree = shapely.STRtree(self._geometries)
+
+    @classmethod
+    def from_gdf(cls, gdf: gpd.GeoDataFrame) -> "PrefectureLocator":
+        return cls(gdf["nam_ja"].tolist(), gdf.geometry.values)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def geometry(self, name: str):
+        """名称に対応するジオメトリを返す。該当なしは None"""
+        position = self._position_by_name.get(name)
+        return self._geometries[position] if position is not None else None
+
+    def locate_many(
+        self, longitudes: Sequence[float], latitudes: Sequence[float]
+    ) -> np.ndarray:
+        """
+        複数の座標をまとめて判定し、各座標を含む行の位置 (iloc) を返す。
+        どの都道府県にも含まれない座標は -1。
+        """
+        points = shapely.points(
+            np.asarray(longitudes, dtype=float), np.asarray(latitudes, dtype=float)
+        )
+        positions = np.full(len(points), -1, dtype=np.int64)
+        if len(points) == 0 or len(self._names) == 0:
+            return positions
+
+        # バウンディングボックスで候補を絞り込み、候補ペアだけを厳密判定する
+        point_idx, geom_idx = self._tree.query(points)
+        if len(point_idx) == 0:
+            return positions
+        hits = shapely.contains(self._geometries[geom_idx], points[point_idx])
+        point_idx, geom_idx = point_idx[hits], geom_idx[hits]
+
+        # 複数ポリゴンに該当した場合は元データで先に現れる行を採用する
+        order = np.lexsort((geom_idx, point_idx))
+        point_idx, geom_idx = point_idx[order], geom_idx[order]
+        first = np.ones(len(point_idx), dtype=bool)
+        first[1:] = point_idx[1:] != point_idx[:-1]
+        positions[point_idx[first]] = geom_idx[first]
+        return positions
+
+    def locate(self, longitude: float, latitude: float) -> Optional[int]:
+        """単一座標を含む行の位置 (iloc) を返す。該当なしは None"""
+        position = int(self.locate_many([longitude], [latitude])[0])
+        return position if position >= 0 else None
+
+    def locate_name(self, longitude: float, latitude: float) -> Optional[str]:
+        """単一座標を含む行の名称 (nam_ja) を返す。該当なしは None"""
+        position = self.locate(longitude, latitude)
+        return self._names[position] if position is not None else None
+
+    def locate_names(
+        self, longitudes: Sequence[float], latitudes: Sequence[float]
+    ) -> List[Optional[str]]:
+        """複数の座標をまとめて都道府県名に変換する (アクセスログの集計用)"""
+        return [
+            self._names[position] if position >= 0 else None
+            for position in self.locate_many(longitudes, latitudes)
+        ]
+
+
+@st.cache_resource(show_spinner=False)
+def _build_locator(_gdf: gpd.GeoDataFrame, dataset_key: str) -> PrefectureLocator:
+    return PrefectureLocator.from_gdf(_gdf)
+
+
+def get_prefecture_locator(gdf: gpd.GeoDataFrame) -> PrefectureLocator:
+    """データセットの世代ごとに一度だけ構築したロケーターを返す"""
+    return _build_locator(gdf, get_dataset_key(gdf))
@@ -0,0 +1,78 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+import streamlit as st
+import geopandas as gpd
+
+from utils.data_loader import get_dataset_key
+
+
+@dataclass(frozen=True, slots=True)
+class PrefectureRecord:
+    """都道府県1件分の表示・移動に必要な情報"""
+
+    name: str
+    name_en: str
+    center_lon: float
+    center_lat: float
+    # (min_lon, min_lat, max_lon, max_lat)
+    bbox: Tuple[float, float, float, float]
+
+
+class PrefectureRegistry:
+    """
+    nam_ja をキーに PrefectureRecord を引く読み取り専用の索引。
+    クリックやセレクトボックス操作のたびに GeoDataFrame を絞り込まないために使う。
+    """
+
+    __slots__ = ("_records",)
+
+    def __init__(self, records: Mapping[str, PrefectureRecord]):
+        self._records = MappingProxyType(dict(records))
+
+    @classmethod
+    def from_gdf(cls, gdf: gpd.GeoDataFrame) -> "PrefectureRegistry":
+        bounds = gdf.geometry.bounds.to_numpy()
+        records = {}
+        for name, name_en, center_lon, center_lat, bbox in zip(
+            gdf["nam_ja"].tolist(),
+            gdf["nam"].tolist(),
+            gdf["center_x"].tolist(),
+            gdf["center_y"].tolist(),
+            bounds.tolist(),
+        ):
+            # 同名の行が複数ある場合は従来の iloc[0] と同じく先頭を採用する
+            if name not in records:
+                records[name] = PrefectureRecord(
+                    name=name,
+                    name_en=name_en,
+                    center_lon=float(center_lon),
+                    center_lat=float(center_lat),
+                    bbox=tuple(bbox),
+                )
+        return cls(records)
+
+    def get(self, name: Optional[str]) -> Optional[PrefectureRecord]:
+        if not name:
+            return None
+        return self._records.get(name)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def names(self):
+        return list(self._records.keys())
+
+
+@st.cache_resource(show_spinner=False)
+def _build_registry(_gdf: gpd.GeoDataFrame, dataset_key: str) -> PrefectureRegistry:
+    return PrefectureRegistry.from_gdf(_gdf)
+
+
+def get_prefecture_registry(gdf: gpd.GeoDataFrame) -> PrefectureRegistry:
+    """データセットの世代ごとに一度だけ構築したレジストリを返す"""
+    return _build_registry(gdf, get_dataset_key(gdf))
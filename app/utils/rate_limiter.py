@@ -0,0 +1,295 @@
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from config.constants import (
+    IMAGE_MAX_CONCURRENCY,
+    MODEL_CALL_BACKOFF_BASE_SEC,
+    MODEL_CALL_BACKOFF_MAX_SEC,
+    MODEL_CALL_MAX_RETRIES,
+    VERTEX_CHAT_MAX_CONCURRENCY,
+)
+from utils.tracing import current_span
+
+# クォータ超過・一時的な障害として再試行する例外 (google.api_core の例外クラス名)
+_RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted",
+    "TooManyRequests",
+    "ServiceUnavailable",
+    "DeadlineExceeded",
+    "InternalServerError",
+}
+_THROTTLE_ERROR_NAMES = {"ResourceExhausted", "TooManyRequests"}
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """例外が持つHTTPステータスコード (google.api_core の code / HTTPクライアントの status_code)"""
+    for name in ("code", "status_code"):
+        code = getattr(error, name, None)
+        if code is None or callable(code):
+            continue
+        try:
+            return int(code)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def is_throttle_error(error: Exception) -> bool:
+    """429 (クォータ超過) を表す例外か (例外の型とステータスコードで判定する)"""
+    return type(error).__name__ in _THROTTLE_ERROR_NAMES or _status_code(error) == 429
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """時間をおけば成功する見込みのある例外か"""
+    return (
+        is_throttle_error(error)
+        or type(error).__name__ in _RETRYABLE_ERROR_NAMES
+        or _status_code(error) in (500, 502, 503, 504)
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class LimiterStats:
+    """リミッターの現在の状態 (UI・ログ表示用)"""
+
+    name: str
+    limit: int
+    in_flight: int
+    waiting: int
+    throttled: int
+
+    def summary(self) -> str:
+        return (
+            f"{self.name}: 実行中 {self.in_flight}/{self.limit}, 待機 {self.waiting}"
+            f", 429 {self.throttled}回"
+        )
+
+
+class AdaptiveLimiter:
+    """
+    AIMD方式で同時実行数を調整するリミッター。
+    上限まで使っている間は成功ごとに上限を緩やかに増やし (加算的増加)、
+    429や応答時間の急増を検知したら半減する (乗算的減少)。
+    再試行は指数バックオフ (フルジッター) で行う。
+    応答時間の平均は呼び出しの種類 (latency_kind) ごとに持ち、
+    短い呼び出しと長い生成が混ざっても長い生成を「急増」とみなさない。
+    """
+
+    # 同じ種類の直近の平均応答時間に対してこの倍率を超えた呼び出しを「急増」とみなす
+    LATENCY_SPIKE_RATIO = 3.0
+    # 平均応答時間が安定するまで急増の判定をしない件数
+    LATENCY_WARMUP_SAMPLES = 5
+
+    def __init__(
+        self,
+        name: str,
+        max_limit: int,
+        min_limit: int = 1,
+        initial_limit: Optional[int] = None,
+    ):
+        self.name = name
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self._limit = float(initial_limit or self.max_limit)
+        self._last_decrease = 0.0
+        self._in_flight = 0
+        self._waiting = 0
+        self._throttled = 0
+        self._latency_avg: Dict[str, float] = {}
+        self._latency_samples: Dict[str, int] = {}
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    def stats(self) -> LimiterStats:
+        with self._condition:
+            return LimiterStats(
+                self.name, self.limit, self._in_flight, self._waiting, self._throttled
+            )
+
+    def _acquire(self) -> None:
+        started = time.monotonic()
+        with self._condition:
+            self._waiting += 1
+            try:
+                while self._in_flight >= self.limit:
+                    self._condition.wait()
+            finally:
+                self._waiting -= 1
+            self._in_flight += 1
+        # 実行中の区間 (外部呼び出し) に、枠が空くまで待った時間を記録する
+        current_span().add("limiter_wait_sec", round(time.monotonic() - started, 3))
+
+    def _release(
+        self, latency_sec: Optional[float], throttled: bool, latency_kind: str
+    ) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            if throttled:
+                self._throttled += 1
+                self._decrease(latency_kind)
+            elif latency_sec is not None:
+                if self._is_latency_spike(latency_sec, latency_kind):
+                    self._decrease(latency_kind)
+                elif self._in_flight + 1 >= self.limit:
+                    # 上限まで使い切っている間だけ、1ウィンドウ (上限件数) の成功ごとに上限を1増やす
+                    self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+                self._record_latency(latency_sec, latency_kind)
+            self._condition.notify_all()
+
+    def _is_latency_spike(self, latency_sec: float, latency_kind: str) -> bool:
+        average = self._latency_avg.get(latency_kind)
+        return (
+            average is not None
+            and self._latency_samples.get(latency_kind, 0)
+            >= self.LATENCY_WARMUP_SAMPLES
+            and latency_sec > average * self.LATENCY_SPIKE_RATIO
+        )
+
+    def _record_latency(self, latency_sec: float, latency_kind: str) -> None:
+        self._latency_samples[latency_kind] = (
+            self._latency_samples.get(latency_kind, 0) + 1
+        )
+        average = self._latency_avg.get(latency_kind)
+        self._latency_avg[latency_kind] = (
+            latency_sec if average is None else 0.8 * average + 0.2 * latency_sec
+        )
+
+    def _decrease(self, latency_kind: str) -> None:
+        # 同じウィンドウ (おおよそ平均応答時間内) に返ってきた複数の429で何度も半減させない
+        now = time.monotonic()
+        if now - self._last_decrease < self._latency_avg.get(latency_kind, 0.0):
+            return
+        self._last_decrease = now
+        self._limit = max(float(self.min_limit), self._limit / 2)
+        print(f"⚠️ {self.name}: 同時実行数の上限を {self.limit} に下げました")
+
+    def call(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        max_retries: int = MODEL_CALL_MAX_RETRIES,
+        latency_kind: str = "default",
+        **kwargs: Any,
+    ) -> Any:
+        """
+        上限内で func を呼び出す。再試行可能なエラーはバックオフして再試行し、
+        回数を使い切った場合や再試行できないエラーはそのまま送出する。
+        latency_kind は応答時間を比べる呼び出しの種類 (所要時間が大きく違う呼び出しを分ける)。
+        """
+        attempt = 0
+        while True:
+            self._acquire()
+            started = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                self._release(None, throttled, latency_kind)
+                if not is_retryable_error(e) or attempt >= max_retries:
+                    raise
+                delay = random.uniform(
+                    0,
+                    min(
+                        MODEL_CALL_BACKOFF_MAX_SEC,
+                        MODEL_CALL_BACKOFF_BASE_SEC * 2**attempt,
+                    ),
+                )
+                attempt += 1
+                current_span().add("retries")
+                if throttled:
+                    current_span().add("throttled")
+                print(
+                    f"    -> {self.name}: {type(e).__name__} のため {delay:.1f}秒後に再試行 "
+                    f"({attempt}/{max_retries})"
+                )
+                time.sleep(delay)
+                continue
+            self._release(time.monotonic() - started, False, latency_kind)
+            return result
+
+    def stream(
+        self,
+        func: Callable[..., Iterator[Any]],
+        *args: Any,
+        max_retries: int = MODEL_CALL_MAX_RETRIES,
+        latency_kind: str = "default",
+        **kwargs: Any,
+    ) -> Iterator[Any]:
+        """
+        ストリーミング呼び出し用の call。ストリームが終わるまで枠を占有する。
+        最初のチャンクを受け取る前のエラーのみ再試行し、応答時間は最初のチャンクまでの時間で測る。
+        """
+        attempt = 0
+        while True:
+            self._acquire()
+            started = time.monotonic()
+            first_chunk_sec: Optional[float] = None
+            try:
+                for chunk in func(*args, **kwargs):
+                    if first_chunk_sec is None:
+                        first_chunk_sec = time.monotonic() - started
+                    yield chunk
+            except Exception as e:
+                throttled = first_chunk_sec is None and is_throttle_error(e)
+                self._release(None, throttled, latency_kind)
+                if (
+                    first_chunk_sec is not None
+                    or not is_retryable_error(e)
+                    or attempt >= max_retries
+                ):
+                    raise
+                delay = random.uniform(
+                    0,
+                    min(
+                        MODEL_CALL_BACKOFF_MAX_SEC,
+                        MODEL_CALL_BACKOFF_BASE_SEC * 2**attempt,
+                    ),
+                )
+                attempt += 1
+                current_span().add("retries")
+                if throttled:
+                    current_span().add("throttled")
+                print(
+                    f"    -> {self.name}: {type(e).__name__} のため {delay:.1f}秒後に再試行 "
+                    f"({attempt}/{max_retries})"
+                )
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # 呼び出し側がストリームを途中で閉じた場合 (GeneratorExit) も枠を返す
+                self._release(None, False, latency_kind)
+                raise
+            self._release(first_chunk_sec, False, latency_kind)
+            return
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+# リミッター名と同時実行数の上限
+_LIMITER_MAX_CONCURRENCY = {
+    "vertex_chat": VERTEX_CHAT_MAX_CONCURRENCY,
+    "imagen": IMAGE_MAX_CONCURRENCY,
+}
+
+
+def get_limiter(name: str) -> AdaptiveLimiter:
+    """プロセス全体で共有するリミッターを返す ("vertex_chat" / "imagen")"""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = AdaptiveLimiter(name, _LIMITER_MAX_CONCURRENCY.get(name, 4))
+            _limiters[name] = limiter
+        return limiter
+
+
+def get_limiter_stats() -> List[LimiterStats]:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.stats() for limiter in limiters]
@@ -0,0 +1,249 @@
+import json
+import os
+import sqlite3
+import time
+import unicodedata
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_google_community.search import GoogleSearchAPIWrapper
+
+from config.constants import (
+    CSE_DAILY_QUOTA,
+    CSE_QUOTA_RESERVE,
+    SEARCH_CACHE_TTL_SEC,
+    WEB_CACHE_PATH,
+)
+from utils.cassette import get_cassette
+from utils.tracing import span
+
+try:
+    from zoneinfo import ZoneInfo
+
+    # CSEの1日の上限は太平洋時間の0時にリセットされる
+    _QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+except Exception:
+    _QUOTA_TIMEZONE = timezone.utc
+
+
+class SearchQuotaExceeded(Exception):
+    """本日のCSEクエリ上限に達しており、キャッシュ済みの結果も無い"""
+
+
+@dataclass(frozen=True, slots=True)
+class SearchQuota:
+    """本日分のCSEクエリ使用状況 (このアプリからの呼び出しをローカルで数えたもの)"""
+
+    day: str
+    used: int
+    limit: int
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.limit - self.used)
+
+    @property
+    def low(self) -> bool:
+        return self.remaining <= CSE_QUOTA_RESERVE
+
+    def summary(self) -> str:
+        return (
+            f"{self.used}/{self.limit} 件使用 (残り {self.remaining} 件, {self.day} PT)"
+        )
+
+
+def normalize_query(query: str) -> str:
+    """全角・半角や空白の違いを吸収したキャッシュキー用のクエリ"""
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+def _quota_day(now: Optional[float] = None) -> str:
+    moment = datetime.fromtimestamp(time.time() if now is None else now, timezone.utc)
+    return moment.astimezone(_QUOTA_TIMEZONE).strftime("%Y-%m-%d")
+
+
+class SearchCache:
+    """検索結果と日別クエリ数を保持するSQLiteキャッシュ (ページキャッシュと同じDBを使う)"""
+
+    def __init__(self, path: str = WEB_CACHE_PATH, daily_limit: int = CSE_DAILY_QUOTA):
+        self.path = path
+        self.daily_limit = daily_limit
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS search_results (
+                    query TEXT NOT NULL,
+                    num_results INTEGER NOT NULL,
+                    results TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (query, num_results)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS search_quota (
+                    day TEXT PRIMARY KEY,
+                    used INTEGER NOT NULL
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get_results(
+        self, query: str, num_results: int
+    ) -> Optional[Tuple[List[Dict[str, Any]], float]]:
+        """キャッシュ済みの (検索結果, 取得時刻) を返す"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT results, fetched_at FROM search_results "
+                "WHERE query = ? AND num_results = ?",
+                (query, num_results),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put_results(
+        self, query: str, num_results: int, results: List[Dict[str, Any]]
+    ) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO search_results VALUES (?, ?, ?, ?)",
+                (
+                    query,
+                    num_results,
+                    json.dumps(results, ensure_ascii=False),
+                    time.time(),
+                ),
+            )
+
+    def quota(self) -> SearchQuota:
+        day = _quota_day()
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT used FROM search_quota WHERE day = ?", (day,)
+            ).fetchone()
+        return SearchQuota(day, row[0] if row else 0, self.daily_limit)
+
+    def try_consume_quota(self) -> Optional[SearchQuota]:
+        """上限内であれば1クエリ分を計上して使用後の状況を返す。上限に達していれば None"""
+        day = _quota_day()
+        with closing(self._connect()) as conn:
+            conn.isolation_level = None
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT used FROM search_quota WHERE day = ?", (day,)
+                ).fetchone()
+                used = row[0] if row else 0
+                if used >= self.daily_limit:
+                    conn.execute("ROLLBACK")
+                    return None
+                conn.execute(
+                    "INSERT OR REPLACE INTO search_quota VALUES (?, ?)", (day, used + 1)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return SearchQuota(day, used + 1, self.daily_limit)
+
+    def mark_quota_exhausted(self) -> None:
+        """APIから上限超過 (429) が返った場合、本日分を使い切ったものとして記録する"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO search_quota VALUES (?, ?)",
+                (_quota_day(), self.daily_limit),
+            )
+
+
+_search_cache: Optional[SearchCache] = None
+
+
+def get_search_cache() -> SearchCache:
+    global _search_cache
+    if _search_cache is None:
+        _search_cache = SearchCache()
+    return _search_cache
+
+
+def get_search_quota() -> SearchQuota:
+    """UI・ログ表示用に本日のCSEクエリ使用状況を返す"""
+    return get_search_cache().quota()
+
+
+def _is_quota_error(error: Exception) -> bool:
+    status = getattr(getattr(error, "resp", None), "status", None)
+    return str(status) == "429" or "rateLimitExceeded" in str(error)
+
+
+def search_with_cache(
+    query: str, api_key: str, cse_id: str, num_results: int
+) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    キャッシュを考慮してGoogle検索を実行する。
+    戻り値は (検索結果, 取得元) で、取得元は "cache" / "stale_cache" / "api"。
+    クエリ上限が近い場合やAPIエラー時は、期限切れでもキャッシュ済みの結果を返す。
+    カセットの記録・再生モードではカセットを経由する (再生時はクエリ上限を消費しない)。
+    """
+    with span("google_search", query=query, num_results=num_results) as trace_span:
+        cassette = get_cassette()
+        if cassette is None:
+            results, source = _search_with_cache(query, api_key, cse_id, num_results)
+        else:
+            trace_span.set("replayed", cassette.replaying)
+            results, source = cassette.call(
+                "google_search",
+                {"query": normalize_query(query), "num_results": num_results},
+                lambda: list(_search_with_cache(query, api_key, cse_id, num_results)),
+            )
+        trace_span.set("source", source)
+        trace_span.set("cache_hit", source != "api")
+        trace_span.set("results", len(results))
+        return results, source
+
+
+def _search_with_cache(
+    query: str, api_key: str, cse_id: str, num_results: int
+) -> Tuple[List[Dict[str, Any]], str]:
+    cache = get_search_cache()
+    key = normalize_query(query)
+    cached = cache.get_results(key, num_results)
+
+    if cached and time.time() - cached[1] < SEARCH_CACHE_TTL_SEC:
+        return cached[0], "cache"
+
+    if cached and cache.quota().low:
+        print(f"    -> 検索クエリ残数が少ないためキャッシュを利用: 「{query}」")
+        return cached[0], "stale_cache"
+
+    quota = cache.try_consume_quota()
+    if quota is None:
+        if cached:
+            return cached[0], "stale_cache"
+        raise SearchQuotaExceeded(
+            f"本日のGoogle検索の上限 ({cache.daily_limit}件) に達しました。"
+        )
+
+    try:
+        results = GoogleSearchAPIWrapper(
+            google_api_key=api_key, google_cse_id=cse_id
+        ).results(query=query, num_results=num_results)
+    except Exception as e:
+        if _is_quota_error(e):
+            cache.mark_quota_exhausted()
+        if cached:
+            print(f"    -> 検索APIエラーのためキャッシュを利用: {type(e).__name__}")
+            return cached[0], "stale_cache"
+        raise
+
+    print(f"    -> Google検索API呼び出し: {quota.summary()}")
+    cache.put_results(key, num_results, results)
+    return results, "api"
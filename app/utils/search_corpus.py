@@ -0,0 +1,222 @@
+import math
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+from config.constants import (
+    CORPUS_CONTEXT_MAX_CHARS,
+    CORPUS_MAX_CHARS_PER_PAGE,
+    CORPUS_MIN_CONTEXT_CHARS,
+    CORPUS_MIN_COVERAGE,
+    CORPUS_MIN_TERM_OVERLAP,
+    CORPUS_PASSAGE_CHARS,
+)
+
+# BM25 のパラメータ
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+# 文の区切り (句点・感嘆符・疑問符・改行の直後で分割する)
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[。！？!?\n])")
+
+
+@dataclass(frozen=True)
+class Passage:
+    """コーパス中の段落と、タイトル・サブタイトルに対する関連度"""
+
+    url: Optional[str]
+    title: str
+    text: str
+    score: float = 0.0
+
+
+@dataclass(frozen=True)
+class CorpusSelection:
+    """コーパスから選んだ段落と、サブタイトルごとの網羅状況"""
+
+    passages: List[Passage]
+    coverage: float
+    uncovered: List[str]
+
+    @property
+    def context_chars(self) -> int:
+        return sum(len(passage.text) for passage in self.passages)
+
+    @property
+    def sufficient(self) -> bool:
+        """改めて検索せずに記事生成の参考情報として使えるか"""
+        return (
+            self.coverage >= CORPUS_MIN_COVERAGE
+            and self.context_chars >= CORPUS_MIN_CONTEXT_CHARS
+        )
+
+    def to_context(self) -> str:
+        """記事生成プロンプトに渡す形式 (scrape_and_prepare_context と同じ区切り) にする"""
+        return "\n\n---\n\n".join(
+            f"参照元: {passage.url or passage.title}\n内容: {passage.text}"
+            for passage in self.passages
+        )
+
+
+def corpus_document(result: Dict[str, Any], text: Optional[str]) -> Dict[str, Any]:
+    """
+    検索結果1件と取得したページ本文から、コーパスの文書を作る。
+    本文を取得できなかったページはスニペットのみを持つ。
+    セッションに保存するため、JSONにできる辞書で表す。
+    """
+    return {
+        "url": result.get("link"),
+        "title": result.get("title", ""),
+        "snippet": result.get("snippet", ""),
+        "text": (text or "")[:CORPUS_MAX_CHARS_PER_PAGE],
+    }
+
+
+def split_passages(text: str, max_chars: int = CORPUS_PASSAGE_CHARS) -> List[str]:
+    """本文を文の区切りで分割し、max_chars 程度の段落にまとめる"""
+    passages: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_BOUNDARY.split(text):
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            continue
+        # 区切りの無い長い文は max_chars ごとに切る
+        while len(sentence) > max_chars:
+            if current:
+                passages.append(current)
+                current = ""
+            passages.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) > max_chars:
+            passages.append(current)
+            current = ""
+        current += sentence
+    if current:
+        passages.append(current)
+    return passages
+
+
+def _terms(text: str) -> List[str]:
+    """
+    日本語は単語の区切りが無いため、正規化した文字の2-gramを語として扱う。
+    記号・空白は取り除く。
+    """
+    normalized = unicodedata.normalize("NFKC", text).lower()
+    characters = "".join(c for c in normalized if c.isalnum())
+    return [characters[i : i + 2] for i in range(len(characters) - 1)]
+
+
+def _corpus_passages(corpus: Sequence[Dict[str, Any]]) -> List[Passage]:
+    passages = []
+    for document in corpus:
+        text = document.get("text") or document.get("snippet") or ""
+        for passage in split_passages(text):
+            passages.append(
+                Passage(document.get("url"), document.get("title", ""), passage)
+            )
+    return passages
+
+
+def select_passages(
+    corpus: Sequence[Dict[str, Any]],
+    main_title: str,
+    subtitles: Sequence[str],
+    max_chars: int = CORPUS_CONTEXT_MAX_CHARS,
+) -> CorpusSelection:
+    """
+    コーパスの段落をメインタイトル・各サブタイトルに対して BM25 で順位付けし、
+    各サブタイトルに最も関連する段落を優先して max_chars まで選ぶ。
+    コーパスに現れる語がIDFの重みで CORPUS_MIN_TERM_OVERLAP 以上含まれる段落があるサブタイトルを
+    「網羅済み」とする (哲学的な言い回しなど、コーパスに無い語は判定に使わない)。
+    """
+    passages = _corpus_passages(corpus)
+    if not passages:
+        return CorpusSelection([], 0.0, list(subtitles))
+
+    passage_terms = [Counter(_terms(passage.text)) for passage in passages]
+    lengths = [sum(terms.values()) for terms in passage_terms]
+    average_length = sum(lengths) / len(lengths) or 1.0
+    document_frequency: Counter = Counter()
+    for terms in passage_terms:
+        document_frequency.update(terms.keys())
+    count = len(passages)
+
+    def idf(term: str) -> float:
+        # コーパスに現れる語についてのみ呼ばれる
+        df = document_frequency[term]
+        return math.log(1 + (count - df + 0.5) / (df + 0.5))
+
+    def bm25(query_terms: List[str], index: int) -> float:
+        terms = passage_terms[index]
+        norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * lengths[index] / average_length)
+        score = 0.0
+        for term in query_terms:
+            tf = terms.get(term, 0)
+            if tf:
+                score += idf(term) * tf * (_BM25_K1 + 1) / (tf + norm)
+        return score
+
+    def overlap(query_terms: List[str], index: int) -> float:
+        # コーパスに現れない語 (助詞をまたぐ2-gramや抽象的な言い回し) は、どの段落でも
+        # 一致しようがないため、網羅の判定から除く
+        weights = {
+            term: idf(term) for term in query_terms if term in document_frequency
+        }
+        total = sum(weights.values())
+        if total <= 0:
+            return 0.0
+        matched = sum(w for term, w in weights.items() if term in passage_terms[index])
+        return matched / total
+
+    # クエリごとにスコアを最大値で正規化し、全クエリの合計を段落の関連度とする
+    queries = [main_title, *subtitles]
+    query_terms = [list(dict.fromkeys(_terms(query))) for query in queries]
+    combined = [0.0] * count
+    best_for_query: List[Optional[int]] = []
+    for terms in query_terms:
+        scores = [bm25(terms, index) for index in range(count)]
+        top = max(scores)
+        if top <= 0:
+            best_for_query.append(None)
+            continue
+        best_for_query.append(scores.index(top))
+        for index, score in enumerate(scores):
+            combined[index] += score / top
+
+    uncovered = [
+        subtitle
+        for subtitle, terms, best in zip(subtitles, query_terms[1:], best_for_query[1:])
+        if best is None or overlap(terms, best) < CORPUS_MIN_TERM_OVERLAP
+    ]
+    coverage = 1 - len(uncovered) / len(subtitles) if subtitles else 1.0
+
+    # 各サブタイトルの最良の段落を先に選び、残りを関連度の高い順に足す
+    order = [
+        index for index in best_for_query[1:] + best_for_query[:1] if index is not None
+    ]
+    order += sorted(range(count), key=lambda index: combined[index], reverse=True)
+    selected: List[int] = []
+    used_chars = 0
+    for index in dict.fromkeys(order):
+        if combined[index] <= 0:
+            continue
+        length = len(passages[index].text)
+        if used_chars + length > max_chars:
+            continue
+        selected.append(index)
+        used_chars += length
+
+    return CorpusSelection(
+        passages=[
+            Passage(
+                passages[index].url,
+                passages[index].title,
+                passages[index].text,
+                round(combined[index], 3),
+            )
+            for index in selected
+        ],
+        coverage=coverage,
+        uncovered=uncovered,
+    )
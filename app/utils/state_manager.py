@@ -1,7 +1,6 @@
 import streamlit as st
 import pydeck as pdk
 import time
-from shapely.geometry import Point
 import geopandas as gpd
 
 from config.constants import (
@@ -11,6 +10,10 @@ from config.constants import (
     INITIAL_ZOOM,
     PLACEHOLDER_SELECTBOX,
 )
+from utils.prefecture_locator import get_prefecture_locator
+from utils.prefecture_registry import get_prefecture_registry
+from utils.geolocation_filter import filter_geolocation
+from utils.municipality_loader import load_municipalities
 
 
 def initialize_session_state():
@@ -28,7 +31,11 @@ def initialize_session_state():
         "last_clicked_time": 0.0,
         "selectbox_value": PLACEHOLDER_SELECTBOX,
         "last_location_data": None,
+        "geolocation_fix": None,
         "last_map_interaction_type": None,
+        "show_municipalities": False,
+        # (都道府県名, 市区町村名)。都道府県の選択が変わると自動的に無効になる
+        "selected_municipality": None,
     }
     for key, value in defaults.items():
         if key not in st.session_state:
@@ -70,23 +77,20 @@ def process_selected_feature(selected_feature_data, gdf: gpd.GeoDataFrame):
         st.session_state.last_clicked_time = current_time
         st.session_state.last_map_interaction_type = "map_click"
 
-        matched_row = gdf[gdf["nam_ja"] == region_name]
-        if not matched_row.empty:
-            pref_data = matched_row.iloc[0]
-            if "center" in pref_data and isinstance(pref_data["center"], Point):
-                pref_center_pt = pref_data["center"]
-                st.session_state.map_view_state = pdk.ViewState(
-                    latitude=pref_center_pt.y,
-                    longitude=pref_center_pt.x,
-                    # zoom=st.session_state.map_view_state.zoom, # 変更前: 現在のズームレベルを維持
-                    zoom=max(
-                        st.session_state.map_view_state.zoom, 6
-                    ),  # <<< 変更点: selectboxと同様に最小ズームレベル6に設定
-                    pitch=st.session_state.map_view_state.pitch,
-                    bearing=st.session_state.map_view_state.bearing,
-                    transition_duration=500,
-                    transition_interruption="allowed",
-                )
+        pref_record = get_prefecture_registry(gdf).get(region_name)
+        if pref_record is not None:
+            st.session_state.map_view_state = pdk.ViewState(
+                latitude=pref_record.center_lat,
+                longitude=pref_record.center_lon,
+                # zoom=st.session_state.map_view_state.zoom, # 変更前: 現在のズームレベルを維持
+                zoom=max(
+                    st.session_state.map_view_state.zoom, 6
+                ),  # <<< 変更点: selectboxと同様に最小ズームレベル6に設定
+                pitch=st.session_state.map_view_state.pitch,
+                bearing=st.session_state.map_view_state.bearing,
+                transition_duration=500,
+                transition_interruption="allowed",
+            )
         return True, region_name
     return False, region_name
 
@@ -103,40 +107,55 @@ def process_geolocation_data(current_location: dict, gdf: gpd.GeoDataFrame):
             and st.session_state.get("last_location_data") is not None
         ):
             st.session_state.last_location_data = None
+            st.session_state.geolocation_fix = None
         return
 
     if current_location == st.session_state.get("last_location_data"):
         return
 
-    st.session_state.last_location_data = current_location
-    user_point = Point(current_location["longitude"], current_location["latitude"])
-
     if "geometry" not in gdf.columns or gdf["geometry"].isnull().all():
         return
 
-    matched_row = gdf[gdf.geometry.contains(user_point)].copy()
+    # 揺らぎ・短時間の連続更新・境界付近の往復を除外し、都道府県が変わった時だけ反映する
+    previous_fix = st.session_state.get("geolocation_fix")
+    decision = filter_geolocation(
+        previous_fix,
+        current_location["longitude"],
+        current_location["latitude"],
+        get_prefecture_locator(gdf),
+    )
+    if decision.pending:
+        # 最小間隔内の位置は記録せず、次回の再実行時に改めて評価する
+        return
+    st.session_state.last_location_data = current_location
+    st.session_state.geolocation_fix = decision.fix
+    if not decision.prefecture_changed:
+        # 同じ都道府県内の移動でも、新しく採用した位置で市区町村の選択を更新する
+        if decision.fix is not previous_fix and decision.fix.prefecture is not None:
+            update_municipality_from_location(
+                decision.fix.prefecture,
+                decision.fix.longitude,
+                decision.fix.latitude,
+            )
+        return
 
-    if not matched_row.empty:
-        prefecture_data = matched_row.iloc[0]
-        current_pref_name = prefecture_data["nam_ja"]
+    current_pref_name = decision.fix.prefecture
 
-        if "center" not in prefecture_data or not isinstance(
-            prefecture_data["center"], Point
-        ):
+    if current_pref_name is not None:
+        pref_record = get_prefecture_registry(gdf).get(current_pref_name)
+        if pref_record is None:
             return
 
-        pref_center_point = prefecture_data["center"]
-
         state_changed = (
-            st.session_state.map_view_state.latitude != pref_center_point.y
-            or st.session_state.map_view_state.longitude != pref_center_point.x
+            st.session_state.map_view_state.latitude != pref_record.center_lat
+            or st.session_state.map_view_state.longitude != pref_record.center_lon
             or st.session_state.selected_region_on_map != current_pref_name
         )
 
         if state_changed:
             st.session_state.map_view_state = pdk.ViewState(
-                latitude=pref_center_point.y,
-                longitude=pref_center_point.x,
+                latitude=pref_record.center_lat,
+                longitude=pref_record.center_lon,
                 zoom=max(st.session_state.map_view_state.zoom, 7),
                 pitch=st.session_state.map_view_state.pitch,
                 bearing=st.session_state.map_view_state.bearing,
@@ -147,6 +166,11 @@ def process_geolocation_data(current_location: dict, gdf: gpd.GeoDataFrame):
             st.session_state.selected_prefecture_info = current_pref_name
             st.session_state.selectbox_value = current_pref_name
             st.session_state.last_map_interaction_type = "geolocation_update"
+            update_municipality_from_location(
+                current_pref_name,
+                current_location["longitude"],
+                current_location["latitude"],
+            )
             st.toast(f"現在地 ({current_pref_name}) に地図を移動しました。")
             st.rerun()
     else:
@@ -156,3 +180,55 @@ def process_geolocation_data(current_location: dict, gdf: gpd.GeoDataFrame):
             st.session_state.selected_prefecture_info = None
             st.session_state.selectbox_value = PLACEHOLDER_SELECTBOX
             st.rerun()
+
+
+def get_selected_municipality():
+    """現在選択中の都道府県に属する市区町村名を返す (未選択ならNone)"""
+    selected = st.session_state.get("selected_municipality")
+    if not selected:
+        return None
+    prefecture_name, municipality_name = selected
+    if prefecture_name != st.session_state.get("selected_prefecture_info"):
+        return None
+    return municipality_name
+
+
+def process_selected_municipality(selected_feature_data, municipality_gdf):
+    """地図上でクリックされた市区町村の情報を処理"""
+    if not selected_feature_data or not isinstance(selected_feature_data, dict):
+        return False, None
+
+    feature_properties = selected_feature_data.get("properties", selected_feature_data)
+    if not isinstance(feature_properties, dict):
+        return False, None
+
+    municipality_name = feature_properties.get("nam_ja")
+    prefecture_name = feature_properties.get("pref_ja")
+    if not municipality_name or not prefecture_name:
+        return False, None
+
+    if st.session_state.get("selected_municipality") == (
+        prefecture_name,
+        municipality_name,
+    ):
+        return False, municipality_name
+
+    st.session_state.selected_municipality = (prefecture_name, municipality_name)
+    st.session_state.last_clicked_time = time.time()
+    st.session_state.last_map_interaction_type = "municipality_click"
+    return True, municipality_name
+
+
+def update_municipality_from_location(prefecture_name, longitude, latitude):
+    """市区町村表示中であれば、現在地を含む市区町村を選択状態にする"""
+    if not st.session_state.get("show_municipalities"):
+        return
+    municipality_gdf = load_municipalities(prefecture_name)
+    if municipality_gdf.empty:
+        return
+    position = get_prefecture_locator(municipality_gdf).locate(longitude, latitude)
+    if position is not None:
+        st.session_state.selected_municipality = (
+            prefecture_name,
+            municipality_gdf.iloc[position]["nam_ja"],
+        )
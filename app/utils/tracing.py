@@ -0,0 +1,331 @@
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from config.constants import (
+    TRACE_EXPORTER,
+    TRACE_JSONL_PATH,
+    TRACE_MIN_DURATION_SEC,
+    TRACE_OTLP_ENDPOINT,
+)
+
+# 属性に保存する文字列の最大長 (プロンプト全文などでトレースが肥大化しないようにする)
+_MAX_ATTRIBUTE_LENGTH = 300
+
+
+def _attribute_value(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = str(value)
+    if len(text) > _MAX_ATTRIBUTE_LENGTH:
+        return text[:_MAX_ATTRIBUTE_LENGTH] + "…"
+    return text
+
+
+class Span:
+    """
+    処理1回分の区間。開始・終了時刻と属性 (取得バイト数・トークン数・再試行回数など) を持つ。
+    trace_id が同じ区間が1回の記事生成・タイトル生成を表し、parent_id で入れ子になる。
+    """
+
+    recording = True
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str],
+        attributes: Dict[str, Any],
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = {
+            key: _attribute_value(value) for key, value in attributes.items()
+        }
+        self.error: Optional[str] = None
+        self.start_time = time.time()
+        self.duration_sec: Optional[float] = None
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self.attributes[key] = _attribute_value(value)
+
+    def add(self, key: str, amount: float = 1) -> None:
+        """数値の属性に加算する (再試行回数・バイト数の集計用)"""
+        with self._lock:
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def record_error(self, message: str) -> None:
+        """例外を送出せずに失敗した処理を、エラーの区間として記録する"""
+        self.error = message
+
+    def end(self) -> None:
+        self.duration_sec = time.monotonic() - self._started
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            attributes = dict(self.attributes)
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": round((self.duration_sec or 0.0) * 1000, 1),
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": attributes,
+        }
+
+
+class _NoopSpan:
+    """トレースを出力しない設定のときに返す、何も記録しない区間"""
+
+    recording = False
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def add(self, key: str, amount: float = 1) -> None:
+        pass
+
+    def record_error(self, message: str) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+# --- 出力 ---
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(span: Dict[str, Any]) -> Dict[str, Any]:
+    start_ns = int(span["start_time"] * 1e9)
+    otlp = {
+        "traceId": span["trace_id"],
+        "spanId": span["span_id"],
+        "name": span["name"],
+        "kind": 1,
+        "startTimeUnixNano": str(start_ns),
+        "endTimeUnixNano": str(start_ns + int(span["duration_ms"] * 1e6)),
+        "attributes": [
+            {"key": key, "value": _otlp_value(value)}
+            for key, value in span["attributes"].items()
+            if value is not None
+        ],
+        "status": (
+            {"code": 2, "message": span["error"]} if span["error"] else {"code": 1}
+        ),
+    }
+    if span["parent_id"]:
+        otlp["parentSpanId"] = span["parent_id"]
+    return otlp
+
+
+class TraceExporter:
+    """
+    終了した区間をトレース (最上位の区間) ごとにまとめて出力する。
+    - "jsonl": 1区間1行のJSONとしてファイルに追記する
+    - "otlp": OTLP/HTTP (JSON) でコレクターに送信する
+    最上位の区間が min_duration_sec より短いトレースは出力しない (遅かった実行だけを残す)。
+    """
+
+    def __init__(
+        self,
+        kind: str = TRACE_EXPORTER,
+        path: str = TRACE_JSONL_PATH,
+        endpoint: str = TRACE_OTLP_ENDPOINT,
+        min_duration_sec: float = TRACE_MIN_DURATION_SEC,
+    ):
+        if kind not in ("jsonl", "otlp"):
+            raise ValueError(f"不明なトレースの出力先です: {kind}")
+        self.kind = kind
+        self.path = path
+        self.endpoint = endpoint
+        self.min_duration_sec = min_duration_sec
+        self._open_traces: Set[str] = set()
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        if kind == "jsonl":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def on_start(self, span: Span) -> None:
+        if span.parent_id is None:
+            with self._lock:
+                self._open_traces.add(span.trace_id)
+
+    def on_end(self, span: Span) -> None:
+        with self._lock:
+            if span.trace_id not in self._open_traces:
+                # 最上位の区間が終わった後に終わった区間 (打ち切られた取得など) は捨てる
+                return
+            self._pending.setdefault(span.trace_id, []).append(span.to_dict())
+            if span.parent_id is not None:
+                return
+            self._open_traces.discard(span.trace_id)
+            spans = self._pending.pop(span.trace_id)
+        if (span.duration_sec or 0.0) < self.min_duration_sec:
+            return
+        try:
+            self._export(spans)
+        except Exception as e:
+            print(f"⚠️ トレースの出力に失敗しました: {type(e).__name__}: {e}")
+
+    def _export(self, spans: List[Dict[str, Any]]) -> None:
+        if self.kind == "jsonl":
+            lines = "".join(
+                json.dumps(span, ensure_ascii=False) + "\n" for span in spans
+            )
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            return
+        payload = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": "ai-agent-hackason-app"},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "utils.tracing"},
+                            "spans": [_otlp_span(span) for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+        # 送信を待たせないよう、別スレッドでコレクターに送る
+        threading.Thread(
+            target=self._post, args=(payload,), name="trace-export", daemon=True
+        ).start()
+
+    def _post(self, payload: Dict[str, Any]) -> None:
+        # requests は OTLP で送信する場合にだけ必要なため、ここで読み込む
+        # (リミッターなど多くのモジュールが tracing を読み込むため、起動時間に影響させない)
+        import requests
+
+        try:
+            response = requests.post(self.endpoint, json=payload, timeout=5)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"⚠️ トレースの送信に失敗しました: {type(e).__name__}: {e}")
+
+
+_exporter: Optional[TraceExporter] = None
+_exporter_lock = threading.Lock()
+_exporter_resolved = False
+
+
+def get_trace_exporter() -> Optional[TraceExporter]:
+    """TRACE_EXPORTER が "jsonl" / "otlp" の場合に共有の出力先を返す ("off" なら None)"""
+    global _exporter, _exporter_resolved
+    if _exporter_resolved:
+        return _exporter
+    with _exporter_lock:
+        if not _exporter_resolved:
+            if TRACE_EXPORTER != "off":
+                _exporter = TraceExporter()
+                target = (
+                    TRACE_JSONL_PATH
+                    if TRACE_EXPORTER == "jsonl"
+                    else TRACE_OTLP_ENDPOINT
+                )
+                print(f"🔎 トレース ({TRACE_EXPORTER}): {target}")
+            _exporter_resolved = True
+    return _exporter
+
+
+def set_trace_exporter(exporter: Optional[TraceExporter]) -> None:
+    """共有の出力先を差し替える (None でトレースを無効にする)"""
+    global _exporter, _exporter_resolved
+    with _exporter_lock:
+        _exporter = exporter
+        _exporter_resolved = True
+
+
+# --- 区間の記録 ---
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """
+    with ブロックを1つの区間として記録する。実行中の区間があればその子になり、無ければ新しいトレースを始める。
+    例外で抜けた場合は区間をエラーとして記録し、例外はそのまま送出する。
+    トレースが無効な場合は何も記録しない区間を返す。
+    """
+    exporter = get_trace_exporter()
+    if exporter is None:
+        yield _NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    current = Span(
+        name,
+        parent.trace_id if parent else secrets.token_hex(16),
+        parent.span_id if parent else None,
+        attributes,
+    )
+    exporter.on_start(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except GeneratorExit:
+        current.set("cancelled", True)
+        raise
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # ジェネレーター内の区間が別のコンテキストで閉じられた場合
+            pass
+        exporter.on_end(current)
+
+
+def current_span() -> Any:
+    """実行中の区間を返す (無ければ何も記録しない区間)"""
+    return _current_span.get() or _NOOP_SPAN
+
+
+def propagate(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    呼び出し時点の区間を引き継いで func を実行する関数を返す。
+    スレッドプールに渡す処理を包み、別スレッドでの区間も同じトレースの子として記録する。
+    返した関数は1回だけ呼び出すこと。
+    """
+    context = contextvars.copy_context()
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        return context.run(func, *args, **kwargs)
+
+    return run
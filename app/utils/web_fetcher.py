@@ -0,0 +1,194 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from urllib.parse import urlparse
+
+from langchain_core.documents import Document
+from langchain_community.document_transformers import BeautifulSoupTransformer
+
+from utils.page_cache import PageFetchError, fetch_html
+from utils.tracing import propagate
+
+# ホストごとの同時接続数を全セッションで共有して制限する
+_host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_host_semaphores_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class PageFetchResult:
+    """1URL分の取得結果。text が None の場合は error に理由が入る"""
+
+    url: str
+    text: Optional[str]
+    error: Optional[str]
+    elapsed_sec: float
+    # "cache" / "revalidated" / "network" / "cached_failure"
+    source: str = "network"
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.text)
+
+
+def _host_semaphore(url: str, per_host_limit: int) -> threading.BoundedSemaphore:
+    host = urlparse(url).netloc.lower()
+    with _host_semaphores_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(per_host_limit)
+            _host_semaphores[host] = semaphore
+        return semaphore
+
+
+class _HostSlot:
+    """
+    1リクエスト分のホストの同時接続枠。
+    取得を打ち切った場合は、リクエストの終了 (タイムアウト) を待たずに呼び出し側から返却する。
+    返却は1回だけ行い、返却後は枠を取得しない。
+    """
+
+    def __init__(self, semaphore: threading.BoundedSemaphore):
+        self._semaphore = semaphore
+        self._lock = threading.Lock()
+        self._held = False
+        self._closed = False
+
+    def acquire(self, timeout: float) -> bool:
+        if not self._semaphore.acquire(timeout=timeout):
+            return False
+        with self._lock:
+            if not self._closed:
+                self._held = True
+                return True
+        # 待っている間に打ち切られた
+        self._semaphore.release()
+        return False
+
+    def release(self) -> None:
+        with self._lock:
+            held = self._held
+            self._held = False
+            self._closed = True
+        if held:
+            self._semaphore.release()
+
+
+def load_page_text(
+    url: str,
+    tags_to_extract: Sequence[str],
+    timeout_sec: float,
+    cache_timeout: bool = True,
+) -> Tuple[Optional[str], str]:
+    """
+    ページのHTMLを (キャッシュを考慮して) 取得し、指定タグのテキストを連結して返す。
+    戻り値は (テキスト, 取得元)。
+    """
+    html, source = fetch_html(url, timeout_sec, cache_timeout)
+    transformed = BeautifulSoupTransformer().transform_documents(
+        [Document(page_content=html, metadata={"source": url})],
+        tags_to_extract=list(tags_to_extract),
+    )
+    text = " ".join(doc.page_content for doc in transformed).strip()
+    return text or None, source
+
+
+def _fetch_one(
+    url: str,
+    tags_to_extract: Sequence[str],
+    deadline: float,
+    request_timeout_sec: float,
+    slot: _HostSlot,
+) -> PageFetchResult:
+    started = time.monotonic()
+    if not slot.acquire(timeout=max(0.0, deadline - started)):
+        return PageFetchResult(url, None, "HostLimitTimeout", 0.0)
+    try:
+        timeout_sec = max(1.0, min(request_timeout_sec, deadline - time.monotonic()))
+        # 全体の期限で短くしたタイムアウトの失敗は、ページが遅い証拠にならない
+        text, source = load_page_text(
+            url,
+            tags_to_extract,
+            timeout_sec,
+            cache_timeout=timeout_sec >= request_timeout_sec,
+        )
+        error = None if text else "EmptyContent"
+        return PageFetchResult(
+            url, text, error, time.monotonic() - started, source=source
+        )
+    except PageFetchError as e:
+        source = "cached_failure" if e.cached else "network"
+        return PageFetchResult(
+            url, None, e.reason, time.monotonic() - started, source=source
+        )
+    except Exception as e:
+        return PageFetchResult(url, None, type(e).__name__, time.monotonic() - started)
+    finally:
+        slot.release()
+
+
+def fetch_pages(
+    urls: List[str],
+    tags_to_extract: Sequence[str],
+    target_successes: Optional[int] = None,
+    deadline_sec: float = 12.0,
+    request_timeout_sec: float = 10.0,
+    per_host_limit: int = 2,
+    max_workers: int = 8,
+) -> Dict[str, PageFetchResult]:
+    """
+    複数URLを並行して取得する。
+    target_successes 件の取得に成功するか deadline_sec を過ぎた時点で待機を打ち切り、
+    残りのリクエストは結果を待たずに破棄する (結果に含まれないURLは未取得)。
+    破棄したリクエストが持つホストの接続枠はその時点で返却し、後続の取得を待たせない。
+    """
+    unique_urls = list(dict.fromkeys(url for url in urls if url))
+    if not unique_urls:
+        return {}
+    target = len(unique_urls) if target_successes is None else target_successes
+    deadline = time.monotonic() + deadline_sec
+
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, len(unique_urls))),
+        thread_name_prefix="web-fetch",
+    )
+    results: Dict[str, PageFetchResult] = {}
+    slots: Dict[Future, _HostSlot] = {}
+    pending: Set[Future] = set()
+    try:
+        for url in unique_urls:
+            slot = _HostSlot(_host_semaphore(url, per_host_limit))
+            future = executor.submit(
+                propagate(_fetch_one),
+                url,
+                tags_to_extract,
+                deadline,
+                request_timeout_sec,
+                slot,
+            )
+            slots[future] = slot
+            pending.add(future)
+        successes = 0
+        while pending and successes < target:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            finished, pending = wait(
+                pending, timeout=remaining, return_when=FIRST_COMPLETED
+            )
+            for future in finished:
+                result = future.result()
+                results[result.url] = result
+                if result.ok:
+                    successes += 1
+        if pending:
+            print(
+                f"    -> {len(pending)}件の取得を打ち切りました "
+                f"(成功 {successes}件, 制限 {deadline_sec:.0f}秒)"
+            )
+    finally:
+        for future in pending:
+            slots[future].release()
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
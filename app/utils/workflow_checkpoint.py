@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from config.constants import (
+    WORKFLOW_CHECKPOINT_PATH,
+    WORKFLOW_CHECKPOINT_STALE_SEC,
+    WORKFLOW_CHECKPOINT_TTL_SEC,
+)
+
+
+@dataclass(frozen=True)
+class WorkflowCheckpoint:
+    """記事生成ワークフローの途中状態"""
+
+    run_id: str
+    target: str
+    main_title: str
+    subtitles: List[str]
+    status: str  # "running" / "failed"
+    completed_steps: List[str]
+    state: Dict[str, Any]
+    error: Optional[str]
+    updated_at: float
+
+
+def workflow_run_id(
+    target: str, main_title: str, subtitles: List[str], params: Dict[str, Any]
+) -> str:
+    """
+    実行ID。対象地域・タイトル・生成条件が同じであれば同じIDになり、
+    同じタイトルで再実行すると前回の途中から再開する。
+    """
+    canonical = json.dumps(
+        [target, main_title, list(subtitles), params],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class WorkflowCheckpointStore:
+    """
+    ステップが完了するごとにワークフローの状態をSQLiteに保存する。
+    記事が完成した実行は削除し、失敗・中断した実行だけが残る。
+    """
+
+    def __init__(self, path: str = WORKFLOW_CHECKPOINT_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS workflow_runs (
+                    run_id TEXT PRIMARY KEY,
+                    target TEXT NOT NULL,
+                    main_title TEXT NOT NULL,
+                    subtitles TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    completed_steps TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    error TEXT,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS workflow_runs_by_target "
+                "ON workflow_runs (target, updated_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def save(
+        self,
+        run_id: str,
+        target: str,
+        state: Dict[str, Any],
+        completed_steps: List[str],
+        status: str = "running",
+    ) -> None:
+        # 他のステップのスレッドが書き換える可能性があるため、浅い複製を保存する
+        snapshot = dict(state)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO workflow_runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run_id,
+                    target,
+                    snapshot.get("main_title", ""),
+                    json.dumps(snapshot.get("subtitles", []), ensure_ascii=False),
+                    status,
+                    json.dumps(completed_steps, ensure_ascii=False),
+                    json.dumps(snapshot, ensure_ascii=False, default=str),
+                    snapshot.get("error"),
+                    time.time(),
+                ),
+            )
+
+    def _from_row(self, row) -> WorkflowCheckpoint:
+        (
+            run_id,
+            target,
+            main_title,
+            subtitles,
+            status,
+            completed_steps,
+            state,
+            error,
+            updated_at,
+        ) = row
+        return WorkflowCheckpoint(
+            run_id=run_id,
+            target=target,
+            main_title=main_title,
+            subtitles=json.loads(subtitles),
+            status=status,
+            completed_steps=json.loads(completed_steps),
+            state=json.loads(state),
+            error=error,
+            updated_at=updated_at,
+        )
+
+    def load(self, run_id: str) -> Optional[WorkflowCheckpoint]:
+        self.prune()
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT * FROM workflow_runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        return self._from_row(row) if row else None
+
+    def latest_unfinished(self, target: str) -> Optional[WorkflowCheckpoint]:
+        """
+        対象地域で最後に中断・失敗した実行を返す (再開ボタンの表示用)。
+        "running" の実行は、更新が WORKFLOW_CHECKPOINT_STALE_SEC 以上止まっているもののみを返す
+        (別のセッションで実行中のものは再開の対象にしない)。
+        """
+        self.prune()
+        stale_before = time.time() - WORKFLOW_CHECKPOINT_STALE_SEC
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT * FROM workflow_runs WHERE target = ? "
+                "AND (status = 'failed' OR (status = 'running' AND updated_at < ?)) "
+                "ORDER BY updated_at DESC LIMIT 1",
+                (target, stale_before),
+            ).fetchone()
+        return self._from_row(row) if row else None
+
+    def delete(self, run_id: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM workflow_runs WHERE run_id = ?", (run_id,))
+
+    def prune(self) -> None:
+        """保存期間を過ぎたチェックポイントを削除する"""
+        cutoff = time.time() - WORKFLOW_CHECKPOINT_TTL_SEC
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM workflow_runs WHERE updated_at < ?", (cutoff,))
+
+
+_workflow_checkpoint_store: Optional[WorkflowCheckpointStore] = None
+
+
+def get_workflow_checkpoint_store() -> WorkflowCheckpointStore:
+    global _workflow_checkpoint_store
+    if _workflow_checkpoint_store is None:
+        _workflow_checkpoint_store = WorkflowCheckpointStore()
+    return _workflow_checkpoint_store
@@ -0,0 +1,188 @@
+import queue
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.tracing import propagate, span
+
+
+@dataclass
+class WorkflowTask:
+    """
+    依存関係グラフ上の1ステップ
+    - message が None のタスクは進捗イベントを出さない (内部処理用)
+    - image_progress は開始イベントにそのまま付与される
+    - is_complete が True を返すタスクは、前回の実行の出力が残っているとみなして実行しない
+      (ただし依存先のタスクを実行し直した場合は、古い入力による出力とみなして実行する)
+    - invalidates_dependents が False のタスクは、実行しても後続の出力を古いとみなさない
+      (モデルの読み込みなど、途中保存した出力を作り直さない準備だけのタスク)
+    - pool はタスクを実行するスレッドプールの名前。外部APIの枠を待つ画像生成などを
+      別のプールで実行し、記事本文までの経路のスレッドを塞がないようにする
+    """
+
+    name: str
+    run: Callable[[], Any]
+    message: Optional[str] = None
+    depends_on: Tuple[str, ...] = ()
+    image_progress: Optional[Dict[str, Any]] = None
+    is_complete: Optional[Callable[[], bool]] = None
+    pool: str = "main"
+    invalidates_dependents: bool = True
+
+
+@dataclass
+class _GraphRun:
+    tasks: Dict[str, WorkflowTask]
+    done: set = field(default_factory=set)
+    started: set = field(default_factory=set)
+    # 省略せずに実行し、後続の出力を古くしたタスク
+    executed: set = field(default_factory=set)
+    running: Dict[Future, str] = field(default_factory=dict)
+
+    def ready_tasks(self) -> List[WorkflowTask]:
+        return [
+            task
+            for name, task in self.tasks.items()
+            if name not in self.started
+            and all(dependency in self.done for dependency in task.depends_on)
+        ]
+
+
+# 途中経過のキューを確認する間隔 (秒)
+_UPDATE_POLL_INTERVAL_SEC = 0.25
+
+
+def _drain_updates(
+    updates: "queue.Queue[Dict[str, Any]]", state: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """キューに溜まった途中経過を取り出す。同じステップのものは最新の1件にまとめる"""
+    latest: Dict[Any, Dict[str, Any]] = {}
+    while True:
+        try:
+            update = updates.get_nowait()
+        except queue.Empty:
+            break
+        latest[update.get("step")] = {**update, "state": state}
+    return list(latest.values())
+
+
+def _instrumented(
+    task: WorkflowTask, durations: Optional[Dict[str, float]]
+) -> Callable[[], Any]:
+    """
+    タスクをワークフローのトレースの子区間として実行する関数を返す。
+    durations を渡すと所要時間も記録する。
+    """
+
+    def run():
+        started = time.monotonic()
+        try:
+            with span(f"step.{task.name}", step=task.name):
+                return task.run()
+        finally:
+            if durations is not None:
+                durations[task.name] = time.monotonic() - started
+
+    return propagate(run)
+
+
+def run_task_graph(
+    tasks: List[WorkflowTask],
+    state: Dict[str, Any],
+    max_workers: int = 4,
+    updates: "Optional[queue.Queue[Dict[str, Any]]]" = None,
+    on_task_done: Optional[Callable[[str], None]] = None,
+    durations: Optional[Dict[str, float]] = None,
+    pool_sizes: Optional[Dict[str, int]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    依存関係の解決したタスクから順にスレッドプールで並行実行し、
+    各タスクの開始時に従来と同じ形式の進捗イベントを yield する。
+    updates を渡すと、タスクが実行中に積んだ途中経過のイベントも随時 yield する。
+    on_task_done は実行したタスクが完了するたびに (このジェネレーターのスレッドで) 呼ばれる。
+    durations を渡すと、実行したタスクの所要時間 (秒) をタスク名をキーにして記録する。
+    各タスクは呼び出し時点のトレースの子区間 ("step.<タスク名>") として記録される。
+    タスクは pool ごとに別のスレッドプールで実行する。"main" の同時実行数は max_workers、
+    それ以外のプールは pool_sizes で指定する (省略時は max_workers)。
+    タスク内で例外が発生した場合は未着手のタスクを取り消して例外を送出する。
+    """
+    graph = _GraphRun(tasks={task.name: task for task in tasks})
+    for task in tasks:
+        unknown = [d for d in task.depends_on if d not in graph.tasks]
+        if unknown:
+            raise ValueError(f"タスク {task.name} の依存先が存在しません: {unknown}")
+
+    pool_sizes = {"main": max_workers, **(pool_sizes or {})}
+    executors: Dict[str, ThreadPoolExecutor] = {}
+
+    def executor_for(pool: str) -> ThreadPoolExecutor:
+        executor = executors.get(pool)
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=max(1, pool_sizes.get(pool, max_workers)),
+                thread_name_prefix=f"article-workflow-{pool}",
+            )
+            executors[pool] = executor
+        return executor
+
+    try:
+        while len(graph.done) < len(graph.tasks):
+            any_skipped = False
+            for task in graph.ready_tasks():
+                graph.started.add(task.name)
+                skipped = (
+                    task.is_complete is not None
+                    and not any(d in graph.executed for d in task.depends_on)
+                    and task.is_complete()
+                )
+                if skipped:
+                    graph.done.add(task.name)
+                    any_skipped = True
+                    with span(f"step.{task.name}", step=task.name, skipped=True):
+                        pass
+                else:
+                    if task.invalidates_dependents:
+                        graph.executed.add(task.name)
+                    run = _instrumented(task, durations)
+                    future = executor_for(task.pool).submit(run)
+                    graph.running[future] = task.name
+                if task.message is not None:
+                    event = {
+                        "step": task.name,
+                        "message": task.message,
+                        "state": state,
+                    }
+                    if skipped:
+                        event["message"] = f"{task.message} (前回の結果を再利用)"
+                        event["skipped"] = True
+                    if task.image_progress is not None:
+                        event["image_progress"] = task.image_progress
+                    yield event
+
+            if any_skipped:
+                # 省略したタスクの後続が実行可能になったか確認し直す
+                continue
+            if not graph.running:
+                raise RuntimeError(
+                    "依存関係が循環しているため実行できないタスクがあります"
+                )
+
+            if updates is None:
+                finished, _ = wait(graph.running, return_when=FIRST_COMPLETED)
+            else:
+                finished, _ = wait(
+                    graph.running,
+                    timeout=_UPDATE_POLL_INTERVAL_SEC,
+                    return_when=FIRST_COMPLETED,
+                )
+                yield from _drain_updates(updates, state)
+            for future in finished:
+                name = graph.running.pop(future)
+                future.result()
+                graph.done.add(name)
+                if on_task_done is not None:
+                    on_task_done(name)
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
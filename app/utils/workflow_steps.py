@@ -1,20 +1,31 @@
-from typing import Dict, Any, List
-from langchain_google_vertexai import ChatVertexAI
-from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
+import threading
+from typing import Dict, Any, Callable, List, Optional
+from langchain_core.output_parsers import (
+    JsonOutputParser,
+    PydanticOutputParser,
+    StrOutputParser,
+)
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_community.search import GoogleSearchAPIWrapper
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.document_transformers import BeautifulSoupTransformer
 
+from config.constants import ARTICLE_GENERATION_MODE
 from config.env_config import get_env_config
 from prompts.GENERATE_ARTICLE_PROMPT_TEXT import GENERATE_ARTICLE_PROMPT_TEXT
 from prompts.APHORISM_PROMPT_TEXT import APHORISM_PROMPT_TEXT
 from utils.generate_four_images import generate_four_images
 from utils.generate_titles_images import generate_prefecture_image_and_get_path
 from .html_formatter import build_html_article
+from .model_clients import get_chat_model
+from .search_cache import search_with_cache
+from .search_corpus import select_passages
+from .tracing import current_span
+from .web_fetcher import fetch_pages
 
 from pydantic import BaseModel, Field
 
+# 参考情報を取得できなかった場合に scraped_context に入れる文言
+NO_SEARCH_RESULTS_CONTEXT = "関連情報が見つかりませんでした。"
+NO_PAGE_CONTEXT = "ウェブ情報取得不可"
+
 
 class Article(BaseModel):
     title: str = Field(description="記事のタイトル (メインタイトル)")
@@ -38,70 +49,158 @@ def perform_google_search(state: Dict[str, Any]) -> Dict[str, Any]:
         if not google_api_key or not google_cse_id:
             raise ValueError("Google APIキーまたはCSE IDが設定されていません。")
 
-        search_wrapper = GoogleSearchAPIWrapper(
-            google_api_key=google_api_key, google_cse_id=google_cse_id
+        results, source = search_with_cache(
+            state["search_query"], google_api_key, google_cse_id, 5
         )
-        results = search_wrapper.results(query=state["search_query"], num_results=5)
         state["raw_search_results"] = results
+        state["search_source"] = source
     except Exception as e:
         state["error"] = f"Google検索エラー: {e}"
 
     return state
 
 
+def has_context(state: Dict[str, Any]) -> bool:
+    """参考情報を取得できているか (取得できなかった場合の文言は含めない)"""
+    context = state.get("scraped_context")
+    return bool(context) and context not in (NO_SEARCH_RESULTS_CONTEXT, NO_PAGE_CONTEXT)
+
+
 def scrape_and_prepare_context(state: Dict[str, Any]) -> Dict[str, Any]:
     """ウェブページをスクレイピングしてコンテキストを準備"""
     results = state.get("raw_search_results", [])
     if not results:
-        state["scraped_context"] = "関連情報が見つかりませんでした。"
+        state["scraped_context"] = NO_SEARCH_RESULTS_CONTEXT
         return state
 
+    settings = get_env_config()
+    # 全URLを並行取得し、必要件数の成功か制限時間到達で打ち切る
+    fetched = fetch_pages(
+        [res.get("link") for res in results],
+        tags_to_extract=["p", "h2", "h3"],
+        target_successes=settings.get("scrape_target_pages"),
+        deadline_sec=settings.get("scrape_deadline_sec", 12.0),
+        per_host_limit=settings.get("scrape_per_host_limit", 2),
+    )
+
     contents = []
     for res in results:
-        try:
-            docs = WebBaseLoader(
-                web_path=res["link"], requests_kwargs={"timeout": 10}
-            ).load()
-            transformed = BeautifulSoupTransformer().transform_documents(
-                docs, tags_to_extract=["p", "h2", "h3"]
-            )
-            content = " ".join([d.page_content for d in transformed]).strip()
-            if content:
-                contents.append(f"参照元: {res['link']}\n内容: {content[:1500]}")
-        except Exception:
-            continue
+        page = fetched.get(res.get("link"))
+        if page and page.ok:
+            contents.append(f"参照元: {res['link']}\n内容: {page.text[:1500]}")
 
-    state["scraped_context"] = "\n\n---\n\n".join(contents) or "ウェブ情報取得不可"
+    state["scraped_context"] = "\n\n---\n\n".join(contents) or NO_PAGE_CONTEXT
     return state
 
 
-def generate_article_content(state: Dict[str, Any]) -> Dict[str, Any]:
-    """記事本文を生成"""
+# コーパスから参考情報を選んだ回数と、そのうち改めて検索した回数 (ログ表示用)
+_corpus_selection_counts = {"selected": 0, "fallback": 0}
+_corpus_selection_lock = threading.Lock()
+
+
+def select_context_from_corpus(
+    state: Dict[str, Any], corpus: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    タイトル生成時に取得したページ (コーパス) から、タイトル・サブタイトルに関連する段落を選んで
+    参考情報とする。網羅できないサブタイトルが多い場合のみ、従来通り検索とスクレイピングを行う。
+    """
+    selection = select_passages(corpus, state["main_title"], state.get("subtitles", []))
+    fallback = not selection.sufficient
+    with _corpus_selection_lock:
+        _corpus_selection_counts["selected"] += 1
+        _corpus_selection_counts["fallback"] += int(fallback)
+        fallback_count = _corpus_selection_counts["fallback"]
+        selected_count = _corpus_selection_counts["selected"]
+    trace_span = current_span()
+    trace_span.set("corpus_documents", len(corpus))
+    trace_span.set("passages", len(selection.passages))
+    trace_span.set("coverage", round(selection.coverage, 2))
+    trace_span.set("fallback_search", fallback)
+    print(
+        f"    -> コーパスから {len(selection.passages)} 段落を選択 "
+        f"(網羅率 {selection.coverage:.0%}, {selection.context_chars}文字, "
+        f"追加検索 {fallback_count}/{selected_count}回)"
+    )
+    if not fallback:
+        state["scraped_context"] = selection.to_context()
+        state["context_source"] = "title_corpus"
+        return state
+
+    print(f"    -> 関連情報が不足するため改めて検索します: {selection.uncovered}")
+    previous_error = state.get("error")
+    generate_search_query(state)
+    perform_google_search(state)
+    if state.get("error") != previous_error and selection.passages:
+        # 検索に失敗しても、コーパスから選んだ段落があればそれを使って続ける
+        print(f"    -> {state['error']} のため、コーパスの段落のみを使います")
+        state["error"] = previous_error
+        state["scraped_context"] = selection.to_context()
+        state["context_source"] = "title_corpus"
+        return state
+
+    scrape_and_prepare_context(state)
+    if selection.passages:
+        state["scraped_context"] = (
+            f"{selection.to_context()}\n\n---\n\n{state['scraped_context']}"
+        )
+    state["context_source"] = "title_corpus+search"
+    return state
+
+
+def _stream_article(
+    prompt: ChatPromptTemplate,
+    llm,
+    inputs: Dict[str, Any],
+    on_partial: Callable[[Dict[str, Any]], None],
+) -> Article:
+    """
+    記事のJSONを生成しながら逐次解析し、途中経過を on_partial に渡す。
+    途中経過は title と、生成済み (最後の要素は生成途中) の block のみを含む。
+    """
+    latest: Dict[str, Any] = {}
+    for partial in (prompt | llm | JsonOutputParser()).stream(inputs):
+        if not isinstance(partial, dict):
+            continue
+        latest = partial
+        on_partial(
+            {
+                "title": partial.get("title") or "",
+                "block": [b for b in partial.get("block") or [] if isinstance(b, str)],
+            }
+        )
+    return Article.model_validate(latest)
+
+
+def generate_article_content(
+    state: Dict[str, Any],
+    on_partial: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    記事本文を生成
+    on_partial を渡すと ARTICLE_GENERATION_MODE が "stream" の場合に生成途中の記事を逐次通知する
+    """
     try:
         settings = get_env_config()
-        llm = ChatVertexAI(
+        llm = get_chat_model(
             model_name=settings.get("model_name", "gemini-1.5-pro-001"),
-            project=settings.get("gcp_project_id"),
-            location=settings.get("gcp_location"),
             temperature=settings.get("temperature", 0.7),
             max_output_tokens=settings.get("max_output_tokens", 8192),
         )
 
         output_parser = PydanticOutputParser(pydantic_object=Article)
-        chain = (
-            ChatPromptTemplate.from_template(GENERATE_ARTICLE_PROMPT_TEXT)
-            | llm
-            | output_parser
-        )
-
-        article = chain.invoke(
-            {
-                "format_instructions": output_parser.get_format_instructions(),
-                "search_results": state["scraped_context"],
-                "main_title": state["main_title"],
-                "subtitles": "\n- ".join(state["subtitles"]),
-            }
-        )
+        prompt = ChatPromptTemplate.from_template(GENERATE_ARTICLE_PROMPT_TEXT)
+        inputs = {
+            "format_instructions": output_parser.get_format_instructions(),
+            "search_results": state["scraped_context"],
+            "main_title": state["main_title"],
+            "subtitles": "\n- ".join(state["subtitles"]),
+        }
+
+        if on_partial is not None and ARTICLE_GENERATION_MODE == "stream":
+            article = _stream_article(prompt, llm, inputs, on_partial)
+        else:
+            article = (prompt | llm | output_parser).invoke(inputs)
 
         state["generated_article_json"] = article.model_dump()
         state["initial_article_title"] = article.title
@@ -116,10 +215,8 @@ def generate_aphorism(state: Dict[str, Any]) -> Dict[str, Any]:
     """名言を生成"""
     try:
         settings = get_env_config()
-        llm = ChatVertexAI(
+        llm = get_chat_model(
             model_name=settings.get("model_name", "gemini-1.5-pro-001"),
-            project=settings.get("gcp_project_id"),
-            location=settings.get("gcp_location"),
             temperature=0.8,
         )
 
@@ -175,9 +272,7 @@ def generate_subtitle_images(
             gcp_project_id=gcp_project_id,
             gcp_location=gcp_location,
             llm_model_name=settings.get("model_name", "gemini-1.5-pro-001"),
-            image_gen_model_name=settings.get(
-                "image_gen_model_name", "imagen-3.0-fast-generate-001"
-            ),
+            image_gen_model_name=settings.get("image_model_name"),
         )
         state["subtitle_image_paths"] = image_paths
 
@@ -0,0 +1,96 @@
+import pytest
+
+agent_generate_article = pytest.importorskip("utils.agent_generate_article")
+
+from utils.workflow_checkpoint import WorkflowCheckpointStore, workflow_run_id
+
+SETTINGS = {"model_name": "gemini", "image_model_name": "imagen"}
+MAIN_TITLE = "京都府、千年の時を映す古都の思索"
+SUBTITLES = ["祇園祭と共同体の記憶", "鴨川の流れに映る時間"]
+
+
+@pytest.fixture
+def steps(tmp_path, monkeypatch):
+    """外部呼び出しを行うステップを、呼ばれたことを記録するだけの処理に置き換える"""
+    called = []
+    store = WorkflowCheckpointStore(str(tmp_path / "workflow_runs.sqlite3"))
+    module = agent_generate_article
+
+    def step(name, **updates):
+        def run(state, *args, **kwargs):
+            called.append(name)
+            state.update(updates)
+            return state
+
+        return run
+
+    monkeypatch.setattr(module, "get_env_config", lambda: SETTINGS)
+    monkeypatch.setattr(module, "get_workflow_checkpoint_store", lambda: store)
+    monkeypatch.setattr(module, "generate_search_query", step("search_query"))
+    monkeypatch.setattr(module, "perform_google_search", step("google_search"))
+    monkeypatch.setattr(module, "scrape_and_prepare_context", step("scrape_context"))
+    monkeypatch.setattr(
+        module,
+        "select_context_from_corpus",
+        step("corpus_context", scraped_context="参照元: x\n内容: y"),
+    )
+    monkeypatch.setattr(
+        module,
+        "generate_article_content",
+        step("generate_article", generated_article_json={"block": ["本文"]}),
+    )
+    monkeypatch.setattr(module, "generate_aphorism", step("aphorism", aphorism="言葉"))
+    monkeypatch.setattr(module, "format_html", step("format_html", html_output="<p>"))
+    monkeypatch.setattr(module, "save_article_from_state", lambda *args: None)
+    return called, store
+
+
+def _run_workflow(corpus=None):
+    return list(
+        agent_generate_article.generate_article_workflow(
+            MAIN_TITLE,
+            SUBTITLES,
+            "京都府",
+            attempt_prefecture_image=False,
+            corpus=corpus,
+        )
+    )
+
+
+def test_resuming_a_corpus_run_reuses_its_context_and_article(steps):
+    called, store = steps
+    run_id = workflow_run_id(
+        "京都府",
+        MAIN_TITLE,
+        SUBTITLES,
+        agent_generate_article.article_generation_params(False),
+    )
+    # コーパスから参考情報を作り、本文まで生成した後に失敗した実行
+    state = {
+        "main_title": MAIN_TITLE,
+        "subtitles": SUBTITLES,
+        "search_query": "",
+        "raw_search_results": [],
+        "scraped_context": "参照元: x\n内容: y",
+        "context_source": "title_corpus",
+        "generated_article_json": {"block": ["本文"]},
+        "aphorism": "",
+        "error": "名言生成エラー",
+    }
+    store.save(
+        run_id, "京都府", state, ["corpus_context", "generate_article"], "failed"
+    )
+
+    events = _run_workflow(corpus=None)
+
+    # 検索と本文生成はやり直さず、失敗したステップと仕上げのみ実行する
+    assert called == ["aphorism", "format_html"]
+    assert events[0]["step"] == "corpus_context" and events[0]["skipped"]
+
+
+def test_new_run_with_corpus_selects_context_from_it(steps):
+    called, _ = steps
+    _run_workflow(corpus=[{"url": "u", "title": "t", "snippet": "", "text": "本文"}])
+
+    assert "corpus_context" in called
+    assert "google_search" not in called
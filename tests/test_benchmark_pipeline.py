@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+benchmark_pipeline = pytest.importorskip("benchmark_pipeline")
+
+
+def test_percentile_interpolates_between_values():
+    values = [4.0, 1.0, 3.0, 2.0]
+    assert benchmark_pipeline.percentile(values, 0) == 1.0
+    assert benchmark_pipeline.percentile(values, 50) == 2.5
+    assert benchmark_pipeline.percentile(values, 100) == 4.0
+    assert benchmark_pipeline.percentile(values, 95) == pytest.approx(3.85)
+
+
+def test_percentile_of_single_and_empty_values():
+    assert benchmark_pipeline.percentile([7.0], 99) == 7.0
+    assert benchmark_pipeline.percentile([], 50) is None
+
+
+def test_summarize_reports_percentiles():
+    summary = benchmark_pipeline.summarize([1.0, 2.0, 3.0])
+    assert summary["count"] == 3
+    assert summary["mean"] == 2.0
+    assert summary["p50"] == 2.0
+    assert summary["max"] == 3.0
+
+
+def test_configure_redirects_storage_and_restores_environment(monkeypatch, tmp_path):
+    monkeypatch.delitem(sys.modules, "config.constants", raising=False)
+    monkeypatch.delenv("WEB_CACHE_PATH", raising=False)
+    monkeypatch.setenv("TRACE_EXPORTER", "jsonl")
+
+    previous = benchmark_pipeline.configure(str(tmp_path))
+    assert os.environ["WEB_CACHE_PATH"] == str(tmp_path / "web_cache.sqlite3")
+    assert os.environ["ARTICLE_STORE_DIR"] == str(tmp_path / "articles")
+    # 明示的に指定された値は上書きしない
+    assert os.environ["TRACE_EXPORTER"] == "jsonl"
+
+    benchmark_pipeline.restore_environment(previous)
+    assert "WEB_CACHE_PATH" not in os.environ
+    assert os.environ["TRACE_EXPORTER"] == "jsonl"
+
+
+def test_configure_refuses_after_constants_are_loaded(monkeypatch, tmp_path):
+    monkeypatch.setitem(sys.modules, "config.constants", object())
+    with pytest.raises(RuntimeError):
+        benchmark_pipeline.configure(str(tmp_path))
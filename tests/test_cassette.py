@@ -0,0 +1,61 @@
+import pytest
+
+from utils.cassette import Cassette, CassetteMiss, RecordedCallError
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cassette.sqlite3")
+
+
+def _cassette(path, mode):
+    return Cassette(path, mode, latency_scale=0)
+
+
+def test_replays_recorded_calls_in_order(path):
+    recorder = _cassette(path, "record")
+    assert recorder.call("search", {"q": "京都"}, lambda: ["1回目"]) == ["1回目"]
+    assert recorder.call("search", {"q": "京都"}, lambda: ["2回目"]) == ["2回目"]
+
+    player = _cassette(path, "replay")
+    assert player.call("search", {"q": "京都"}, lambda: pytest.fail()) == ["1回目"]
+    assert player.call("search", {"q": "京都"}, lambda: pytest.fail()) == ["2回目"]
+    # 記録を使い切ったら最後の応答を返す
+    assert player.call("search", {"q": "京都"}, lambda: pytest.fail()) == ["2回目"]
+    with pytest.raises(CassetteMiss):
+        player.call("search", {"q": "大阪"}, lambda: pytest.fail())
+
+
+def test_replays_failed_calls_as_errors(path):
+    def fail():
+        raise TimeoutError("too slow")
+
+    with pytest.raises(TimeoutError):
+        _cassette(path, "record").call("web_page", {"url": "u"}, fail)
+
+    with pytest.raises(RecordedCallError, match="TimeoutError: too slow"):
+        _cassette(path, "replay").call("web_page", {"url": "u"}, fail)
+
+
+def test_stream_closed_early_records_received_chunks(path):
+    stream = _cassette(path, "record").stream("chat", {"m": 1}, lambda: iter("abcd"))
+    assert next(stream) == "a"
+    assert next(stream) == "b"
+    stream.close()
+
+    replayed = _cassette(path, "replay").stream("chat", {"m": 1}, lambda: iter(()))
+    assert list(replayed) == ["a", "b"]
+
+
+def test_stream_error_is_replayed_after_chunks(path):
+    def chunks():
+        yield "a"
+        raise ConnectionError("reset")
+
+    with pytest.raises(ConnectionError):
+        list(_cassette(path, "record").stream("chat", {"m": 2}, chunks))
+
+    replayed = _cassette(path, "replay").stream("chat", {"m": 2}, chunks)
+    assert next(replayed) == "a"
+    with pytest.raises(RecordedCallError):
+        next(replayed)
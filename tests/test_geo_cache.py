@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+pytest.importorskip("geopandas")
+
+from utils import geo_cache
+from utils.geo_cache import ensure_local_file
+
+
+def test_existing_file_is_used_without_download(tmp_path, monkeypatch):
+    path = tmp_path / "japan.geojson"
+    path.write_text("{}")
+    monkeypatch.setattr(geo_cache.urllib.request, "urlopen", pytest.fail)
+
+    assert ensure_local_file(str(path), "https://example.test/japan.geojson") == str(
+        path
+    )
+
+
+def test_failed_download_leaves_no_temporary_file(tmp_path, monkeypatch):
+    def urlopen(url, timeout):
+        raise OSError("network unreachable")
+
+    monkeypatch.setattr(geo_cache.urllib.request, "urlopen", urlopen)
+    path = tmp_path / "data" / "japan.geojson"
+
+    assert ensure_local_file(str(path), "https://example.test/japan.geojson") is None
+    assert os.listdir(tmp_path / "data") == []
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "app")
+# 記事生成ワークフローの読み込みにかけてよい時間 (秒)。
+# モデルの初期化・認証・通信を読み込み時に行うと大きく超える。
+IMPORT_TIME_BUDGET_SEC = float(os.getenv("IMPORT_TIME_BUDGET_SEC", "3.0"))
+
+
+def _cumulative_import_sec(stderr: str, module: str) -> float:
+    # 書式: "import time: self [us] | cumulative | imported package"
+    for line in stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1_000_000
+    raise AssertionError(f"{module} の読み込み時間が出力にありません")
+
+
+@pytest.mark.parametrize(
+    "module", ["utils.agent_generate_article", "utils.generate_four_images"]
+)
+def test_workflow_import_stays_within_budget(module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    if result.returncode != 0 and "ModuleNotFoundError" in result.stderr:
+        pytest.skip("依存パッケージがインストールされていません")
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    elapsed = _cumulative_import_sec(result.stderr, module)
+    assert elapsed < IMPORT_TIME_BUDGET_SEC, (
+        f"{module} の読み込みに {elapsed:.2f}秒 "
+        f"(上限 {IMPORT_TIME_BUDGET_SEC:.1f}秒) かかりました"
+    )
@@ -0,0 +1,88 @@
+import pytest
+
+requests = pytest.importorskip("requests")
+
+from utils import page_cache
+from utils.page_cache import PageCache, PageFetchError, fetch_html
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, content_type="text/html", body="<p>本文</p>"):
+        self.status_code = status_code
+        self.headers = {"Content-Type": content_type}
+        self.encoding = "utf-8"
+        self.apparent_encoding = "utf-8"
+        self.closed = False
+        self.body_read = False
+        self._body = body
+
+    @property
+    def text(self):
+        self.body_read = True
+        return self._body
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    store = PageCache(str(tmp_path / "web_cache.db"))
+    monkeypatch.setattr(page_cache, "get_page_cache", lambda: store)
+    monkeypatch.setattr(page_cache, "get_cassette", lambda: None)
+    return store
+
+
+def _timeout(*args, **kwargs):
+    raise requests.Timeout()
+
+
+def test_fresh_page_is_served_before_failure_records(cache, monkeypatch):
+    url = "https://example.test/a"
+    cache.put_page(url, "<p>キャッシュ</p>", None, None)
+    cache.put_failure(url, "HTTP500", 600)
+    monkeypatch.setattr(page_cache.requests, "get", _timeout)
+
+    assert fetch_html(url, 5) == ("<p>キャッシュ</p>", "cache")
+
+
+def test_timeout_is_cached_per_url_only_with_full_timeout(cache, monkeypatch):
+    monkeypatch.setattr(page_cache.requests, "get", _timeout)
+    url = "https://example.test/slow"
+
+    with pytest.raises(PageFetchError):
+        fetch_html(url, 1, cache_timeout=False)
+    assert cache.get_failure(url) is None
+
+    with pytest.raises(PageFetchError):
+        fetch_html(url, 10)
+    assert cache.get_failure(url) == "Timeout"
+    # 同じドメインの別ページは取得を試みる
+    assert cache.get_failure("https://example.test/other") is None
+
+
+def test_non_html_body_is_not_read(cache, monkeypatch):
+    response = FakeResponse(content_type="application/pdf")
+    calls = []
+
+    def get(url, headers, timeout, stream):
+        calls.append(stream)
+        return response
+
+    monkeypatch.setattr(page_cache.requests, "get", get)
+
+    with pytest.raises(PageFetchError, match="NotHTML"):
+        fetch_html("https://example.test/file.pdf", 10)
+    assert calls == [True]
+    assert not response.body_read
+    assert response.closed
+
+
+def test_html_is_stored_after_network_fetch(cache, monkeypatch):
+    monkeypatch.setattr(
+        page_cache.requests, "get", lambda *args, **kwargs: FakeResponse()
+    )
+    url = "https://example.test/page"
+
+    assert fetch_html(url, 10) == ("<p>本文</p>", "network")
+    assert cache.get_page(url).html == "<p>本文</p>"
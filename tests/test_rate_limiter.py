@@ -0,0 +1,91 @@
+import pytest
+
+from utils import rate_limiter
+from utils.rate_limiter import AdaptiveLimiter, is_retryable_error, is_throttle_error
+
+
+class ResourceExhausted(Exception):
+    """google.api_core.exceptions.ResourceExhausted と同じ名前の例外"""
+
+
+class HTTPError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda seconds: None)
+
+
+def _complete(limiter, latency_sec, latency_kind="default"):
+    limiter._acquire()
+    limiter._release(latency_sec, False, latency_kind)
+
+
+def test_throttle_is_detected_by_type_and_status_code():
+    assert is_throttle_error(ResourceExhausted("quota"))
+    assert is_throttle_error(HTTPError("too many", 429))
+    assert not is_throttle_error(HTTPError("not found", 404))
+    # メッセージに 429 を含むだけの例外は 429 とみなさない
+    assert not is_throttle_error(ValueError("invalid value 429"))
+    assert is_retryable_error(HTTPError("unavailable", 503))
+
+
+def test_call_retries_throttled_calls_and_halves_the_limit():
+    limiter = AdaptiveLimiter("test", max_limit=8)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise HTTPError("too many", 429)
+        return "ok"
+
+    assert limiter.call(flaky, max_retries=3) == "ok"
+    assert len(attempts) == 2
+    assert limiter.limit == 4
+    assert limiter.stats().throttled == 1
+    assert limiter.stats().in_flight == 0
+
+
+def test_non_retryable_error_is_raised_without_retry():
+    limiter = AdaptiveLimiter("test", max_limit=2)
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        limiter.call(broken, max_retries=3)
+    assert len(attempts) == 1
+    assert limiter.limit == 2
+
+
+def test_latency_spike_is_judged_per_kind():
+    limiter = AdaptiveLimiter("test", max_limit=8)
+    for _ in range(AdaptiveLimiter.LATENCY_WARMUP_SAMPLES):
+        _complete(limiter, 1.0, "short")
+
+    # 長い生成は別の種類として平均をとるため、短い呼び出しと比べて下げない
+    _complete(limiter, 30.0, "long")
+    assert limiter.limit == 8
+
+    # 同じ種類で平均の LATENCY_SPIKE_RATIO 倍を超えたら下げる
+    _complete(limiter, 10.0, "short")
+    assert limiter.limit == 4
+
+
+def test_stream_releases_the_slot_when_closed_early():
+    limiter = AdaptiveLimiter("test", max_limit=1)
+
+    def chunks():
+        yield from range(5)
+
+    stream = limiter.stream(chunks)
+    assert next(stream) == 0
+    assert limiter.stats().in_flight == 1
+    stream.close()
+    assert limiter.stats().in_flight == 0
@@ -0,0 +1,86 @@
+from utils.search_corpus import corpus_document, select_passages, split_passages
+
+# タイトル生成で取得するページを模した京都府のコーパス
+KYOTO_PAGES = {
+    "清水寺": (
+        "清水寺は京都市東山区にある寺院で、清水の舞台で知られる。"
+        "本堂は懸造りと呼ばれる構造で、江戸時代に再建された。"
+        "春の桜と秋の紅葉の季節には多くの参拝者が訪れる。"
+    ),
+    "祇園祭": (
+        "祇園祭は八坂神社の祭礼で、千年以上の歴史を持つ。"
+        "疫病退散を願って始まり、町衆が山鉾を守り伝えてきた。"
+        "祭りは地域の結びつきを支え、世代を超えて受け継がれている。"
+    ),
+    "嵐山の竹林": (
+        "嵐山の竹林の小径は、高い竹に囲まれた散策路である。"
+        "風が吹くと竹の葉が擦れ合う音が響き、静かな時間が流れる。"
+    ),
+    "鴨川": (
+        "鴨川は京都市内を南北に流れる川で、川沿いには等間隔に座る人々の姿が見られる。"
+        "夏には川床が設けられ、納涼の場として親しまれている。"
+    ),
+}
+KYOTO_SUBTITLES = [
+    "祇園祭と共同体の記憶",
+    "鴨川の流れに映る時間",
+    "清水の舞台から見る無常",
+    "竹林に響く静寂の哲学",
+    "古都が問いかける生の意味",
+]
+
+
+def _corpus(pages, repeat=1):
+    return [
+        corpus_document(
+            {"link": f"https://example.test/{i}", "title": title, "snippet": ""},
+            text * repeat,
+        )
+        for i, (title, text) in enumerate(pages.items())
+    ]
+
+
+def test_split_passages_keeps_sentences_within_the_limit():
+    text = "一文目です。二文目です。" + "長" * 25
+    passages = split_passages(text, max_chars=12)
+
+    assert passages[0] == "一文目です。二文目です。"
+    assert all(len(passage) <= 12 for passage in passages)
+    assert "".join(passages) == text
+
+
+def test_philosophical_subtitles_are_covered_by_their_concrete_terms():
+    selection = select_passages(
+        _corpus(KYOTO_PAGES), "京都府、千年の時を映す古都の思索", KYOTO_SUBTITLES
+    )
+
+    # コーパスに無い抽象的な言い回しがあっても、具体的な語で関連する段落を見つける
+    assert selection.coverage == 0.8
+    assert selection.uncovered == ["古都が問いかける生の意味"]
+    assert {passage.title for passage in selection.passages} == set(KYOTO_PAGES)
+
+
+def test_selection_is_sufficient_only_with_enough_context():
+    args = ("京都府、千年の時を映す古都の思索", KYOTO_SUBTITLES)
+
+    assert not select_passages(_corpus(KYOTO_PAGES), *args).sufficient
+    assert select_passages(_corpus(KYOTO_PAGES, repeat=8), *args).sufficient
+
+
+def test_unrelated_subtitles_are_not_covered():
+    selection = select_passages(
+        _corpus(KYOTO_PAGES),
+        "大阪府の食文化",
+        ["たこ焼きと粉もの文化", "道頓堀の夜景"],
+    )
+
+    assert selection.coverage == 0.0
+    assert not selection.sufficient
+
+
+def test_empty_corpus_and_context_format():
+    assert select_passages([], "京都府", ["鴨川"]).uncovered == ["鴨川"]
+
+    selection = select_passages(_corpus({"鴨川": KYOTO_PAGES["鴨川"]}), "鴨川", [])
+    context = selection.to_context()
+    assert context.startswith("参照元: https://example.test/0\n内容: 鴨川は")
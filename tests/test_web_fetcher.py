@@ -0,0 +1,43 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain_community")
+pytest.importorskip("requests")
+
+from utils import web_fetcher
+from utils.web_fetcher import _HostSlot, fetch_pages
+
+
+def test_slot_release_is_idempotent():
+    semaphore = threading.BoundedSemaphore(1)
+    slot = _HostSlot(semaphore)
+    assert slot.acquire(timeout=0)
+    slot.release()
+    slot.release()
+    # 返却済みの枠は再取得しない
+    assert not slot.acquire(timeout=0)
+    assert semaphore.acquire(timeout=0)
+
+
+def test_abandoned_requests_release_host_slots(monkeypatch):
+    blocked = threading.Event()
+
+    def slow_load(url, tags_to_extract, timeout_sec, cache_timeout=True):
+        blocked.wait(timeout=5)
+        return "本文", "network"
+
+    monkeypatch.setattr(web_fetcher, "load_page_text", slow_load)
+    try:
+        url = "https://slow.example.test/page"
+        results = fetch_pages([url], ["p"], deadline_sec=0.2, per_host_limit=1)
+        assert results == {}
+
+        # 打ち切った取得が終わる前でも、同じホストの枠は空いている
+        semaphore = web_fetcher._host_semaphore(url, 1)
+        assert semaphore.acquire(timeout=0)
+        semaphore.release()
+    finally:
+        blocked.set()
+        time.sleep(0.05)
@@ -0,0 +1,47 @@
+import time
+from contextlib import closing
+
+import pytest
+
+from utils import workflow_checkpoint
+from utils.workflow_checkpoint import WorkflowCheckpointStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return WorkflowCheckpointStore(str(tmp_path / "workflow_runs.sqlite3"))
+
+
+def _save(store, run_id, status, age_sec=0.0, target="京都府"):
+    state = {"main_title": run_id, "subtitles": ["a"], "error": None}
+    store.save(run_id, target, state, ["search_query"], status)
+    with closing(store._connect()) as conn, conn:
+        conn.execute(
+            "UPDATE workflow_runs SET updated_at = ? WHERE run_id = ?",
+            (time.time() - age_sec, run_id),
+        )
+
+
+def test_latest_unfinished_skips_runs_in_progress(store):
+    _save(store, "failed", "failed", age_sec=60)
+    _save(store, "running", "running", age_sec=1)
+
+    assert store.latest_unfinished("京都府").run_id == "failed"
+
+
+def test_latest_unfinished_returns_stale_running_runs(store):
+    stale_sec = workflow_checkpoint.WORKFLOW_CHECKPOINT_STALE_SEC + 60
+    _save(store, "failed", "failed", age_sec=stale_sec + 60)
+    _save(store, "interrupted", "running", age_sec=stale_sec)
+
+    assert store.latest_unfinished("京都府").run_id == "interrupted"
+    assert store.latest_unfinished("大阪府") is None
+
+
+def test_completed_steps_round_trip(store):
+    _save(store, "run", "failed")
+    checkpoint = store.load("run")
+
+    assert checkpoint.completed_steps == ["search_query"]
+    assert checkpoint.subtitles == ["a"]
+    assert checkpoint.status == "failed"
@@ -0,0 +1,156 @@
+import threading
+
+import pytest
+
+from utils.workflow_graph import WorkflowTask, run_task_graph
+
+
+def _run(tasks, **kwargs):
+    return list(run_task_graph(tasks, {}, **kwargs))
+
+
+def test_runs_tasks_after_their_dependencies():
+    order = []
+    lock = threading.Lock()
+
+    def record(name):
+        with lock:
+            order.append(name)
+
+    tasks = [
+        WorkflowTask("a", lambda: record("a"), message="a"),
+        WorkflowTask("b", lambda: record("b"), message="b", depends_on=("a",)),
+        WorkflowTask("c", lambda: record("c"), message="c", depends_on=("a",)),
+        WorkflowTask("d", lambda: record("d"), depends_on=("b", "c")),
+    ]
+    events = _run(tasks)
+
+    assert order[0] == "a" and order[-1] == "d"
+    assert sorted(order) == ["a", "b", "c", "d"]
+    # message の無いタスクはイベントを出さない
+    assert [event["step"] for event in events] == ["a", "b", "c"] or [
+        event["step"] for event in events
+    ] == ["a", "c", "b"]
+
+
+def test_skips_completed_tasks_and_marks_the_event():
+    ran = []
+    tasks = [
+        WorkflowTask(
+            "a", lambda: ran.append("a"), message="a", is_complete=lambda: True
+        ),
+        WorkflowTask("b", lambda: ran.append("b"), message="b", depends_on=("a",)),
+    ]
+    events = _run(tasks)
+
+    assert ran == ["b"]
+    assert events[0]["skipped"] is True
+    assert "skipped" not in events[1]
+
+
+def test_records_durations_and_calls_on_task_done():
+    durations = {}
+    done = []
+    tasks = [WorkflowTask("a", lambda: None), WorkflowTask("b", lambda: None)]
+    _run(tasks, durations=durations, on_task_done=done.append)
+
+    assert set(durations) == {"a", "b"}
+    assert sorted(done) == ["a", "b"]
+
+
+def test_task_error_is_raised():
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="boom"):
+        _run([WorkflowTask("a", fail)])
+
+
+def test_rejects_unknown_dependencies_and_cycles():
+    with pytest.raises(ValueError):
+        _run([WorkflowTask("a", lambda: None, depends_on=("missing",))])
+    with pytest.raises(RuntimeError):
+        _run(
+            [
+                WorkflowTask("a", lambda: None, depends_on=("b",)),
+                WorkflowTask("b", lambda: None, depends_on=("a",)),
+            ]
+        )
+
+
+def test_tasks_in_another_pool_do_not_hold_main_threads():
+    release = threading.Event()
+    main_finished = threading.Event()
+
+    def blocked_image():
+        # 外部APIの枠を待っている画像生成の代わり
+        assert release.wait(timeout=5)
+
+    def main_task():
+        main_finished.set()
+        release.set()
+
+    tasks = [
+        WorkflowTask("image", blocked_image, pool="images"),
+        WorkflowTask("article", main_task),
+    ]
+    _run(tasks, max_workers=1, pool_sizes={"images": 1})
+
+    assert main_finished.is_set()
+
+
+def test_dependents_rerun_when_an_upstream_task_reruns():
+    ran = []
+    tasks = [
+        WorkflowTask("search", lambda: ran.append("search"), is_complete=lambda: False),
+        WorkflowTask(
+            "scrape",
+            lambda: ran.append("scrape"),
+            depends_on=("search",),
+            is_complete=lambda: True,
+        ),
+        WorkflowTask(
+            "article",
+            lambda: ran.append("article"),
+            depends_on=("scrape",),
+            is_complete=lambda: True,
+        ),
+        WorkflowTask(
+            "aphorism", lambda: ran.append("aphorism"), is_complete=lambda: True
+        ),
+    ]
+    _run(tasks)
+
+    # 前回の出力が残っていても、入力が作り直された後続は実行し直す
+    assert ran == ["search", "scrape", "article"]
+
+
+def test_preparation_task_does_not_regenerate_finished_outputs():
+    # 前回の実行で3枚目だけ生成に失敗した状態から再開する
+    slots = ["a.png", "b.png", None, "d.png", "e.png"]
+    ran = []
+
+    def generate(index):
+        ran.append(index)
+        slots[index] = f"{index}.png"
+
+    tasks = [
+        WorkflowTask(
+            "setup",
+            lambda: ran.append("setup"),
+            is_complete=lambda: all(slots),
+            invalidates_dependents=False,
+        )
+    ]
+    tasks += [
+        WorkflowTask(
+            f"image_{i}",
+            lambda i=i: generate(i),
+            depends_on=("setup",),
+            is_complete=lambda i=i: slots[i] is not None,
+        )
+        for i in range(len(slots))
+    ]
+    _run(tasks)
+
+    assert ran == ["setup", 2]